@@ -0,0 +1,188 @@
+''' Crawls a site served by the local cache server (utils/local_server.py)
+with different THREADCOUNT values and reports pages/sec, p50/p99 latency
+of each stage of a fetch and peak RSS.
+
+    python -m benchmarks.bench_crawl
+    python -m benchmarks.bench_crawl --threads 1,4,16 --seconds 20 \\
+        --latency 0.1 --error-rate 0.05
+    python -m benchmarks.bench_crawl --recorded saved_site/
+    python -m benchmarks.bench_crawl --metrics
+
+The server runs in this process; each crawl runs in a process of its own,
+in a temporary directory, for at most --seconds, with METRICS on if
+--metrics is given. The stages are timed by wrapping the functions a
+worker calls:
+
+    get_tbd_url   waiting for a url, including the politeness delay
+    download      the request to the cache server
+    gate          the content gate
+    parse         extracting text and links
+    add_url       queuing one extracted link
+    complete      marking the url complete
+'''
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from functools import wraps
+
+from benchmarks.common import make_config
+from utils.local_server import LocalCacheServer, add_arguments, make_site
+
+STAGES = ["get_tbd_url", "download", "gate", "parse", "add_url", "complete"]
+
+
+def timed(owner, name, samples):
+    ''' Replaces owner.name with a wrapper appending each call's duration
+    to samples. '''
+    function = getattr(owner, name)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    setattr(owner, name, wrapper)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux. Parser processes are children.
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+def run_crawl(args):
+    ''' Crawls for at most args.seconds and writes the results to
+    args.result as JSON. '''
+    import crawler.downloader
+    import crawler.parser_pool
+    import crawler.worker
+    import scraper
+    from crawler import Crawler
+    from crawler.frontier import Frontier
+
+    samples = {stage: list() for stage in STAGES}
+    timed(Frontier, "get_tbd_url", samples["get_tbd_url"])
+    timed(crawler.downloader, "download", samples["download"])
+    timed(crawler.worker, "gate_content", samples["gate"])
+    timed(scraper, "analyze_content", samples["parse"])
+    timed(crawler.parser_pool.ParserPool, "analyze_content", samples["parse"])
+    timed(Frontier, "add_url", samples["add_url"])
+    timed(Frontier, "mark_url_complete", samples["complete"])
+
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+    host, port = args.server.rsplit(":", 1)
+    config = make_config(directory, **{
+        "CRAWLER.SEEDURL": args.seeds,
+        "CRAWLER.POLITENESS": args.politeness,
+        "LOCAL PROPERTIES.THREADCOUNT": args.run,
+        "LOCAL PROPERTIES.DOWNLOADTHREADS": args.download_threads,
+        "LOCAL PROPERTIES.PARSERPROCESSES": args.parser_processes,
+        "LOCAL PROPERTIES.METRICS": args.metrics,
+        "LOCAL PROPERTIES.METRICSFILE": os.path.join(
+            directory, "metrics.jsonl")})
+    config.cache_server = (host, int(port))
+    crawl = Crawler(config, True)
+    start = time.perf_counter()
+    crawl.start_async()
+    deadline = start + args.seconds
+    for worker in crawl.workers:
+        worker.join(max(0, deadline - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    finished = not any(worker.is_alive() for worker in crawl.workers)
+    scraper.stats.merge_shards()
+    pages = len(samples["complete"])
+    with open(args.result, "w") as result:
+        json.dump({
+            "threads": args.run,
+            "pages": pages,
+            "unique": len(scraper.unique_pages),
+            "seconds": elapsed,
+            "finished": finished,
+            "rss": peak_rss_mb(),
+            "stages": {
+                stage: [percentile(values, 0.5), percentile(values, 0.99)]
+                for stage, values in samples.items()},
+        }, result)
+    # Workers still running are daemon threads, but the parser pool and
+    # the frontier's threads would keep the process alive.
+    os._exit(0)
+
+
+def main(args):
+    site = make_site(args)
+    server = LocalCacheServer(
+        site, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate).start()
+    host, port = server.server_address[:2]
+    print(
+        f"{len(site.seeds())} seed urls, latency {args.latency}s "
+        f"+- {args.jitter}s, error rate {args.error_rate}, politeness "
+        f"{args.politeness}s, at most {args.seconds}s per crawl"
+        f"{', metrics on' if args.metrics else ''}")
+    print(f"{'threads':>7} {'pages':>6} {'pages/s':>8} {'RSS MB':>7}  "
+          + "  ".join(f"{stage + ' p50/p99 ms':>24}" for stage in STAGES))
+    result_path = os.path.join(tempfile.mkdtemp(), "result.json")
+    try:
+        for threads in args.threads.split(","):
+            subprocess.run([
+                sys.executable, "-m", "benchmarks.bench_crawl",
+                "--run", threads, "--server", f"{host}:{port}",
+                "--seeds", ",".join(site.seeds()),
+                "--seconds", str(args.seconds),
+                "--politeness", str(args.politeness),
+                "--download-threads", str(args.download_threads),
+                "--parser-processes", str(args.parser_processes),
+                *(["--metrics"] if args.metrics else []),
+                "--result", result_path],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with open(result_path) as result_file:
+                result = json.load(result_file)
+            print(
+                f"{threads:>7} {result['pages']:>6} "
+                f"{result['pages'] / result['seconds']:>8.1f} "
+                f"{result['rss']:>7.0f}  " + "  ".join(
+                    f"{p50 * 1000:>11.2f}/{p99 * 1000:<12.2f}"
+                    for p50, p99 in (
+                        result["stages"][stage] for stage in STAGES))
+                + ("  (frontier emptied)" if result["finished"] else ""))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--threads", type=str, default="1,2,4,8,16")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--politeness", type=float, default=0.05)
+    parser.add_argument("--download-threads", type=int, default=0)
+    parser.add_argument("--parser-processes", type=int, default=0)
+    parser.add_argument("--metrics", action="store_true", default=False)
+    # Used by the crawl processes.
+    parser.add_argument("--run", type=str, default=None)
+    parser.add_argument("--server", type=str, default=None)
+    parser.add_argument("--seeds", type=str, default=None)
+    parser.add_argument("--result", type=str, default=None)
+    add_arguments(parser)
+    parser.set_defaults(hosts=20, latency=0.05, jitter=0.02, error_rate=0.02)
+    args = parser.parse_args()
+    if args.run is not None:
+        run_crawl(args)
+    else:
+        main(args)
@@ -0,0 +1,108 @@
+''' Compares the streaming extractor with the BeautifulSoup one on a
+corpus of pages: pages/sec and peak RSS, each mode in its own process.
+
+    python -m benchmarks.bench_extract
+    python -m benchmarks.bench_extract --corpus saved_pages/
+
+A corpus directory holds one html file per page. Without one, a synthetic
+corpus is generated, including a large text dump like randomSmiles100K.
+'''
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser
+
+import scraper
+
+
+def synthetic_corpus(pages, seed=0):
+    rng = random.Random(seed)
+    words = [
+        "research", "student", "computer", "science", "graduate", "data",
+        "learning", "faculty", "informatics", "événement", "データ", "uci"]
+    corpus = []
+    for i in range(pages):
+        links = "".join(
+            f'<li><a href="/page/{rng.randrange(10000)}#s{j}">link {j}</a></li>'
+            for j in range(rng.randrange(20, 120)))
+        paragraphs = "".join(
+            "<p>" + " ".join(rng.choice(words) for _ in range(80))
+            + " &amp; <b>bold</b><!-- note --></p>"
+            for _ in range(rng.randrange(5, 40)))
+        corpus.append((
+            f"<!DOCTYPE html><html><head><meta charset='utf-8'>"
+            f"<title>Page {i}</title><style>p {{color: red}}</style>"
+            f"<script>var page = {i};</script></head><body>"
+            f"<nav><ul>{links}</ul></nav>{paragraphs}"
+            f"<template><p>hidden</p></template></body></html>"
+        ).encode("utf-8"))
+    smiles = "\n".join(
+        "".join(rng.choice("CNOcno()=#123") for _ in range(30)) + f" mol{i}"
+        for i in range(100000))
+    corpus.append(
+        f"<html><body><pre>{smiles}</pre></body></html>".encode("utf-8"))
+    return corpus
+
+
+def load_corpus(directory):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as page:
+            corpus.append(page.read())
+    return corpus
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, corpus):
+    scraper.EXTRACTION_MODE = mode
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    for content in corpus:
+        visible_text, hrefs = scraper.parse_content(content)
+        scraper.re.findall(r'\b\w+\b', visible_text.lower())
+    elapsed = time.perf_counter() - start
+    print(
+        f"{mode:>7}: {len(corpus) / elapsed:8.1f} pages/s, "
+        f"peak RSS +{peak_rss_mb() - baseline:.1f} MB")
+
+
+def check_equivalent(corpus):
+    for content in corpus:
+        scraper.EXTRACTION_MODE = "soup"
+        expected = scraper.parse_content(content)
+        scraper.EXTRACTION_MODE = "stream"
+        assert scraper.parse_content(content) == expected
+
+
+def main(args):
+    corpus = (
+        load_corpus(args.corpus) if args.corpus
+        else synthetic_corpus(args.pages))
+    if args.mode:
+        run_mode(args.mode, corpus)
+        return
+    check_equivalent(corpus)
+    print(f"{len(corpus)} pages, {sum(map(len, corpus)) / 2 ** 20:.1f} MB")
+    for mode in ("soup", "stream"):
+        command = [
+            sys.executable, "-m", "benchmarks.bench_extract", "--mode", mode,
+            "--pages", str(args.pages)]
+        if args.corpus:
+            command += ["--corpus", args.corpus]
+        subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--mode", choices=["soup", "stream"], default=None)
+    main(parser.parse_args())
@@ -0,0 +1,160 @@
+''' Crawls a simulated site graph with the scored frontier and with the
+previous last-in first-out order, each with and without the trap
+detector, and measures the spilling queues.
+
+    python -m benchmarks.bench_frontier --fetches 5000
+    python -m benchmarks.bench_frontier --queued 1000000 --memory 100000
+
+The graph has hosts of ordinary pages, a few hundred to a few thousand
+words each, and endless trap areas (calendars, paginated wiki indexes,
+nested directories) of pages with little text. A useful page is an
+ordinary page of at least 200 words.
+'''
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from itertools import count
+
+import crawler.frontier
+from benchmarks.bench_extract import peak_rss_mb
+from benchmarks.common import make_config
+from crawler.frontier import Frontier
+from crawler.spill_heap import SpillHeap
+
+HOSTS = [
+    "www.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu",
+    "www.informatics.uci.edu", "vision.ics.uci.edu", "ngs.ics.uci.edu"]
+HOST_PAGES = 1500
+
+
+def simulated_page(url):
+    ''' Returns (words, links, useful) for url. '''
+    rng = random.Random(url)
+    host = url.split("/")[2]
+    path = url[len(host) + 8:]
+    if path.startswith(("/calendar", "/wiki", "/files")):
+        links = [f"https://{host}/p/{rng.randrange(HOST_PAGES)}"]
+        if path.startswith("/calendar"):
+            day = int(path.rsplit("=", 1)[1])
+            links += [
+                f"https://{host}/calendar?date={day + step}"
+                for step in (-1, 1, 7, 30)]
+        elif path.startswith("/wiki"):
+            index = int(path.split("=")[1].split("&")[0])
+            links += [
+                f"https://{host}/wiki/doku.php?idx={index + step}&do=index"
+                for step in range(1, 5)]
+        elif path.count("/") < 30:
+            links += [f"{url}/{name}" for name in ("a", "b", "c")]
+        else:
+            # Real urls stop growing somewhere.
+            links += [
+                f"https://{host}/files/{rng.randrange(10 ** 6)}"
+                for _ in range(3)]
+        return rng.randrange(20, 150), links, False
+    links = [
+        f"https://{host}/p/{rng.randrange(HOST_PAGES)}" for _ in range(10)]
+    links.append(
+        f"https://{rng.choice(HOSTS)}/p/{rng.randrange(HOST_PAGES)}")
+    trap = rng.random()
+    if trap < 0.1:
+        links.append(f"https://{host}/calendar?date={rng.randrange(20000)}")
+    elif trap < 0.2:
+        links.append(
+            f"https://{host}/wiki/doku.php?idx={rng.randrange(1000)}&do=index")
+    elif trap < 0.3:
+        links.append(f"https://{host}/files/{rng.randrange(100)}")
+    rng.shuffle(links)
+    return rng.randrange(200, 3000), links, True
+
+
+def crawl(fetches, order, learn_traps):
+    ''' Crawls fetches pages and returns the number of useful ones. With
+    learn_traps, the frontier's trap detector sees which pages were
+    useful. '''
+    score_url = crawler.frontier.score_url
+    if order == "lifo":
+        # Newest url first, as the previous to_be_downloaded.pop() did.
+        newest = count()
+        crawler.frontier.score_url = lambda *args: -next(newest)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            config = make_config(directory, **{
+                "CRAWLER.SEEDURL": ",".join(f"https://{host}" for host in HOSTS),
+                # Short enough to be quick, long enough that the hosts
+                # take turns as they would in a real crawl.
+                "CRAWLER.POLITENESS": 0.002,
+                # No robots.txt is fetched for the simulated pages.
+                "CRAWLER.ROBOTS": "false",
+                "CRAWLER.TRAPMINYIELD": 0.1 if learn_traps else 0})
+            frontier = Frontier(config, True)
+            useful = 0
+            for _ in range(fetches):
+                url = frontier.get_tbd_url()
+                if url is None:
+                    break
+                words, links, is_useful = simulated_page(url)
+                useful += is_useful
+                for link in links:
+                    frontier.add_url(link, url, words)
+                frontier.mark_url_complete(url, is_useful)
+            frontier.log.close()
+            frontier.save.close()
+    finally:
+        crawler.frontier.score_url = score_url
+    return useful
+
+
+def fill_queue(queued, memory):
+    ''' Queues and drains queued entries, spilling beyond memory the way
+    the frontier does, in a process of its own. '''
+    rng = random.Random(0)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        heap = SpillHeap(directory)
+        for i in range(queued):
+            heap.push((
+                rng.randrange(10) + rng.random(), i,
+                f"https://www.ics.uci.edu/page/{i}", rng.randrange(10)))
+            if len(heap.heap) > memory:
+                heap.spill(len(heap.heap) // 2)
+        filled = time.perf_counter() - start
+        while heap:
+            heap.pop()
+    print(
+        f"memory {memory:>8}: queued in {filled:5.1f}s, drained in "
+        f"{time.perf_counter() - start - filled:5.1f}s, "
+        f"peak RSS +{peak_rss_mb() - baseline:.0f} MB")
+
+
+def main(args):
+    if args.memory_only is not None:
+        fill_queue(args.queued, args.memory_only)
+        return
+    for order in ("lifo", "priority"):
+        for learn_traps in (False, True):
+            start = time.perf_counter()
+            useful = crawl(args.fetches, order, learn_traps)
+            name = f"{order}{' + traps' if learn_traps else ''}"
+            print(
+                f"{name:>16}: {useful} useful pages in {args.fetches} "
+                f"fetches ({time.perf_counter() - start:.1f}s)")
+    for memory in (args.queued, args.memory):
+        subprocess.run([
+            sys.executable, "-m", "benchmarks.bench_frontier",
+            "--queued", str(args.queued), "--memory-only", str(memory)],
+            check=True)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--fetches", type=int, default=5000)
+    parser.add_argument("--queued", type=int, default=1000000)
+    parser.add_argument("--memory", type=int, default=100000)
+    parser.add_argument("--memory-only", type=int, default=None)
+    main(parser.parse_args())
@@ -0,0 +1,84 @@
+''' Measures the time and peak memory spent on a page before and after the
+content gate, for an ordinary page, a large text dump like
+randomSmiles100K, an unlabelled binary and a PDF.
+
+    python -m benchmarks.bench_gate
+'''
+import pickle
+import random
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+
+import requests
+
+import scraper
+from benchmarks.bench_extract import synthetic_corpus
+from benchmarks.common import make_config
+from utils.content_gate import gate_content
+from utils.response import Response
+
+
+def make_response(content, content_type=None):
+    raw = requests.models.Response()
+    raw.status_code = 200
+    raw.url = "https://www.ics.uci.edu/page"
+    raw._content = content
+    if content_type:
+        raw.headers["Content-Type"] = content_type
+    return {"url": raw.url, "status": 200, "response": pickle.dumps(raw)}
+
+
+def pages(dump_mb):
+    rng = random.Random(0)
+    corpus = synthetic_corpus(1)
+    smiles = "\n".join(
+        "".join(rng.choice("CNOcno()=#123") for _ in range(30))
+        for _ in range(dump_mb * 2 ** 20 // 31))
+    return [
+        ("html page", make_response(corpus[0], "text/html; charset=utf-8")),
+        ("text dump", make_response(smiles.encode(), "text/plain")),
+        ("binary", make_response(rng.randbytes(dump_mb * 2 ** 20))),
+        ("pdf", make_response(
+            b"%PDF-1.4\n" + rng.randbytes(dump_mb * 2 ** 20),
+            "application/pdf")),
+    ]
+
+
+def before(resp_dict, config):
+    return scraper.analyze_page("", Response(resp_dict))
+
+
+def after(resp_dict, config):
+    resp = Response(resp_dict)
+    content = gate_content(resp, config)
+    if content is None:
+        return None
+    return scraper.analyze_content("", resp.url, content)
+
+
+def measure(analyze, resp_dict, config):
+    tracemalloc.start()
+    start = time.perf_counter()
+    analyze(resp_dict, config)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(args):
+    config = make_config(".")
+    for name, resp_dict in pages(args.dump_mb):
+        results = [
+            measure(analyze, resp_dict, config) for analyze in (before, after)]
+        print(f"{name:>10}: " + ", ".join(
+            f"{label} {elapsed * 1000:7.1f} ms {peak / 2 ** 20:6.1f} MB peak"
+            for label, (elapsed, peak) in zip(("before", "after"), results)))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--dump-mb", type=int, default=8)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+''' Crawls a finite synthetic site where some hosts are down, answering
+every request with a cache error after a delay, once with host health
+tracking and once with it turned off, and reports the time to crawl, the
+unique pages and the requests spent on the down hosts.
+
+    python -m benchmarks.bench_health
+    python -m benchmarks.bench_health --hosts 12 --down 4 --down-latency 2
+
+Backoffs and cooldowns are scaled down, and HOSTMAXOPENS is set, so that the
+parked hosts are given up on within the crawl; see HOSTCOOLDOWN in config.ini
+for the defaults.
+'''
+import os
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from crawler.sharding import run_local_shards
+from utils.local_server import LocalCacheServer, SyntheticSite
+
+# Settings that keep every circuit closed and never back off.
+DISABLED = {
+    "CRAWLER.HOSTFAILURES": 10 ** 9, "CRAWLER.HOSTERRORRATE": 1,
+    "CRAWLER.HOSTBACKOFF": 0}
+
+
+def crawl(site, server, args, overrides):
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            config = make_config(directory, **{
+                "CRAWLER.SEEDURL": ",".join(site.seeds()),
+                "CRAWLER.POLITENESS": args.politeness,
+                "CRAWLER.HOSTCOOLDOWN": args.cooldown,
+                "CRAWLER.HOSTMAXCOOLDOWN": 4 * args.cooldown,
+                "CRAWLER.HOSTBACKOFF": args.cooldown / 8,
+                "CRAWLER.HOSTMAXBACKOFF": args.cooldown,
+                # Down hosts are given up on, or the crawl would not end.
+                "CRAWLER.HOSTMAXOPENS": 3,
+                "LOCAL PROPERTIES.THREADCOUNT": args.threads,
+                "LOCAL PROPERTIES.CONSOLELOGLEVEL": "WARNING",
+                **overrides})
+            config.cache_server = server.server_address[:2]
+            server.requests.clear()
+            start = time.perf_counter()
+            stats = run_local_shards(config, True)
+            return time.perf_counter() - start, len(stats.unique_pages)
+        finally:
+            os.chdir(cwd)
+
+
+def main(args):
+    site = SyntheticSite(hosts=args.hosts, pages=args.pages, trap_rate=0)
+    down = [seed.split("//", 1)[1] for seed in site.seeds()[-args.down:]]
+    server = LocalCacheServer(
+        site, latency=args.latency, down_hosts=down,
+        down_latency=args.down_latency).start()
+    print(
+        f"{args.hosts} hosts of {args.pages} pages, {args.down} down "
+        f"answering after {args.down_latency}s, {args.threads} threads, "
+        f"cooldown {args.cooldown}s")
+    try:
+        for name, overrides in (("off", DISABLED), ("on", dict())):
+            elapsed, pages = crawl(site, server, args, overrides)
+            wasted = sum(server.requests[host] for host in down)
+            print(
+                f"health {name:>3}: {pages} unique pages in {elapsed:6.1f}s, "
+                f"{wasted} requests to down hosts "
+                f"({wasted * args.down_latency:.0f}s of fetch slots)")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--down", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--down-latency", type=float, default=1.0)
+    parser.add_argument("--politeness", type=float, default=0.05)
+    parser.add_argument("--cooldown", type=float, default=2)
+    main(parser.parse_args())
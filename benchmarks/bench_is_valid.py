@@ -0,0 +1,132 @@
+''' Compares the url classifier in scraper.py with the implementation it
+replaced, which rebuilt its regexes and parsed each url twice per call.
+
+    python -m benchmarks.bench_is_valid --urls 20000 --repeat 5
+'''
+import random
+import re
+import time
+
+from argparse import ArgumentParser
+from urllib.parse import urlparse, urldefrag
+
+import scraper
+
+
+def legacy_find_calendar(url):
+    calendar_patterns = [
+        r'[\?&](month|year|date)=',
+        r'/\d{4}/\d{1,2}/?',
+        r'/\d{1,2}-\d{1,2}-\d{4}',
+        r'/\d{4}-\d{1,2}-\d{1,2}',
+        r'/\d{4}-\d{2}(?!-\d{2})',
+    ]
+    for date in calendar_patterns:
+        if re.search(date, url, re.IGNORECASE):
+            return True
+    return False
+
+
+def legacy_find_traps(url):
+    parsed = urlparse(url)
+    if legacy_find_calendar(url):
+        return True
+    for marker in ("doku.php", "~eppstein", "grape"):
+        if marker in parsed.path.lower():
+            return True
+    for marker in ("swiki", "gitlab", "grape"):
+        if marker in parsed.netloc.lower():
+            return True
+    for marker in (
+            "eventdate", "ical", "tribe-bar-date", "triube_events_display"):
+        if marker in parsed.query.lower():
+            return True
+    return False
+
+
+def legacy_is_valid(url):
+    parsed = urlparse(url)
+    netloc = parsed.netloc.lower()
+    path = parsed.path.lower()
+    defrag_url, _ = urldefrag(url)
+    if defrag_url in scraper.stats.unique_pages:
+        return False
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    if re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz"
+        + r"|sql|apk|war|img)$", parsed.path.lower()):
+        return False
+    if not (any(netloc == suf or netloc.endswith(f".{suf}")
+                for suf in scraper.ALLOWED_SUFFIXES)
+            or (netloc == "today.uci.edu"
+                and path.startswith(scraper.ICS_PATH_PREFIX))):
+        return False
+    if legacy_find_traps(url):
+        return False
+    return True
+
+
+def make_urls(count, seed=0):
+    rng = random.Random(seed)
+    hosts = [
+        "www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu",
+        "www.stat.uci.edu", "vision.ics.uci.edu", "swiki.ics.uci.edu",
+        "gitlab.ics.uci.edu", "today.uci.edu", "www.eecs.uci.edu",
+        "www.google.com"]
+    paths = [
+        "/about", "/people/faculty", "/events/2024-05-01", "/doku.php",
+        "/~eppstein/pubs", "/files/slides.pdf", "/courses/cs121/index.html",
+        "/department/information_computer_sciences/news", "/calendar/2024/05/",
+        "/research/areas"]
+    queries = ["", "", "", "?page=2", "?ical=1", "?tribe-bar-date=2024-01-01",
+               "?view=normal"]
+    fragments = ["", "", "", "#top", "#2024-05"]
+    urls = []
+    for i in range(count):
+        scheme = rng.choice(["http", "https", "https", "mailto"])
+        urls.append(
+            f"{scheme}://{rng.choice(hosts)}{rng.choice(paths)}/{i}"
+            f"{rng.choice(queries)}{rng.choice(fragments)}")
+    return urls
+
+
+def urls_per_sec(is_valid, urls):
+    start = time.perf_counter()
+    for url in urls:
+        is_valid(url)
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main(url_count, repeat):
+    unique = make_urls(url_count)
+    scraper.stats.unique_pages.update(unique[::7])
+    for url in unique:
+        assert legacy_is_valid(url) == scraper.is_valid(url), url
+    scraper.classify_url.cache_clear()
+
+    # Outlinks repeat heavily across pages (navigation bars, footers), so
+    # the repeated corpus is closer to what a crawl feeds is_valid.
+    repeated = unique[:url_count // 10] * 10 * repeat
+    for name, urls in (("unique", unique), ("repeated", repeated)):
+        before = urls_per_sec(legacy_is_valid, urls)
+        after = urls_per_sec(scraper.is_valid, urls)
+        print(
+            f"{name:>9}: before {before:12,.0f} urls/s  "
+            f"after {after:12,.0f} urls/s  ({after / before:.1f}x)")
+        scraper.classify_url.cache_clear()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.urls, args.repeat)
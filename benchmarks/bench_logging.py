@@ -0,0 +1,97 @@
+''' Compares the time worker threads spend logging with the previous
+get_logger, a file and a console handler per call writing synchronously,
+and with the queue backend of utils/log_queue.py. get_logger is called
+twice per worker, as when a process creates a second Crawler. Console
+output goes to os.devnull so the terminal does not skew the numbers.
+
+    python -m benchmarks.bench_logging --threads 8 --records 20000
+'''
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from threading import Thread
+
+from utils.log_queue import backend
+
+
+def legacy_logger(name, directory):
+    # The previous get_logger, called once per worker as the crawler did.
+    logger = logging.getLogger(f"legacy-{name}")
+    logger.setLevel(logging.INFO)
+    fh = logging.FileHandler(os.path.join(directory, "Worker.log"))
+    fh.setLevel(logging.DEBUG)
+    ch = logging.StreamHandler()
+    ch.setLevel(logging.INFO)
+    formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    fh.setFormatter(formatter)
+    ch.setFormatter(formatter)
+    logger.addHandler(fh)
+    logger.addHandler(ch)
+    return logger
+
+
+def queued_logger(name, directory):
+    return backend.get_logger(f"queued-{name}", "Worker")
+
+
+def run(make_logger, threads, records, directory):
+    ''' Returns the seconds the threads spent in logging calls and the
+    number of lines written. '''
+    for i in range(threads):
+        make_logger(i, directory)
+    loggers = [make_logger(i, directory) for i in range(threads)]
+    spent = [0.0] * threads
+
+    def log(i):
+        logger = loggers[i]
+        start = time.perf_counter()
+        for n in range(records):
+            logger.info(
+                f"Downloaded https://www.ics.uci.edu/p/{n}, status <200>, "
+                f"using cache ('localhost', 9000).")
+        spent[i] = time.perf_counter() - start
+    workers = [Thread(target=log, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    backend.flush()
+    elapsed = time.perf_counter() - start
+    for logger in loggers:
+        for handler in logger.handlers:
+            handler.flush()
+    with open(os.path.join(directory, "Worker.log")) as log:
+        lines = sum(1 for _ in log)
+    return max(spent), elapsed, lines
+
+
+def main(args):
+    console = open(os.devnull, "w")
+    stderr, sys.stderr = sys.stderr, console
+    try:
+        for name, make_logger in (
+                ("legacy", legacy_logger), ("queued", queued_logger)):
+            with tempfile.TemporaryDirectory() as directory:
+                backend.configure(directory)
+                blocked, elapsed, lines = run(
+                    make_logger, args.threads, args.records, directory)
+            print(
+                f"{name:>7}: workers logged for {blocked:6.2f}s, all written "
+                f"after {elapsed:6.2f}s, {lines} lines for "
+                f"{args.threads * args.records} records", file=stderr)
+    finally:
+        sys.stderr = stderr
+        backend.configure()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--records", type=int, default=20000)
+    main(parser.parse_args())
@@ -0,0 +1,59 @@
+''' Measures what the instrumentation costs per call, disabled and
+enabled, against the code it wraps.
+
+    python -m benchmarks.bench_metrics
+    python -m benchmarks.bench_crawl --threads 8 --metrics
+    python -m benchmarks.bench_crawl --threads 8
+
+The second and third commands compare the throughput of whole crawls with
+and without metrics.
+'''
+import time
+
+from argparse import ArgumentParser
+
+from utils.metrics import Metrics
+
+
+def per_call(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main(args):
+    disabled = Metrics()
+    enabled = Metrics()
+    enabled.enable()
+
+    def bare():
+        pass
+
+    def timed(metrics):
+        def function():
+            with metrics.time("stage"):
+                pass
+        return function
+
+    def counted(metrics):
+        def function():
+            metrics.count("responses", status=200)
+        return function
+
+    baseline = per_call(bare, args.calls)
+    print(f"{'empty call':>16}: {baseline:6.0f} ns")
+    for name, function in (
+            ("timer disabled", timed(disabled)),
+            ("timer enabled", timed(enabled)),
+            ("count disabled", counted(disabled)),
+            ("count enabled", counted(enabled))):
+        print(
+            f"{name:>16}: {per_call(function, args.calls) - baseline:6.0f} ns "
+            f"over an empty call")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000000)
+    main(parser.parse_args())
@@ -0,0 +1,60 @@
+''' Measures how long a resumed crawl takes to load its frontier, with and
+without the pending index.
+
+    python -m benchmarks.bench_resume --discovered 1000000 --pending 50000
+'''
+import shelve
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from crawler.frontier import Frontier
+from utils import get_urlhash
+
+
+def build_save_file(save_file, discovered, pending):
+    hosts = ["www.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu"]
+    with shelve.open(save_file) as save:
+        for i in range(discovered):
+            url = f"https://{hosts[i % len(hosts)]}/page/{i}"
+            save[get_urlhash(url)] = (url, i >= pending)
+
+
+def time_startup(config):
+    start = time.perf_counter()
+    frontier = Frontier(config, False)
+    elapsed = time.perf_counter() - start
+    queued = sum(len(queue) for queue in frontier.host_queues.values())
+    frontier.log.close()
+    frontier.save.close()
+    return elapsed, queued
+
+
+def main(discovered, pending):
+    with tempfile.TemporaryDirectory() as directory:
+        config = make_config(directory)
+        start = time.perf_counter()
+        build_save_file(config.save_file, discovered, pending)
+        print(
+            f"built save file with {discovered} discovered / {pending} "
+            f"pending urls in {time.perf_counter() - start:.1f}s")
+
+        # The first start has no pending index and rescans the save file,
+        # which is what every restart used to do.
+        for name in ("full scan", "pending index"):
+            elapsed, queued = time_startup(config)
+            print(f"{name:>14}: {elapsed:8.2f}s, {queued} urls queued")
+
+        config.revalidate = "lazy"
+        elapsed, queued = time_startup(config)
+        print(f"{'lazy revalid.':>14}: {elapsed:8.2f}s, {queued} urls queued")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--discovered", type=int, default=1000000)
+    parser.add_argument("--pending", type=int, default=50000)
+    args = parser.parse_args()
+    main(args.discovered, args.pending)
@@ -0,0 +1,70 @@
+''' Crawls a finite synthetic site whose robots.txt disallows its trap
+areas and lists a sitemap of every page, with ROBOTS off and on, and
+reports the time to crawl it, the unique pages found and the requests
+sent to the cache server.
+
+    python -m benchmarks.bench_robots
+    python -m benchmarks.bench_robots --hosts 12 --pages 300 --trap-rate 0.3
+
+With ROBOTS off only the trap detector keeps the crawl out of the trap
+areas, after fetching enough of their pages to learn them.
+'''
+import os
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from crawler.sharding import run_local_shards
+from utils.local_server import LocalCacheServer, SyntheticSite
+
+
+def crawl(site, server, args, robots):
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            config = make_config(directory, **{
+                "CRAWLER.SEEDURL": ",".join(site.seeds()),
+                "CRAWLER.POLITENESS": args.politeness,
+                "CRAWLER.ROBOTS": robots,
+                "LOCAL PROPERTIES.THREADCOUNT": args.threads,
+                "LOCAL PROPERTIES.CONSOLELOGLEVEL": "WARNING"})
+            config.cache_server = server.server_address[:2]
+            server.requests.clear()
+            start = time.perf_counter()
+            stats = run_local_shards(config, True)
+            return time.perf_counter() - start, len(stats.unique_pages)
+        finally:
+            os.chdir(cwd)
+
+
+def main(args):
+    site = SyntheticSite(
+        hosts=args.hosts, pages=args.pages, trap_rate=args.trap_rate,
+        robots=True)
+    server = LocalCacheServer(site, latency=args.latency).start()
+    print(
+        f"{args.hosts} hosts of {args.pages} pages, trap rate "
+        f"{args.trap_rate}, latency {args.latency}s, {args.threads} threads")
+    try:
+        for robots in (False, True):
+            elapsed, pages = crawl(site, server, args, robots)
+            print(
+                f"robots {'on' if robots else 'off':>3}: {pages} unique pages "
+                f"in {elapsed:6.1f}s, {sum(server.requests.values())} "
+                f"requests")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--trap-rate", type=float, default=0.3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--politeness", type=float, default=0.05)
+    main(parser.parse_args())
@@ -0,0 +1,73 @@
+''' Compares duplicate checks against the shelve with the in-memory
+SeenIndex used by the frontier.
+
+    python -m benchmarks.bench_seen_index --urls 100000
+'''
+import dbm
+import os
+import shelve
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+from utils import get_urlhash
+from utils.seen_index import SeenIndex
+
+
+def make_urlhashes(count, prefix):
+    return [
+        get_urlhash(f"https://www.ics.uci.edu/{prefix}/{i}")
+        for i in range(count)]
+
+
+def lookups_per_sec(contains, urlhashes):
+    start = time.perf_counter()
+    for urlhash in urlhashes:
+        contains(urlhash)
+    return len(urlhashes) / (time.perf_counter() - start)
+
+
+def main(url_count, lookup_count, bloom_bits):
+    stored = make_urlhashes(url_count, "seen")
+    hits = stored[:lookup_count]
+    misses = make_urlhashes(lookup_count, "new")
+
+    with tempfile.TemporaryDirectory() as directory:
+        save_file = os.path.join(directory, "frontier.shelve")
+        save = shelve.open(save_file)
+        for urlhash in stored:
+            save[urlhash] = ("", False)
+        save.sync()
+        print(f"shelve backend: {dbm.whichdb(save_file)}")
+        index = SeenIndex(bloom_bits=bloom_bits)
+        for urlhash in stored:
+            index.add(SeenIndex.fingerprint(urlhash))
+
+        def index_contains(urlhash):
+            # Same fast path as Frontier.add_url: the shelve is only
+            # consulted when the fingerprint is present.
+            return (SeenIndex.fingerprint(urlhash) in index
+                    and urlhash in save)
+
+        for name, urlhashes in (("hits", hits), ("misses", misses)):
+            shelve_rate = lookups_per_sec(save.__contains__, urlhashes)
+            index_rate = lookups_per_sec(index_contains, urlhashes)
+            print(
+                f"{name:>6}: shelve {shelve_rate:12,.0f}/s  "
+                f"index {index_rate:12,.0f}/s  "
+                f"({index_rate / shelve_rate:.1f}x)")
+        save.close()
+
+    print(
+        f"index: {len(index)} urls, {index.memory_usage() / 2 ** 20:.1f} MB, "
+        f"{index.bytes_per_url() * 1e6 / 2 ** 20:.1f} MB per million urls")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=50000)
+    parser.add_argument("--bloom_bits", type=int, default=0)
+    args = parser.parse_args()
+    main(args.urls, min(args.lookups, args.urls), args.bloom_bits)
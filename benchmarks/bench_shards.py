@@ -0,0 +1,71 @@
+''' Crawls a finite synthetic site served by the local cache server with 1,
+2 and 4 shards and reports the time to crawl it, pages/sec and the
+unique pages of the merged report, which should not depend on the number
+of shards.
+
+    python -m benchmarks.bench_shards
+    python -m benchmarks.bench_shards --shards 1,2,4,8 --hosts 48 --pages 500
+
+Shards only scale with the cores available; the politeness delay per host
+is the same in every run.
+'''
+import os
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from crawler.sharding import run_local_shards
+from utils.local_server import LocalCacheServer, SyntheticSite
+
+
+def crawl(shards, site, server, args, port):
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            config = make_config(directory, **{
+                "CRAWLER.SEEDURL": ",".join(site.seeds()),
+                "CRAWLER.POLITENESS": args.politeness,
+                "LOCAL PROPERTIES.THREADCOUNT": args.threads,
+                "LOCAL PROPERTIES.SHARDS": shards,
+                "LOCAL PROPERTIES.SHARDADDRESSES": ",".join(
+                    f"localhost:{port + shard}" for shard in range(shards)),
+                "LOCAL PROPERTIES.CONSOLELOGLEVEL": "WARNING"})
+            config.cache_server = server.server_address[:2]
+            start = time.perf_counter()
+            stats = run_local_shards(config, True)
+            return time.perf_counter() - start, len(stats.unique_pages)
+        finally:
+            os.chdir(cwd)
+
+
+def main(args):
+    site = SyntheticSite(hosts=args.hosts, pages=args.pages, trap_rate=0)
+    server = LocalCacheServer(site, latency=args.latency).start()
+    print(
+        f"{args.hosts} hosts of {args.pages} pages, latency {args.latency}s, "
+        f"politeness {args.politeness}s, {args.threads} threads per shard, "
+        f"{os.cpu_count()} cpus")
+    try:
+        for run, shards in enumerate(map(int, args.shards.split(","))):
+            elapsed, pages = crawl(
+                shards, site, server, args, args.port + 10 * run)
+            print(
+                f"{shards:>2} shards: {pages} unique pages in {elapsed:6.1f}s, "
+                f"{pages / elapsed:6.1f} pages/s")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--shards", type=str, default="1,2,4")
+    parser.add_argument("--hosts", type=int, default=24)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--politeness", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=9200)
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+''' Compares counting the words of pages with scraper.TOKENIZER against the
+previous findall + list comprehension + Counter.
+
+    python -m benchmarks.bench_tokenize
+    python -m benchmarks.bench_tokenize --corpus saved_pages/
+
+A corpus directory holds one html file per page. Without one, pages of
+Zipf-distributed words over a large vocabulary are generated.
+'''
+import random
+import re
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from collections import Counter
+
+import scraper
+from benchmarks.bench_extract import load_corpus
+
+
+def synthetic_texts(pages, vocabulary, seed=0):
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = [
+        "".join(rng.choice(letters) for _ in range(rng.randrange(2, 10)))
+        for _ in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    texts = []
+    for _ in range(pages):
+        page = rng.choices(words, weights, k=rng.randrange(300, 3000))
+        # Numbers, mixed tokens, stopwords and punctuation that the filters
+        # drop.
+        page += ["2024", "abc123", "the", "of", "x", "--", "(c)"] * 20
+        rng.shuffle(page)
+        texts.append(" ".join(page).title())
+    return texts
+
+
+def legacy(text):
+    tokens = re.findall(r'\b\w+\b', text.lower())
+    filtered_words = [
+        word for word in tokens
+        if word not in scraper.STOPWORDS and len(word) > 1 and word.isalpha()]
+    return len(tokens), Counter(filtered_words)
+
+
+def measure(count_words, texts):
+    start = time.perf_counter()
+    results = [count_words(text) for text in texts]
+    elapsed = time.perf_counter() - start
+    # Peak memory while counting the largest page, on top of its text.
+    largest = max(texts, key=len)
+    tracemalloc.start()
+    count_words(largest)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, results
+
+
+def main(args):
+    if args.corpus:
+        texts = [
+            scraper.parse_content(page)[0]
+            for page in load_corpus(args.corpus)]
+    else:
+        texts = synthetic_texts(args.pages, args.vocabulary)
+    size = sum(map(len, texts)) / 2 ** 20
+    print(f"{len(texts)} pages, {size:.1f} MB of text")
+    results = dict()
+    for name, count_words in (
+            ("before", legacy), ("after", scraper.TOKENIZER.count_words)):
+        elapsed, peak, results[name] = measure(count_words, texts)
+        print(
+            f"{name:>7}: {size / elapsed:6.1f} MB/s, "
+            f"{peak / 2 ** 20:6.2f} MB peak on the largest page")
+    assert results["before"] == results["after"], "word counts differ"
+    total = Counter()
+    for token_count, word_counts in results["after"]:
+        total.update(word_counts)
+    print(f"word counts identical, {len(total)} distinct words")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=200000)
+    main(parser.parse_args())
@@ -0,0 +1,23 @@
+''' Config shared by the benchmarks, so they do not need a config.ini. '''
+import os
+
+from configparser import ConfigParser
+
+from utils.config import Config
+
+
+def make_config(directory, **overrides):
+    cparser = ConfigParser()
+    cparser.read_dict({
+        "IDENTIFICATION": {"USERAGENT": "IR US25 benchmark"},
+        "CONNECTION": {"HOST": "localhost", "PORT": "9000"},
+        "CRAWLER": {
+            "SEEDURL": "https://www.ics.uci.edu", "POLITENESS": "0.5"},
+        "LOCAL PROPERTIES": {
+            "SAVE": os.path.join(directory, "frontier.shelve"),
+            "THREADCOUNT": "1"},
+    })
+    for key, value in overrides.items():
+        section, option = key.split(".")
+        cparser[section][option] = str(value)
+    return Config(cparser)
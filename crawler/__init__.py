@@ -1,21 +1,63 @@
-from utils import get_logger
+from threading import Thread, Event
+
+from utils import get_logger, configure_logging
+from utils.metrics import metrics
+import scraper
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from crawler.downloader import Downloader
+from crawler.parser_pool import ParserPool
+from crawler.sharding import ShardRouter
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
+        configure_logging(config)
         self.logger = get_logger("CRAWLER")
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
+        self.downloader = None
+        if self.config.download_threads:
+            self.downloader = Downloader(
+                config, self.frontier, self.config.threads_count)
+        self.parsers = None
+        if self.config.parser_processes:
+            self.parsers = ParserPool(config)
+        # A sharded crawl exchanges urls with the other shards.
+        self.router = None
+        if self.config.shards > 1:
+            self.router = ShardRouter(config, self.frontier)
+            self.frontier.router = self.router
+        self.finished = Event()
+        self.reporter = Thread(target=self._report_periodically, daemon=True)
+        self.merger = Thread(target=self._merge_periodically, daemon=True)
 
     def start_async(self):
+        # Optional stages are only passed to workers when they are enabled,
+        # so worker factories that do not know about them keep working.
+        stages = dict()
+        if self.downloader is not None:
+            stages["downloader"] = self.downloader
+        if self.parsers is not None:
+            stages["parsers"] = self.parsers
         self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier)
+            self.worker_factory(
+                worker_id, self.config, self.frontier, **stages)
             for worker_id in range(self.config.threads_count)]
+        if hasattr(self.frontier, "gauges"):
+            metrics.add_collector(self.frontier.gauges)
+        if self.downloader is not None:
+            metrics.add_collector(self._downloader_gauges)
+        metrics.start(self.config)
+        if self.router is not None:
+            self.router.start()
+        if self.downloader is not None:
+            self.downloader.start()
         for worker in self.workers:
             worker.start()
+        self.reporter.start()
+        self.merger.start()
 
     def start(self):
         self.start_async()
@@ -24,3 +66,25 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        if self.parsers is not None:
+            self.parsers.shutdown()
+        if self.router is not None:
+            self.router.stop()
+        self.finished.set()
+        scraper.make_report()
+        metrics.stop(self.config)
+
+    def _downloader_gauges(self):
+        return {"download_queue": self.downloader.responses.qsize()}
+
+    def _merge_periodically(self):
+        # Folds the statistics each worker recorded into the crawl totals.
+        while not self.finished.wait(self.config.stats_merge_interval):
+            scraper.stats.merge_shards()
+
+    def _report_periodically(self):
+        while not self.finished.wait(self.config.report_interval):
+            scraper.make_report()
+            # Bounds the completed urls a resumed crawl downloads again.
+            if hasattr(self.frontier, "checkpoint"):
+                self.frontier.checkpoint()
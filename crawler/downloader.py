@@ -0,0 +1,166 @@
+import time
+import zlib
+
+from threading import Thread, Lock
+from queue import Queue
+from urllib.parse import urlsplit
+
+from utils.download import download
+from utils import get_logger
+from utils.robots import (
+    robots, parse_robots, parse_sitemap, RobotsRules, ERROR_TTL,
+    MAX_ROBOTS_BYTES)
+from scraper import is_valid
+
+
+def fetch_robots(url, config, logger=None):
+    ''' Downloads the robots.txt of url's host. Returns its RobotsRules and
+    how many seconds to keep them, None for ROBOTSTTL. A missing robots.txt
+    allows everything; one that could not be fetched allows everything
+    until it is tried again after ERROR_TTL seconds. '''
+    parsed = urlsplit(url)
+    resp = download(
+        f"{parsed.scheme}://{parsed.netloc}/robots.txt", config, logger)
+    if resp.status == 200 and resp.raw_response is not None:
+        text = resp.raw_response.content[:MAX_ROBOTS_BYTES].decode(
+            "utf-8", "replace")
+        return parse_robots(text, config.user_agent), None
+    if resp.status is not None and 400 <= resp.status < 500:
+        return RobotsRules(), None
+    return RobotsRules(), ERROR_TTL
+
+
+def read_sitemaps(sitemaps, config, frontier, logger=None):
+    ''' Yields the page urls listed in sitemaps and in the sitemaps they
+    list, at most SITEMAPMAXURLS from at most SITEMAPMAXFILES files, each
+    downloaded when the frontier's politeness allows it. '''
+    queue = list(sitemaps)
+    files = found = 0
+    while queue and files < config.sitemap_max_files:
+        sitemap = queue.pop(0)
+        frontier.wait_turn(sitemap)
+        resp = download(sitemap, config, logger)
+        files += 1
+        if resp.status != 200 or resp.raw_response is None:
+            continue
+        try:
+            pages, children = parse_sitemap(resp.raw_response.content)
+        except (OSError, EOFError, zlib.error) as e:
+            # Not gzipped after all, or corrupt.
+            if logger:
+                logger.error(f"Could not read sitemap {resp.url}: {e}")
+            continue
+        queue.extend(children)
+        for page in pages:
+            yield page
+            found += 1
+            if found >= config.sitemap_max_urls:
+                return
+
+
+def read_robots(url, config, frontier, logger):
+    ''' Reads the robots.txt of url's host and queues the valid urls of its
+    sitemaps. robots.txt takes the turn the frontier gave url. '''
+    host = urlsplit(url).netloc.lower()
+    try:
+        rules, ttl = fetch_robots(url, config, logger)
+    except Exception as e:
+        # A robots.txt that cannot be read never stops the crawl.
+        logger.error(f"Could not read the robots.txt of {host}: {e}")
+        rules, ttl = RobotsRules(), ERROR_TTL
+    robots.put(host, rules, ttl=ttl)
+    if rules.sitemaps and config.sitemap_max_urls:
+        queued = 0
+        try:
+            for page in read_sitemaps(
+                    rules.sitemaps, config, frontier, logger):
+                if is_valid(page):
+                    frontier.add_url(page)
+                    queued += 1
+        except Exception as e:
+            logger.error(f"Could not read the sitemaps of {host}: {e}")
+        logger.info(f"Queued {queued} urls from the sitemaps of {host}.")
+
+
+def fetch(url, config, frontier, logger):
+    ''' Downloads url and reports the fetch to the frontier. If the frontier
+    handed out url as the first of its host, the robots.txt of the host is
+    read first. Returns None without downloading url if robots.txt
+    disallows it. '''
+    reader = config.robots and frontier.reads_robots(url)
+    if reader:
+        try:
+            read_robots(url, config, frontier, logger)
+        finally:
+            frontier.robots_read(url)
+    if not robots.allowed(url):
+        logger.info(f"Skipping {url}, disallowed by robots.txt.")
+        frontier.release_probe(url)
+        return None
+    if reader:
+        frontier.wait_turn(url)
+    start = time.monotonic()
+    resp = download(url, config, logger)
+    frontier.record_fetch(url, resp.status, time.monotonic() - start)
+    return resp
+
+
+class Downloader(object):
+    ''' Keeps several downloads from the cache server in flight.
+
+    Fetcher threads take urls from the frontier, which enforces politeness,
+    download them over the shared connection pool and put (url, response)
+    pairs on a bounded queue that the workers consume. The queue bound keeps
+    fetchers from running far ahead of the workers. '''
+
+    def __init__(self, config, frontier, consumers):
+        self.logger = get_logger("DOWNLOADER")
+        self.config = config
+        self.frontier = frontier
+        self.consumers = consumers
+        self.responses = Queue(maxsize=self.config.download_queue)
+        self.lock = Lock()
+        self.running = self.config.download_threads
+        self.fetchers = [
+            Thread(target=self._fetch, daemon=True)
+            for _ in range(self.config.download_threads)]
+
+    def start(self):
+        for fetcher in self.fetchers:
+            fetcher.start()
+
+    def get_response(self):
+        ''' Returns the next (url, response) pair, or (None, None) once the
+        frontier is empty. '''
+        return self.responses.get()
+
+    def _fetch(self):
+        try:
+            while True:
+                tbd_url = self.frontier.get_tbd_url()
+                if not tbd_url:
+                    break
+                resp = None
+                try:
+                    resp = fetch(
+                        tbd_url, self.config, self.frontier, self.logger)
+                except Exception as e:
+                    # One bad download must not stop the fetcher.
+                    self.logger.error(f"Failed to download {tbd_url}: {e}")
+                finally:
+                    # Disallowed by robots.txt, or the fetch failed: no
+                    # worker will release the url.
+                    if resp is None:
+                        self.frontier.mark_url_complete(tbd_url)
+                if resp is not None:
+                    self.responses.put((tbd_url, resp))
+        finally:
+            # A fetcher that fails still counts as stopped, so that the
+            # workers get their stop signals.
+            with self.lock:
+                self.running -= 1
+                last = not self.running
+            if last:
+                # Every worker gets its own stop signal.
+                for _ in range(self.consumers):
+                    self.responses.put((None, None))
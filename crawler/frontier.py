@@ -1,72 +1,617 @@
-import os
-import shelve
-
-from threading import Thread, RLock
-from queue import Queue, Empty
-
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
-
-class Frontier(object):
-    def __init__(self, config, restart):
-        self.logger = get_logger("FRONTIER")
-        self.config = config
-        self.to_be_downloaded = list()
-        
-        if not os.path.exists(self.config.save_file) and not restart:
-            # Save file does not exist, but request to load save.
-            self.logger.info(
-                f"Did not find save file {self.config.save_file}, "
-                f"starting from seed.")
-        elif os.path.exists(self.config.save_file) and restart:
-            # Save file does exists, but request to start from seed.
-            self.logger.info(
-                f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
-        # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
-        if restart:
-            for url in self.config.seed_urls:
-                self.add_url(url)
-        else:
-            # Set the frontier state with contents of save file.
-            self._parse_save_file()
-            if not self.save:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
-
-    def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
-        tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
-        self.logger.info(
-            f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
-
-    def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
-
-    def add_url(self, url):
-        url = normalize(url)
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
-    def mark_url_complete(self, url):
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
-
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+import json
+import os
+import shelve
+import shutil
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from heapq import heappush, heappop
+from itertools import count
+from threading import Thread, RLock, Condition
+from queue import Queue, Empty
+from urllib.parse import urlparse
+
+from crawler.host_health import HostHealth, CLOSED, HALF_OPEN, DEAD
+from crawler.priority import score_url, THROTTLED_PENALTY
+from crawler.sharding import shard_of
+from crawler.spill_heap import SpillHeap
+from crawler.trap_detector import TrapDetector, THROTTLED, BLOCKED
+from crawler.wal import WriteAheadLog
+from utils import get_logger, get_urlhash, normalize
+from utils.metrics import metrics
+from utils.robots import robots
+from utils.seen_index import SeenIndex
+from utils.simhash import SimHashIndex
+from scraper import is_valid, stats as crawl_stats
+
+# How many urls are queued between checks of the memory used by queues.
+SPILL_CHECK_EVERY = 1024
+
+
+class Frontier(object):
+    def __init__(self, config, restart):
+        self.logger = get_logger("FRONTIER")
+        self.config = config
+        # All frontier state is guarded by one lock so that any number of
+        # workers can share the frontier.
+        self.lock = RLock()
+        self.has_work = Condition(self.lock)
+        # host -> SpillHeap of (score, sequence, url, depth) entries waiting
+        # to be downloaded from that host, lowest score first. Entries beyond
+        # FRONTIERMEMORY are spilled to sorted files in spill_dir.
+        self.host_queues = dict()
+        self.spill_dir = f"{self.config.save_file}.spill"
+        self.sequence = count()
+        self.queued = 0
+        # Heap of (ready time, host) for hosts inside their politeness
+        # window, and heap of (score, sequence, host) for hosts that may be
+        # requested now, keyed by their best url. ready_keys holds the
+        # current (score, sequence) of each ready host; older heap entries
+        # of a host are skipped.
+        self.waiting_hosts = list()
+        self.ready_hosts = list()
+        self.ready_keys = dict()
+        # host -> earliest time the next request to that host may be sent.
+        self.next_request = dict()
+        # Downloads handed out per host, for the host share of the score.
+        self.downloads = Counter()
+        # Sum of downloads, kept up to date so that add_url does not add up
+        # every host.
+        self.downloads_total = 0
+        # url -> (score, depth) of urls handed to a worker that have not been
+        # marked complete yet.
+        self.in_progress = dict()
+        # Urls loaded from the pending index that still have to be checked
+        # with is_valid when REVALIDATE is lazy.
+        self.unvalidated = set()
+        # urlhash -> (url, completed) for updates that are in the write
+        # ahead log but not yet compacted into the save file.
+        self.unsaved = dict()
+        # Nesting depth of batch, which defers compaction.
+        self.batching = 0
+        self.log_file = f"{self.config.save_file}.log"
+        # Urls not downloaded yet and the seen index, both written at every
+        # compaction so that a resumed crawl does not rescan the save file.
+        self.pending_file = f"{self.config.save_file}.pending"
+        self.seen_file = f"{self.config.save_file}.seen"
+        # Fingerprints of every url ever added, so that add_url only has to
+        # touch the save file on a possible duplicate.
+        self.seen = SeenIndex(bloom_bits=self.config.seen_bloom_bits)
+        # SimHashes of the pages scraped so far, to skip near duplicates.
+        self.simhash_file = f"{self.config.save_file}.simhash"
+        self.near_duplicates = SimHashIndex(self.config.simhash_distance)
+        # Statistics for report.txt, kept consistent with the snapshots.
+        self.stats_file = f"{self.config.save_file}.stats"
+        self.stats = crawl_stats
+        # Url templates learned to be traps, saved with the snapshots so
+        # that a resumed crawl keeps blocking them.
+        self.traps_file = f"{self.config.save_file}.traps"
+        self.traps = TrapDetector(
+            self.config.trap_min_fetches, self.config.trap_min_yield,
+            self.config.trap_budget)
+        # Latency and failures of every host, which hold back or park the
+        # urls of failing hosts. Saved with the snapshots as well.
+        self.health_file = f"{self.config.save_file}.health"
+        self.health = HostHealth(
+            self.config.host_failures, self.config.host_error_rate,
+            self.config.host_backoff, self.config.host_max_backoff,
+            self.config.host_cooldown, self.config.host_max_cooldown,
+            self.config.host_probes, self.config.host_max_opens,
+            self.config.host_slow)
+        # robots.txt rules of every host read so far, shared with is_valid.
+        self.robots_file = f"{self.config.save_file}.robots"
+        self.robots = robots
+        self.robots.ttl = self.config.robots_ttl
+        self.robots.clear()
+        # host -> the url whose worker reads the robots.txt of host. No other
+        # url of the host is handed out until it is read.
+        self.reading_robots = dict()
+        # ShardRouter of a sharded crawl, which takes the urls of hosts
+        # owned by other shards.
+        self.router = None
+
+        if not os.path.exists(self.config.save_file) and not restart:
+            # Save file does not exist, but request to load save.
+            self.logger.info(
+                f"Did not find save file {self.config.save_file}, "
+                f"starting from seed.")
+        elif os.path.exists(self.config.save_file) and restart:
+            # Save file does exists, but request to start from seed.
+            self.logger.info(
+                f"Found save file {self.config.save_file}, deleting it.")
+            os.remove(self.config.save_file)
+        if restart:
+            for path in (self.log_file, self.pending_file, self.seen_file,
+                         self.simhash_file, self.stats_file, self.traps_file,
+                         self.health_file, self.robots_file):
+                if os.path.exists(path):
+                    os.remove(path)
+        # Spilled urls are also in the pending index, so the runs of an
+        # earlier crawl are never read again.
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        # Load existing save file, or create one if it does not exist. Some
+        # dbm backends read their whole key index on open, so this happens
+        # in the background; only duplicate checks and compaction wait on it.
+        self._save = None
+        self._save_opener = Thread(target=self._open_save, daemon=True)
+        self._save_opener.start()
+        if not restart:
+            # Set the frontier state with contents of save file.
+            self._load()
+        self.log = WriteAheadLog(
+            self.log_file, self.config.sync_batch, self.config.sync_interval)
+        if restart or not len(self.seen):
+            for url in self.config.seed_urls:
+                # Every shard only seeds its own hosts.
+                if shard_of(url, self.config.shards) == self.config.shard_id:
+                    self.add_url(url)
+
+    @property
+    def save(self):
+        self._save_opener.join()
+        return self._save
+
+    def _open_save(self):
+        self._save = shelve.open(self.config.save_file)
+
+    def _load(self):
+        ''' Restores the seen index and the urls still to be downloaded,
+        then replays updates that were logged after the last compaction.
+        Urls completed after it are downloaded again: the stats and the
+        other snapshots were written at that compaction and do not count
+        them. '''
+        start = time.monotonic()
+        if os.path.exists(self.pending_file) and os.path.exists(self.seen_file):
+            self.seen = SeenIndex.load(self.seen_file)
+            pending = self._read_pending()
+        else:
+            # Save file from before the pending index existed.
+            pending = self._parse_save_file()
+        if os.path.exists(self.simhash_file):
+            self.near_duplicates = SimHashIndex.load(
+                self.simhash_file, self.config.simhash_distance)
+        if os.path.exists(self.stats_file):
+            self.stats.restore(self.stats_file)
+        if os.path.exists(self.traps_file):
+            self.traps.load(self.traps_file)
+        if os.path.exists(self.health_file):
+            self.health.load(self.health_file)
+        if os.path.exists(self.robots_file):
+            self.robots.load(self.robots_file)
+
+        replayed = requeued = 0
+        for url, completed, *priority in WriteAheadLog.replay(self.log_file):
+            urlhash = get_urlhash(url)
+            self.save[urlhash] = (url, False)
+            self.seen.add(SeenIndex.fingerprint(urlhash))
+            if completed:
+                pending.setdefault(url, None)
+                requeued += 1
+            else:
+                pending[url] = tuple(priority) or None
+            replayed += 1
+        if replayed:
+            self.save.sync()
+            self.logger.info(
+                f"Recovered {replayed} updates from {self.log_file}, "
+                f"downloading {requeued} completed urls again.")
+
+        lazy = self.config.revalidate == "lazy"
+        for url, priority in pending.items():
+            if lazy:
+                self.unvalidated.add(url)
+            elif not is_valid(url):
+                continue
+            # Urls saved before urls were scored start as seeds.
+            depth, score = priority or (0, score_url(url, 0, 0, 0))
+            self._enqueue(url, depth, score)
+        self._write_snapshots()
+        # Only now are the replayed updates in the save file and the
+        # snapshots, so a crash before this replays them again.
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
+        self.logger.info(
+            f"Loaded {len(pending)} pending urls in "
+            f"{time.monotonic() - start:.2f}s.")
+        self._log_seen_usage()
+
+    def _read_pending(self):
+        ''' Returns url -> (depth, score) for the urls in the pending index,
+        or url -> None for urls written before urls were scored. '''
+        pending = dict()
+        with open(self.pending_file, "rb") as lines:
+            for line in lines:
+                record = json.loads(line)
+                if isinstance(record, str):
+                    pending[record] = None
+                else:
+                    url, depth, score = record
+                    pending[url] = (depth, score)
+        return pending
+
+    def _write_snapshots(self):
+        ''' Writes the pending urls and the seen index next to the save
+        file. Both are replaced atomically. '''
+        with self.lock:
+            tmp_file = f"{self.pending_file}.tmp"
+            with open(tmp_file, "wb") as pending:
+                for url, (score, depth) in self.in_progress.items():
+                    pending.write(
+                        json.dumps([url, depth, score]).encode("utf-8") + b"\n")
+                for queue in self.host_queues.values():
+                    for score, _, url, depth in queue:
+                        pending.write(
+                            json.dumps([url, depth, score]).encode("utf-8")
+                            + b"\n")
+            os.replace(tmp_file, self.pending_file)
+            self.seen.save(self.seen_file)
+            self.near_duplicates.save(self.simhash_file)
+            self.stats.save(self.stats_file)
+            self.traps.save(self.traps_file)
+            self.health.save(self.health_file)
+            self.robots.save(self.robots_file)
+
+    def _compact(self):
+        ''' Folds the logged updates into the save file with a single sync
+        and empties the log. '''
+        with self.lock:
+            if not self.unsaved:
+                return
+            with metrics.time("compact"):
+                for urlhash, entry in self.unsaved.items():
+                    self.save[urlhash] = entry
+                self.save.sync()
+                self._write_snapshots()
+                self.log.truncate()
+                self.unsaved.clear()
+            self._log_seen_usage()
+
+    def _record(self, urlhash, url, completed, *priority):
+        ''' Logs an update. It may compact, so it is called once the queues
+        and the other snapshotted state include the update. '''
+        self.unsaved[urlhash] = (url, completed)
+        self.log.append((url, completed, *priority))
+        if (len(self.unsaved) >= self.config.compact_every
+                and not self.batching):
+            self._compact()
+
+    @contextmanager
+    def batch(self):
+        ''' Holds the frontier lock and defers compaction until the end, so
+        that the snapshots hold either all or none of the updates made in
+        it, including those to the stats and the near duplicate index. '''
+        with self.lock:
+            self.batching += 1
+            try:
+                yield
+            finally:
+                self.batching -= 1
+                if (not self.batching and
+                        len(self.unsaved) >= self.config.compact_every):
+                    self._compact()
+
+    def checkpoint(self):
+        ''' Compacts now, so that a resumed crawl downloads at most the
+        urls completed since the last checkpoint again. '''
+        self._compact()
+
+    def _parse_save_file(self):
+        ''' This function can be overridden for alternate saving techniques.
+        Returns the urls that have not been downloaded yet. '''
+        total_count = len(self.save)
+        pending = dict()
+        for urlhash, (url, completed) in self.save.items():
+            self.seen.add(SeenIndex.fingerprint(urlhash))
+            if not completed:
+                pending[url] = None
+        self.logger.info(
+            f"Found {len(pending)} urls to be downloaded from {total_count} "
+            f"total urls discovered.")
+        return pending
+
+    def _log_seen_usage(self):
+        self.logger.info(
+            f"Seen index holds {len(self.seen)} urls in "
+            f"{self.seen.memory_usage() / 2 ** 20:.1f} MB "
+            f"({self.seen.bytes_per_url():.1f} bytes per url). "
+            f"Skipped {self.near_duplicates.duplicates} near duplicates of "
+            f"{len(self.near_duplicates)} distinct pages. "
+            f"Throttled {self.traps.count(THROTTLED)} and blocked "
+            f"{self.traps.count(BLOCKED)} of {len(self.traps)} url templates. "
+            f"Parked {len(self.health) - self.health.count(CLOSED)} and gave up "
+            f"on {self.health.count(DEAD)} of {len(self.health)} hosts.")
+
+    def _enqueue(self, url, depth, score):
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            entry = (score, next(self.sequence), url, depth)
+            queue = self.host_queues.get(host)
+            if queue is None:
+                queue = self.host_queues[host] = SpillHeap(self.spill_dir)
+                heappush(
+                    self.waiting_hosts, (self.next_request.get(host, 0), host))
+                self.has_work.notify()
+            elif host in self.ready_keys and entry < queue.peek():
+                self._make_ready(host, entry)
+            queue.push(entry)
+            self.queued += 1
+            if (self.queued > self.config.frontier_memory
+                    and not entry[1] % SPILL_CHECK_EVERY):
+                self._spill()
+
+    def _spill(self):
+        ''' Moves the worst half of the largest host queues to disk until at
+        most FRONTIERMEMORY urls are kept in memory. '''
+        in_memory = sum(len(queue.heap) for queue in self.host_queues.values())
+        while in_memory > self.config.frontier_memory:
+            queue = max(
+                self.host_queues.values(), key=lambda queue: len(queue.heap))
+            spilled = queue.spill(len(queue.heap) // 2)
+            if not spilled:
+                break
+            in_memory -= spilled
+
+    def _make_ready(self, host, entry):
+        self.ready_keys[host] = entry[:2]
+        heappush(self.ready_hosts, (entry[0], entry[1], host))
+
+    def _pop_ready_host(self, now):
+        ''' Returns the host whose best url has the lowest score among the
+        hosts outside their politeness window, or None. '''
+        while self.waiting_hosts and self.waiting_hosts[0][0] <= now:
+            ready_time, host = heappop(self.waiting_hosts)
+            if (host not in self.host_queues
+                    or ready_time < self.next_request.get(host, 0)):
+                # The host was held back again after this entry was pushed.
+                continue
+            self._make_ready(host, self.host_queues[host].peek())
+        while self.ready_hosts:
+            score, sequence, host = heappop(self.ready_hosts)
+            if self.ready_keys.get(host) == (score, sequence):
+                del self.ready_keys[host]
+                if self.next_request.get(host, 0) > now:
+                    # Held back while it was ready; its entry in
+                    # waiting_hosts makes it ready again.
+                    continue
+                return host
+        return None
+
+    def _hold_host(self, host, ready_time):
+        ''' Makes host wait until ready_time, which may be earlier than
+        the time it was waiting for. '''
+        self.next_request[host] = ready_time
+        if host in self.host_queues:
+            heappush(self.waiting_hosts, (ready_time, host))
+            self.has_work.notify()
+
+    def _drop_host(self, host):
+        queue = self.host_queues.pop(host, None)
+        if queue is None:
+            return
+        self.logger.info(f"Dropping {len(queue)} urls of dead host {host}.")
+        self.queued -= len(queue)
+        queue.close()
+        self.ready_keys.pop(host, None)
+
+    def get_tbd_url(self):
+        ''' Blocks until some host's politeness window has passed and returns
+        the best scored url of such a host. Returns None once no urls are
+        queued and no worker is still processing a url that could add
+        more. '''
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                host = self._pop_ready_host(now)
+                if host is not None:
+                    if host in self.reading_robots:
+                        # Parked until robots_read pushes it again.
+                        continue
+                    queue = self.host_queues[host]
+                    if self.health.state(host) == DEAD:
+                        self._drop_host(host)
+                        continue
+                    hold = self.health.hold(host, time.time())
+                    if hold:
+                        # Parked until its circuit is half-open.
+                        self._hold_host(host, now + hold)
+                        continue
+                    score, _, url, depth = queue.pop()
+                    self.queued -= 1
+                    if url in self.unvalidated:
+                        self.unvalidated.discard(url)
+                        if not is_valid(url):
+                            self._requeue_host(host, queue, now)
+                            continue
+                    if self.traps.classify(url) == BLOCKED:
+                        # Blocked after the url was queued.
+                        self._requeue_host(host, queue, now)
+                        continue
+                    self.health.start(host, time.time())
+                    if self.config.robots and self.robots.claim(host):
+                        # The worker of url reads robots.txt first.
+                        self.reading_robots[host] = url
+                    self.next_request[host] = now + self._delay(host)
+                    self._requeue_host(host, queue, self.next_request[host])
+                    self.in_progress[url] = (score, depth)
+                    self.downloads[host] += 1
+                    self.downloads_total += 1
+                    return url
+                if self.waiting_hosts:
+                    self.has_work.wait(self.waiting_hosts[0][0] - now)
+                    continue
+                if self.router is not None and not self.router.finished.is_set():
+                    # Other shards may still send urls.
+                    self.has_work.wait(self.config.shard_interval)
+                    continue
+                if not self.in_progress:
+                    # Wake the other idle workers so they can stop as well.
+                    self.has_work.notify_all()
+                    self._compact()
+                    return None
+                self.has_work.wait()
+
+    def _delay(self, host):
+        ''' Seconds between two requests to host. The Crawl-delay of
+        robots.txt can only lengthen the politeness delay, up to
+        ROBOTSMAXDELAY. '''
+        return max(self.config.time_delay, min(
+            self.robots.crawl_delay(host), self.config.robots_max_delay))
+
+    def wait_turn(self, url):
+        ''' Blocks until url's host is outside its politeness window and
+        starts a new one, for requests the frontier does not hand out
+        itself: robots.txt, sitemaps and the url read after them. '''
+        host = urlparse(url).netloc.lower()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.next_request.get(host, 0) - now
+                if wait <= 0:
+                    self.next_request[host] = now + self._delay(host)
+                    if host in self.host_queues:
+                        heappush(
+                            self.waiting_hosts,
+                            (self.next_request[host], host))
+                    return
+            # Sleeps outside of has_work, whose notifications are meant for
+            # the workers waiting for a url.
+            time.sleep(wait)
+
+    def reads_robots(self, url):
+        ''' True if the worker of url has to read the robots.txt of its host
+        before downloading url. '''
+        with self.lock:
+            return self.reading_robots.get(urlparse(url).netloc.lower()) == url
+
+    def robots_read(self, url):
+        ''' Called by the worker of url once the robots.txt of its host was
+        read, so that the other urls of the host are handed out again. '''
+        host = urlparse(url).netloc.lower()
+        self.robots.release(host)
+        with self.lock:
+            if self.reading_robots.get(host) == url:
+                del self.reading_robots[host]
+                self._hold_host(host, self.next_request.get(host, 0))
+
+    def _requeue_host(self, host, queue, ready_time):
+        if queue:
+            heappush(self.waiting_hosts, (ready_time, host))
+        else:
+            queue.close()
+            del self.host_queues[host]
+
+    def add_url(self, url, parent=None, parent_words=0, depth=None):
+        ''' Queues url if it was never seen before. parent is the url of
+        the page it was found on, which has parent_words words; both feed
+        into the url's score. depth, if given, replaces the parent's depth
+        plus one, for urls found by another shard. '''
+        with metrics.time("frontier_add"):
+            self._add_url(url, parent, parent_words, depth)
+
+    def _add_url(self, url, parent, parent_words, depth):
+        url = normalize(url)
+        if self.router is not None and not self.router.owns(url):
+            with self.lock:
+                if depth is None and parent in self.in_progress:
+                    depth = self.in_progress[parent][1] + 1
+            self.router.forward(url, depth or 0, parent_words)
+            return
+        urlhash = get_urlhash(url)
+        fingerprint = SeenIndex.fingerprint(urlhash)
+        with self.lock:
+            if fingerprint in self.seen and (
+                    urlhash in self.unsaved or urlhash in self.save):
+                return
+            trap_state = self.traps.classify(url)
+            if trap_state == BLOCKED:
+                return
+            host = urlparse(url).netloc.lower()
+            if self.health.state(host) == DEAD:
+                return
+            self.seen.add(fingerprint)
+            if depth is None:
+                depth = 0
+                if parent in self.in_progress:
+                    depth = self.in_progress[parent][1] + 1
+            host_share = 0
+            if self.downloads_total:
+                host_share = self.downloads[host] / self.downloads_total
+            score = score_url(url, depth, parent_words, host_share)
+            if trap_state == THROTTLED:
+                score += THROTTLED_PENALTY
+            self._enqueue(url, depth, score)
+            self._record(urlhash, url, False, depth, score)
+
+    def is_idle(self):
+        ''' True if no url is queued or being processed. '''
+        with self.lock:
+            return not self.queued and not self.in_progress
+
+    def wake_workers(self):
+        with self.lock:
+            self.has_work.notify_all()
+
+    def gauges(self):
+        ''' Queue depths for the metrics: urls queued and in progress,
+        hosts with queued urls and the urls queued per host. '''
+        with self.lock:
+            return {
+                "frontier_queued": self.queued,
+                "frontier_in_progress": len(self.in_progress),
+                "frontier_hosts": len(self.host_queues),
+                "hosts_parked": len(self.health) - self.health.count(CLOSED),
+                "host_backlog": {
+                    host: len(queue)
+                    for host, queue in self.host_queues.items()},
+            }
+
+    def record_fetch(self, url, status, latency):
+        ''' Records the status of the response for url and how many seconds
+        it took, and holds back or parks its host if it is failing. '''
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            probing = self.health.state(host) == HALF_OPEN
+            wait, change = self.health.record(
+                host, status, latency, time.time())
+            if change is not None:
+                self.logger.info(f"Circuit of host {host} is now {change}.")
+            if change == DEAD:
+                self._drop_host(host)
+                return
+            now = time.monotonic()
+            if wait and now + wait > self.next_request.get(host, 0):
+                self._hold_host(host, now + wait)
+            elif probing:
+                # The host waited for this probe; it may be requested again
+                # after the politeness delay.
+                self._hold_host(host, now + self.config.time_delay)
+
+    def release_probe(self, url):
+        ''' Called for a url that was handed out but not fetched, such as
+        one robots.txt disallows. If it was the probe of a half-open host,
+        the host gets another probe instead of waiting for its cooldown. '''
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            if self.health.release(host):
+                self._hold_host(host, time.monotonic() + self._delay(host))
+
+    def mark_url_complete(self, url, useful=None):
+        ''' Releases url. useful tells whether its page added new text, for
+        the trap detector; None if unknown. '''
+        urlhash = get_urlhash(url)
+        with self.lock:
+            if urlhash not in self.unsaved and urlhash not in self.save:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            self.in_progress.pop(url, None)
+            if useful is not None:
+                change = self.traps.record(url, useful)
+                if change is not None:
+                    self.logger.info(
+                        f"Url template {change[0]} is now {change[1]}.")
+            self._record(urlhash, url, True)
+            if not self.in_progress:
+                self.has_work.notify_all()
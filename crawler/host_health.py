@@ -0,0 +1,175 @@
+import os
+import pickle
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+DEAD = "dead"
+
+# Fetches over which the error rate of a host is averaged, and how many a
+# host needs before its error rate can open its circuit.
+WINDOW = 20
+
+
+def is_failure(status, latency, slow):
+    ''' A fetch fails if the cache server could not be reached (no status),
+    the host or the cache server returned an error (5xx, 6xx) or asked to
+    slow down (429), or the fetch took longer than slow seconds. '''
+    return status is None or status >= 500 or status == 429 or latency > slow
+
+
+class HostState(object):
+    def __init__(self):
+        self.fetches = 0
+        # Moving averages of the latency and of the share of failures.
+        self.latency = 0.0
+        self.errors = 0.0
+        self.consecutive = 0
+        self.state = CLOSED
+        # Wall clock time until which the circuit stays open, or until
+        # which a probe is waited for.
+        self.until = 0.0
+        self.cooldown = 0.0
+        # Times the circuit opened since it was last closed.
+        self.opens = 0
+        self.probes = 0
+        self.probing = False
+
+
+class HostHealth(object):
+    ''' Tracks the latency, error rate and consecutive failures of every
+    host and decides how long its urls have to wait.
+
+    After each failure a host is held back for backoff seconds, doubled per
+    consecutive failure up to max_backoff. After failures consecutive
+    failures, or once more than error_rate of its recent fetches failed,
+    its circuit opens: its urls stay parked in the frontier for cooldown
+    seconds. Then the circuit is half-open and one url at a time is let
+    through as a probe; probes successful probes close the circuit, a
+    failed one opens it again for twice as long, up to max_cooldown, so a
+    host that stays down is only probed every max_cooldown seconds. With
+    max_opens set, a host that fails again after its circuit opened
+    max_opens times without closing is dead instead, and its urls are
+    dropped. Times are wall clock times, so that parked hosts stay parked
+    when a crawl is resumed. '''
+
+    def __init__(self, failures=5, error_rate=0.5, backoff=1,
+                 max_backoff=60, cooldown=60, max_cooldown=600, probes=2,
+                 max_opens=0, slow=10):
+        self.failures = failures
+        self.error_rate = error_rate
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probes = probes
+        self.max_opens = max_opens
+        self.slow = slow
+        self.alpha = 2 / (WINDOW + 1)
+        # host -> HostState
+        self.hosts = dict()
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def state(self, host):
+        entry = self.hosts.get(host)
+        return entry.state if entry is not None else CLOSED
+
+    def count(self, state):
+        return sum(entry.state == state for entry in self.hosts.values())
+
+    def hold(self, host, now):
+        ''' Returns how many more seconds the urls of host have to wait
+        because of its health, 0 if one may be downloaded now. '''
+        entry = self.hosts.get(host)
+        if entry is None or entry.state == CLOSED:
+            return 0
+        if entry.state == OPEN:
+            if entry.until > now:
+                return entry.until - now
+            entry.state = HALF_OPEN
+            entry.probing = False
+        if entry.state == HALF_OPEN and entry.probing and entry.until > now:
+            return entry.until - now
+        return 0
+
+    def start(self, host, now):
+        ''' Called when a url of host is handed out. In a half-open circuit
+        it is a probe, and the host waits for its result, at most
+        cooldown seconds. '''
+        entry = self.hosts.get(host)
+        if entry is not None and entry.state == HALF_OPEN:
+            entry.probing = True
+            entry.until = now + entry.cooldown
+
+    def release(self, host):
+        ''' Called when a url of host was handed out but not fetched.
+        Returns True if it was a probe, so that another url may be let
+        through in its place. '''
+        entry = self.hosts.get(host)
+        if entry is None or entry.state != HALF_OPEN or not entry.probing:
+            return False
+        entry.probing = False
+        return True
+
+    def record(self, host, status, latency, now):
+        ''' Records a fetch from host. Returns the seconds the host has to
+        wait before its next fetch, 0 if only the politeness delay, and the
+        new state of its circuit if the fetch changed it, otherwise None. '''
+        entry = self.hosts.get(host)
+        if entry is None:
+            entry = self.hosts[host] = HostState()
+        failed = is_failure(status, latency, self.slow)
+        entry.fetches += 1
+        entry.latency += self.alpha * (latency - entry.latency)
+        entry.errors += self.alpha * (failed - entry.errors)
+        entry.consecutive = entry.consecutive + 1 if failed else 0
+        state = entry.state
+        if state == CLOSED and failed and (
+                entry.consecutive >= self.failures or
+                (entry.fetches >= WINDOW and
+                 entry.errors > self.error_rate)):
+            entry.cooldown = self.cooldown
+            self._open(entry, now)
+        elif state == HALF_OPEN and entry.probing:
+            entry.probing = False
+            if failed:
+                entry.cooldown = min(2 * entry.cooldown, self.max_cooldown)
+                self._open(entry, now)
+            else:
+                entry.probes += 1
+                if entry.probes >= self.probes:
+                    entry.state = CLOSED
+                    entry.opens = 0
+                    entry.errors = 0.0
+        wait = 0
+        if entry.state == OPEN:
+            wait = entry.until - now
+        elif entry.state == CLOSED and entry.consecutive:
+            wait = min(
+                self.backoff * 2 ** (entry.consecutive - 1), self.max_backoff)
+        return wait, (entry.state if entry.state != state else None)
+
+    def _open(self, entry, now):
+        entry.opens += 1
+        entry.probes = 0
+        if self.max_opens and entry.opens > self.max_opens:
+            entry.state = DEAD
+            return
+        entry.state = OPEN
+        entry.until = now + entry.cooldown
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as hosts:
+            pickle.dump(self.hosts, hosts, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        ''' Restores the hosts saved at path. A probe in flight when they
+        were saved is sent again. '''
+        with open(path, "rb") as hosts:
+            self.hosts = pickle.load(hosts)
+        for entry in self.hosts.values():
+            entry.probing = False
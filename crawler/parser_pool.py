@@ -0,0 +1,59 @@
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+from utils import get_logger
+import scraper
+
+
+class ParserPool(object):
+    ''' Runs scraper.analyze_content in parser processes, outside the GIL
+    of the crawler process.
+
+    Workers block on the result of their page, and at most parser_queue
+    pages are submitted at once, so downloads cannot run far ahead of the
+    parsers. Crawl statistics and frontier updates stay in the crawler
+    process. A pool whose process died is replaced. '''
+
+    def __init__(self, config):
+        self.logger = get_logger("PARSERS")
+        self.config = config
+        self.lock = Lock()
+        self.executor = self._start()
+        self.slots = BoundedSemaphore(self.config.parser_queue)
+
+    def _start(self):
+        # Spawned rather than forked, since the crawler already runs threads.
+        return ProcessPoolExecutor(
+            max_workers=self.config.parser_processes,
+            mp_context=multiprocessing.get_context("spawn"))
+
+    def _restart(self, broken):
+        ''' Replaces the broken executor, unless another worker already
+        did. '''
+        with self.lock:
+            if self.executor is broken:
+                self.logger.error("A parser process died, restarting them.")
+                broken.shutdown(wait=False)
+                self.executor = self._start()
+
+    def analyze_content(self, url, page_url, content):
+        ''' Same result as scraper.analyze_content(url, page_url, content).
+        A page is tried again once in a new pool if a parser process died;
+        if it kills that one too, it is skipped and None returned. '''
+        with self.slots:
+            for _ in range(2):
+                executor = self.executor
+                try:
+                    return executor.submit(
+                        scraper.analyze_content, url, page_url,
+                        content).result()
+                except BrokenProcessPool:
+                    self._restart(executor)
+            self.logger.error(f"Skipping {url}, its parser process died.")
+            return None
+
+    def shutdown(self):
+        self.executor.shutdown()
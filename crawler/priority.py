@@ -0,0 +1,41 @@
+from urllib.parse import urlparse
+
+# Weights of the signals, in links of depth. A parent page with at least
+# PARENT_TEXT_CAP words is worth one link, a host that got every download
+# so far costs HOST_SHARE_WEIGHT links, and each point of trap likeness one.
+PARENT_TEXT_CAP = 2000
+PARENT_TEXT_WEIGHT = 1.0
+HOST_SHARE_WEIGHT = 3.0
+TRAP_WEIGHT = 1.0
+# Added to the score of urls whose template the trap detector throttled.
+THROTTLED_PENALTY = 10.0
+# Path segments beyond this many count towards trap likeness.
+SHALLOW_SEGMENTS = 4
+
+
+def trap_likeness(url):
+    ''' Rough measure of how much url looks like a crawler trap: deep or
+    repetitive paths, query strings and long runs of digits, as found in
+    calendars, paginated listings and session urls. 0 for a plain url. '''
+    parsed = urlparse(url)
+    segments = [segment for segment in parsed.path.split("/") if segment]
+    likeness = max(0, len(segments) - SHALLOW_SEGMENTS) / 2
+    likeness += len(segments) - len(set(segments))
+    if parsed.query:
+        likeness += 1 + parsed.query.count("&") / 2
+    digits = sum(char.isdigit() for char in parsed.path + parsed.query)
+    likeness += min(digits, 16) / 8
+    return likeness
+
+
+def score_url(url, depth, parent_words, host_share):
+    ''' Priority of url for the frontier; lower scores are downloaded
+    first. depth counts links from a seed url, parent_words is the number
+    of words on the page that linked to url and host_share the fraction of
+    downloads so far that went to url's host. '''
+    return (
+        depth
+        - PARENT_TEXT_WEIGHT * min(parent_words, PARENT_TEXT_CAP)
+        / PARENT_TEXT_CAP
+        + HOST_SHARE_WEIGHT * host_share
+        + TRAP_WEIGHT * trap_likeness(url))
@@ -0,0 +1,225 @@
+import multiprocessing
+import os
+import zlib
+
+from multiprocessing.connection import Listener, Client
+from threading import Thread, Lock, Event
+from urllib.parse import urlparse
+
+from utils import get_logger, get_urlhash
+from utils.seen_index import SeenIndex
+from utils.stats import merge_reports
+
+
+def shard_of(url, shards):
+    ''' Index of the shard that owns url's host. The hash is the same in
+    every process, unlike hash(). '''
+    host = urlparse(url).netloc.lower()
+    return zlib.crc32(host.encode("utf-8")) % shards
+
+
+def shard_config(config, shard_id):
+    ''' Points config at the files of shard shard_id, so that shards
+    sharing a directory do not share a save file, logs or metrics. '''
+    config.shard_id = shard_id
+    config.save_file = f"{config.save_file}.shard{shard_id}"
+    config.log_dir = os.path.join(config.log_dir, f"shard{shard_id}")
+    config.metrics_file = f"{config.metrics_file}.shard{shard_id}"
+    if config.metrics_port:
+        config.metrics_port += shard_id
+    return config
+
+
+def report_file(shard_id):
+    return f"report.shard{shard_id}.txt"
+
+
+def run_shard(config, restart, shard_id):
+    ''' Crawls the partition of shard shard_id, then saves its statistics
+    for the merged report. '''
+    import scraper
+    from crawler import Crawler
+    shard_config(config, shard_id)
+    scraper.REPORT_FILE = report_file(shard_id)
+    crawler = Crawler(config, restart)
+    crawler.start()
+    crawler.frontier.stats.save(crawler.frontier.stats_file)
+
+
+def run_local_shards(config, restart, report_path="report.txt"):
+    ''' Runs every shard in a process of its own on this machine and
+    merges their statistics into report_path. Returns the merged
+    statistics. '''
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_shard, args=(config, restart, shard_id))
+        for shard_id in range(config.shards)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return merge_reports(report_path, [
+        f"{config.save_file}.shard{shard_id}.stats"
+        for shard_id in range(config.shards)])
+
+
+class ShardRouter(object):
+    ''' Connects the frontier of one shard to the other shards.
+
+    Links to hosts of other shards are buffered per shard and sent in
+    batches by a sender thread, over multiprocessing connections. Links
+    received are added to the frontier with the depth they had at the
+    sender.
+
+    Every SHARDINTERVAL seconds each shard also sends its status: whether
+    its frontier is idle and how many links it sent and received in
+    total. The crawl is finished once every shard is idle, as many links
+    were received as were sent, and nothing changed over two intervals.
+    Until then, workers of an idle shard wait for links instead of
+    stopping. '''
+
+    def __init__(self, config, frontier):
+        self.logger = get_logger("SHARDS")
+        self.config = config
+        self.frontier = frontier
+        self.shard_id = config.shard_id
+        self.shards = config.shards
+        self.lock = Lock()
+        # shard -> links waiting to be sent to it, as (url, depth, words).
+        self.outgoing = {
+            shard: list() for shard in range(self.shards)
+            if shard != self.shard_id}
+        self.connections = dict()
+        # Links sent before, so that each is only forwarded once.
+        self.forwarded = SeenIndex()
+        self.sent = 0
+        self.received = 0
+        # shard -> (idle, sent, received) last reported by that shard.
+        self.statuses = dict()
+        self.previous = None
+        self.finished = Event()
+        self.wake = Event()
+        self.stopped = Event()
+        self.listener = Listener(
+            config.shard_addresses[self.shard_id],
+            authkey=config.shard_authkey)
+        self.threads = [
+            Thread(target=self._accept, daemon=True),
+            Thread(target=self._send_periodically, daemon=True)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        self.threads[1].join()
+        self.listener.close()
+        for connection in self.connections.values():
+            connection.close()
+
+    def owns(self, url):
+        return shard_of(url, self.shards) == self.shard_id
+
+    def forward(self, url, depth, parent_words):
+        ''' Queues url for the shard that owns it. '''
+        fingerprint = SeenIndex.fingerprint(get_urlhash(url))
+        with self.lock:
+            if fingerprint in self.forwarded:
+                return
+            self.forwarded.add(fingerprint)
+            batch = self.outgoing[shard_of(url, self.shards)]
+            batch.append((url, depth, parent_words))
+            if len(batch) >= self.config.shard_batch:
+                self.wake.set()
+
+    def _accept(self):
+        while not self.stopped.is_set():
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                if self.stopped.is_set():
+                    return
+                continue
+            Thread(
+                target=self._receive, args=(connection,), daemon=True).start()
+
+    def _receive(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                if message[0] == "links":
+                    for url, depth, parent_words in message[2]:
+                        self.frontier.add_url(
+                            url, parent_words=parent_words, depth=depth)
+                    with self.lock:
+                        self.received += len(message[2])
+                else:
+                    _, shard, idle, sent, received = message
+                    with self.lock:
+                        self.statuses[shard] = (idle, sent, received)
+
+    def _connect(self, shard):
+        connection = self.connections.get(shard)
+        if connection is None:
+            connection = self.connections[shard] = Client(
+                self.config.shard_addresses[shard],
+                authkey=self.config.shard_authkey)
+        return connection
+
+    def _send(self, shard, message):
+        ''' Sends message to shard. Returns False if the shard cannot be
+        reached, for example because it has not started yet. '''
+        try:
+            self._connect(shard).send(message)
+            return True
+        except OSError:
+            connection = self.connections.pop(shard, None)
+            if connection is not None:
+                connection.close()
+            return False
+
+    def _send_periodically(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.config.shard_interval)
+            self.wake.clear()
+            for shard in self.outgoing:
+                with self.lock:
+                    batch = self.outgoing[shard]
+                    self.outgoing[shard] = list()
+                if not batch:
+                    continue
+                if self._send(shard, ("links", self.shard_id, batch)):
+                    with self.lock:
+                        self.sent += len(batch)
+                else:
+                    with self.lock:
+                        self.outgoing[shard][:0] = batch
+            self._send_status()
+
+    def _send_status(self):
+        idle = self.frontier.is_idle()
+        with self.lock:
+            idle = idle and not any(self.outgoing.values())
+            status = (idle, self.sent, self.received)
+            self.statuses[self.shard_id] = status
+        for shard in self.outgoing:
+            self._send(shard, ("status", self.shard_id, *status))
+        with self.lock:
+            statuses = tuple(
+                self.statuses.get(shard) for shard in range(self.shards))
+        if (None not in statuses and all(idle for idle, _, _ in statuses)
+                and sum(sent for _, sent, _ in statuses)
+                == sum(received for _, _, received in statuses)
+                and statuses == self.previous):
+            if not self.finished.is_set():
+                self.logger.info(
+                    f"Every shard is idle after {sum(s[1] for s in statuses)} "
+                    f"forwarded links; stopping.")
+                self.finished.set()
+                self.frontier.wake_workers()
+        self.previous = statuses
@@ -0,0 +1,134 @@
+import os
+import pickle
+import tempfile
+
+from collections import deque
+from heapq import heappush, heappop, merge
+from itertools import islice
+
+
+class SpillRun(object):
+    ''' Sorted entries written to a file by SpillHeap.spill, as pickled
+    chunks of chunk_size entries that are read back one at a time. '''
+
+    def __init__(self, path, entries, chunk_size=4096):
+        self.path = path
+        self.remaining = 0
+        entries = iter(entries)
+        with open(self.path, "wb") as run:
+            while True:
+                chunk = list(islice(entries, chunk_size))
+                if not chunk:
+                    break
+                pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+                self.remaining += len(chunk)
+        self.offset = 0
+        self.buffer = deque()
+
+    def head(self):
+        if not self.buffer:
+            self._read()
+        return self.buffer[0]
+
+    def pop(self):
+        entry = self.head()
+        self.buffer.popleft()
+        self.remaining -= 1
+        return entry
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __iter__(self):
+        yield from self.buffer
+        with open(self.path, "rb") as run:
+            run.seek(self.offset)
+            while True:
+                try:
+                    yield from pickle.load(run)
+                except EOFError:
+                    break
+
+    def _read(self):
+        with open(self.path, "rb") as run:
+            run.seek(self.offset)
+            self.buffer.extend(pickle.load(run))
+            self.offset = run.tell()
+
+
+class SpillHeap(object):
+    ''' Min-heap of tuples whose worst entries can be moved to sorted run
+    files in directory, so that only the best ones stay in memory.
+
+    pop compares the best in-memory entry with the head of every run, so
+    entries come out in the same order as from a plain heap. Entries have
+    to be picklable. '''
+
+    def __init__(self, directory, max_runs=8):
+        self.directory = directory
+        self.max_runs = max_runs
+        self.heap = list()
+        self.runs = list()
+
+    def __len__(self):
+        return len(self.heap) + sum(run.remaining for run in self.runs)
+
+    def __iter__(self):
+        ''' Yields every entry, in no particular order. '''
+        yield from self.heap
+        for run in self.runs:
+            yield from run
+
+    def push(self, entry):
+        heappush(self.heap, entry)
+
+    def peek(self):
+        run = self._best_run()
+        if run is not None and (not self.heap or run.head() < self.heap[0]):
+            return run.head()
+        return self.heap[0]
+
+    def pop(self):
+        run = self._best_run()
+        if run is not None and (not self.heap or run.head() < self.heap[0]):
+            entry = run.pop()
+            if not run.remaining:
+                run.remove()
+                self.runs.remove(run)
+            return entry
+        return heappop(self.heap)
+
+    def spill(self, keep):
+        ''' Keeps the best keep entries in memory and writes the others to
+        a new run. Returns the number of entries written. '''
+        if len(self.heap) <= keep:
+            return 0
+        # A sorted list is a valid heap.
+        self.heap.sort()
+        tail = self.heap[keep:]
+        del self.heap[keep:]
+        self.runs.append(SpillRun(self._new_path(), tail))
+        if len(self.runs) > self.max_runs:
+            runs = self.runs
+            self.runs = [SpillRun(self._new_path(), merge(*runs))]
+            for run in runs:
+                run.remove()
+        return len(tail)
+
+    def close(self):
+        ''' Removes the run files. '''
+        for run in self.runs:
+            run.remove()
+        self.runs.clear()
+
+    def _best_run(self):
+        if not self.runs:
+            return None
+        return min(self.runs, key=SpillRun.head)
+
+    def _new_path(self):
+        os.makedirs(self.directory, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix=".run", dir=self.directory)
+        os.close(handle)
+        return path
@@ -0,0 +1,110 @@
+import os
+import pickle
+import re
+
+from urllib.parse import urlparse, parse_qsl
+
+OPEN = "open"
+THROTTLED = "throttled"
+BLOCKED = "blocked"
+
+DATE_SEGMENT = re.compile(r'\d{4}-\d{1,2}(-\d{1,2})?|\d{8}')
+# Hashes, uuids and session ids: long runs of hex digits and dashes.
+ID_SEGMENT = re.compile(r'(?=.*\d)[0-9a-f-]{12,}')
+DIGITS = re.compile(r'\d+')
+# Path segments kept in a template. Deeper paths share the template of their
+# first segments, so that endlessly nesting directories are one template.
+TEMPLATE_SEGMENTS = 4
+
+
+def _segment_template(segment):
+    if DATE_SEGMENT.fullmatch(segment):
+        return "{date}"
+    if ID_SEGMENT.fullmatch(segment):
+        return "{id}"
+    return DIGITS.sub("{n}", segment)
+
+
+def url_template(url):
+    ''' Reduces url to the template it was probably generated from: digit
+    runs, dates and ids in the path are collapsed and the query keeps only
+    its sorted keys. For example https://ics.uci.edu/events/2024-01-02/?b=1&a=2
+    becomes ics.uci.edu/events/{date}/?a&b. Paths deeper than
+    TEMPLATE_SEGMENTS end in /*. '''
+    parsed = urlparse(url.lower())
+    segments = parsed.path.split("/", TEMPLATE_SEGMENTS + 1)
+    if len(segments) > TEMPLATE_SEGMENTS + 1 and segments[-1]:
+        segments[-1] = "*"
+    path = "/".join(map(_segment_template, segments))
+    keys = sorted({key for key, _ in parse_qsl(
+        parsed.query, keep_blank_values=True)})
+    return f"{parsed.netloc}{path}?{'&'.join(keys)}"
+
+
+class TrapDetector(object):
+    ''' Learns crawler traps from how much new text the urls of each
+    template yield.
+
+    Every fetch updates its template's yield, a moving average of whether
+    the page added new unique text (enough words and not a near
+    duplicate), over roughly the last min_fetches fetches. A template
+    whose yield falls below min_yield after min_fetches fetches is
+    throttled: the frontier deprioritizes its urls. If its yield has not
+    recovered after budget more fetches, it is blocked and its urls are no
+    longer downloaded. '''
+
+    def __init__(self, min_fetches=30, min_yield=0.1, budget=50):
+        self.min_fetches = min_fetches
+        self.min_yield = min_yield
+        self.budget = budget
+        self.alpha = 2 / (min_fetches + 1)
+        # template -> [fetches, yield, state, fetches since throttled]
+        self.templates = dict()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def classify(self, url):
+        ''' Returns OPEN, THROTTLED or BLOCKED for url's template. '''
+        entry = self.templates.get(url_template(url))
+        return entry[2] if entry is not None else OPEN
+
+    def count(self, state):
+        return sum(entry[2] == state for entry in self.templates.values())
+
+    def record(self, url, useful):
+        ''' Records a fetch of url that did or did not yield new text.
+        Returns (template, new state) if the fetch changed the template's
+        state, otherwise None. '''
+        template = url_template(url)
+        entry = self.templates.get(template)
+        if entry is None:
+            entry = self.templates[template] = [0, 1.0, OPEN, 0]
+        entry[0] += 1
+        entry[1] += self.alpha * (useful - entry[1])
+        state = entry[2]
+        if state == OPEN:
+            if entry[0] >= self.min_fetches and entry[1] < self.min_yield:
+                state = THROTTLED
+                entry[3] = 0
+        elif state == THROTTLED:
+            entry[3] += 1
+            if entry[1] >= self.min_yield:
+                state = OPEN
+            elif entry[3] >= self.budget:
+                state = BLOCKED
+        if state == entry[2]:
+            return None
+        entry[2] = state
+        return template, state
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as templates:
+            pickle.dump(self.templates, templates, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        ''' Restores the templates saved at path. '''
+        with open(path, "rb") as templates:
+            self.templates = pickle.load(templates)
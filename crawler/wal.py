@@ -0,0 +1,77 @@
+import json
+import os
+
+from threading import Thread, Lock, Event
+
+from utils.metrics import metrics
+
+
+class WriteAheadLog(object):
+    ''' Append-only log of frontier updates.
+
+    Records are buffered in memory and written with a single fsync once
+    batch_size records are waiting or interval seconds have passed, so at
+    most one durability window of updates is lost on a crash. '''
+
+    def __init__(self, path, batch_size, interval):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.lock = Lock()
+        self.buffer = list()
+        self.file = open(self.path, "ab")
+        self.closed = Event()
+        self.flusher = Thread(target=self._flush_periodically, daemon=True)
+        self.flusher.start()
+
+    @staticmethod
+    def replay(path):
+        ''' Yields the records of the log at path in the order they were
+        appended. A torn record at the end of the log is ignored. '''
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as log:
+            for line in log:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Partially written record from a crash.
+                    break
+
+    def append(self, record):
+        with self.lock:
+            self.buffer.append(json.dumps(record).encode("utf-8") + b"\n")
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def truncate(self):
+        ''' Drops every record, buffered or written. Called once the records
+        have been compacted into the snapshot. '''
+        with self.lock:
+            self.buffer.clear()
+            self.file.truncate(0)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.closed.set()
+        with self.lock:
+            self._flush()
+            self.file.close()
+
+    def _flush(self):
+        if not self.buffer or self.file.closed:
+            return
+        with metrics.time("wal_sync"):
+            self.file.write(b"".join(self.buffer))
+            self.buffer.clear()
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.interval):
+            self.flush()
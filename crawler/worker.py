@@ -1,34 +1,89 @@
 from threading import Thread
 
 from inspect import getsource
-from utils.download import download
+from utils.content_gate import gate_content
+from crawler.downloader import fetch
 from utils import get_logger
+from utils.metrics import metrics
 import scraper
-import time
 
 
 class Worker(Thread):
-    def __init__(self, worker_id, config, frontier):
+    def __init__(self, worker_id, config, frontier, downloader=None,
+                 parsers=None):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
+        # Without a downloader the worker fetches each url itself.
+        self.downloader = downloader
+        # Without a parser pool the worker parses each page itself.
+        self.parsers = parsers
         # basic check for requests in scraper
         assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
         assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
         super().__init__(daemon=True)
         
+    def _next_page(self):
+        # Returns (url, response) for the next page to scrape, or
+        # (None, None) once the frontier is empty. Without a downloader the
+        # response is None: run fetches the url where it is always released.
+        if self.downloader is not None:
+            return self.downloader.get_response()
+        return self.frontier.get_tbd_url(), None
+
     def run(self):
         while True:
-            tbd_url = self.frontier.get_tbd_url()
+            tbd_url, resp = self._next_page()
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
+            useful = False
+            try:
+                if self.downloader is None:
+                    resp = fetch(
+                        tbd_url, self.config, self.frontier, self.logger)
+                if resp is None:
+                    # Disallowed by robots.txt, so never fetched: the trap
+                    # detector has nothing to learn from it.
+                    useful = None
+                    continue
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                metrics.count("responses", status=resp.status)
+                # Oversized and non-text pages are dropped before parsing.
+                with metrics.time("gate"):
+                    content = gate_content(resp, self.config, self.logger)
+                if content is None:
+                    page = None
+                elif self.parsers is None:
+                    with metrics.time("parse"):
+                        page = scraper.analyze_content(
+                            tbd_url, resp.url, content)
+                else:
+                    with metrics.time("parse"):
+                        page = self.parsers.analyze_content(
+                            tbd_url, resp.url, content)
+                # A snapshot holds the fingerprint of a page only with its
+                # stats and links; a resumed crawl would skip the page as a
+                # near duplicate of itself.
+                with self.frontier.batch():
+                    if (page is not None and
+                            self.frontier.near_duplicates.check_and_add(
+                                page.fingerprint)):
+                        # Neither its stats nor its links are worth keeping.
+                        self.logger.info(f"Skipping near duplicate {tbd_url}.")
+                        continue
+                    useful = page is not None
+                    scraped_urls = scraper.scrape_parsed(tbd_url, page)
+                    for scraped_url in scraped_urls:
+                        self.frontier.add_url(
+                            scraped_url, tbd_url, page.word_total)
+            except Exception as e:
+                # One bad page must not stop the worker.
+                self.logger.error(f"Failed to process {tbd_url}: {e}")
+            finally:
+                # The frontier enforces politeness per host, so the worker
+                # does not sleep here. Always release the url so that the
+                # frontier can tell when the crawl is finished.
+                self.frontier.mark_url_complete(tbd_url, useful)
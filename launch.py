@@ -1,23 +1,38 @@
 from configparser import ConfigParser
 from argparse import ArgumentParser
 
-from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.sharding import run_local_shards, run_shard
 
 
-def main(config_file, restart):
+def main(config_file, restart, cache_server=None, shard_id=None):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
-    crawler.start()
+    if cache_server:
+        # A local cache server such as utils.local_server needs no
+        # registration.
+        host, port = cache_server.rsplit(":", 1)
+        config.cache_server = (host, int(port))
+    else:
+        from utils.server_registration import get_cache_server
+        config.cache_server = get_cache_server(config, restart)
+    if config.shards > 1 and shard_id is None:
+        # Every shard on this machine, each in a process of its own.
+        run_local_shards(config, restart)
+    elif config.shards > 1:
+        run_shard(config, restart, shard_id)
+    else:
+        crawler = Crawler(config, restart)
+        crawler.start()
 
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--cache_server", type=str, default=None)
+    parser.add_argument("--shard_id", type=int, default=None)
     args = parser.parse_args()
-    main(args.config_file, args.restart)
\ No newline at end of file
+    main(args.config_file, args.restart, args.cache_server, args.shard_id)
\ No newline at end of file
@@ -1,12 +1,21 @@
 import re
-from urllib.parse import urlparse, urldefrag, urljoin
+from urllib.parse import urlparse, urlunparse, urldefrag, urljoin
 from bs4 import BeautifulSoup
-from collections import Counter
+from collections import namedtuple
+from functools import lru_cache
+from utils import html_stream, get_logger
+from utils.simhash import simhash
+from utils.metrics import metrics
+from utils.robots import robots
+from utils.tokenizer import Tokenizer
+from utils.stats import CrawlStats
 
-unique_pages = set()
-longest_page = ("" , 0)
-word_frequencies = Counter()
-subdomains = Counter()
+# Statistics for report.txt. The frontier saves them with its snapshots and
+# restores them in place when a crawl is resumed.
+stats = CrawlStats()
+unique_pages = stats.unique_pages
+REPORT_FILE = "report.txt"
+logger = get_logger("SCRAPER")
 
 STOPWORDS = { # stop words based on 
     'a', 'about', 'above', 'after', 'again', 'against', 'all', 'am', 'an', 'and', 'any', 'are', 'aren\'t',
@@ -24,6 +33,7 @@ STOPWORDS = { # stop words based on
     'where\'s', 'which', 'while', 'who', 'who\'s', 'whom', 'why', 'why\'s', 'with', 'won\'t', 'would', 'wouldn\'t',
     'you', 'you\'d', 'you\'ll', 'you\'re', 'you\'ve', 'your', 'yours', 'yourself', 'yourselves'
 }
+TOKENIZER = Tokenizer(STOPWORDS)
 
 ALLOWED_SUFFIXES = {
     'ics.uci.edu',
@@ -34,10 +44,25 @@ ALLOWED_SUFFIXES = {
 
 ICS_PATH_PREFIX = '/department/information_computer_sciences/'
 
+# What analyze_page keeps of a page: its outlinks, the counts of its
+# filtered words, their total, and a SimHash of the words.
+Page = namedtuple('Page', ['links', 'word_counts', 'word_total', 'fingerprint'])
+
+# 'stream' collects text and links in one pass over lxml's parser events,
+# 'soup' builds a full BeautifulSoup tree and walks it twice.
+EXTRACTION_MODE = 'stream'
+
 def scraper(url, resp):
     links = extract_next_links(url, resp)
     return [link for link in links if is_valid(link)]
 
+def scrape_parsed(url, page):
+    # Same as scraper() for a page that analyze_page already parsed, possibly
+    # in a parser process.
+    links = record_page(url, page)
+    with metrics.time("is_valid"):
+        return [link for link in links if is_valid(link)]
+
 def extract_next_links(url, resp):
     # Implementation required.
     # url: the URL that was used to get the page
@@ -48,91 +73,145 @@ def extract_next_links(url, resp):
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
-    out = []
+    return record_page(url, analyze_page(url, resp))
+
+def analyze_page(url, resp):
+    # Parses a page without touching the crawl statistics, so that it can run
+    # in a parser process. Returns a Page, or None if the page is skipped.
     if resp.status != 200 or not hasattr(resp.raw_response, 'content'):
-        return out
+        return None
+    return analyze_content(url, resp.url, resp.raw_response.content)
+
+def analyze_content(url, page_url, content):
     try:
-        #parse url through beautifulsoup
-        soup = BeautifulSoup(resp.raw_response.content, 'lxml')
-    
-        defrag_url, _ = urldefrag(url)
+        visible_text, hrefs = parse_content(content)
         
-        visible_text = soup.get_text(separator=' ', strip=True)
-        tokens = re.findall(r'\b\w+\b', visible_text.lower())
+        with metrics.time("tokenize"):
+            token_count, word_counts = TOKENIZER.count_words(visible_text)
                 
-        if len(tokens) < 200: # if page has low textual information
-            return out
-        
-        filtered_words = [word for word in tokens if word not in STOPWORDS and len(word) > 1 and word.isalpha()]
-
-        calculate_stats(filtered_words, url)
-        unique_pages.add(defrag_url)
+        if token_count < 200: # if page has low textual information
+            return None
         
-        for tag in soup.find_all('a', href=True): # get all links
-            href = tag['href']
-            abs_url = urljoin(resp.url, href)
+        links = []
+        for href in hrefs: # get all links
+            abs_url = urljoin(page_url, href)
             clean_url, _ = urldefrag(abs_url)
-            out.append(clean_url)
-
-        print(f"[DEBUG] Found {len(out)} links on {url}")
+            links.append(clean_url)
+        return Page(links, word_counts, sum(word_counts.values()), simhash(word_counts))
             
     except Exception as e:
-        print(f"[ERROR] Failed to extract links from {url}: {e}")
-    return out
+        logger.error(f"Failed to extract links from {url}: {e}")
+        return None
 
-def calculate_stats(words, url):
-    global longest_page, word_frequencies, subdomains
-    
-    if len(words) > longest_page[1]: # longest page
-        longest_page =  (url, len(words))
-        
-    word_frequencies.update(words) # 50 most common words
-    
-    parsed = urlparse(url)
-    if parsed.netloc.endswith('.uci.edu'): # subdomains
-        subdomains[parsed.netloc] += 1
-        
-    make_report()
+def record_page(url, page):
+    # Adds a page parsed by analyze_page to the crawl statistics and returns
+    # its links.
+    if page is None:
+        return []
+    calculate_stats(page.word_counts, page.word_total, url)
+    logger.debug(f"Found {len(page.links)} links on {url}")
+    return page.links
+
+def parse_content(content):
+    # Returns the visible text of a page and the hrefs of its links.
+    if EXTRACTION_MODE == 'soup':
+        soup = BeautifulSoup(content, 'lxml')
+        return (soup.get_text(separator=' ', strip=True),
+                [tag['href'] for tag in soup.find_all('a', href=True)])
+    texts, hrefs = html_stream.parse_page(content)
+    return ' '.join(texts), hrefs
+
+def calculate_stats(word_counts, word_total, url):
+    # The report itself is written by make_report, on a timer and at the end
+    # of the crawl, rather than after every page.
+    defrag_url, _ = urldefrag(url)
+    stats.record_page(url, defrag_url, word_counts, word_total)
     
+CALENDAR_PATTERN = re.compile(
+    r'[\?&](month|year|date)='
+    r'|/\d{4}/\d{1,2}/?'
+    r'|/\d{1,2}-\d{1,2}-\d{4}'
+    r'|/\d{4}-\d{1,2}-\d{1,2}'
+    r'|/\d{4}-\d{2}(?!-\d{2})',
+    re.IGNORECASE)
+
+# Trap markers, matched against the lowercased url component they appear in.
+PATH_TRAPS = re.compile(r'doku\.php|~eppstein|grape')
+NETLOC_TRAPS = re.compile(r'swiki|gitlab|grape')
+QUERY_TRAPS = re.compile(
+    r'eventdate|ical|tribe-bar-date|triube_events_display')
+
+EXTENSION_PATTERN = re.compile(
+    r"\.(css|js|bmp|gif|jpe?g|ico"
+    + r"|png|tiff?|mid|mp2|mp3|mp4"
+    + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+    + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+    + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+    + r"|epub|dll|cnf|tgz|sha1"
+    + r"|thmx|mso|arff|rtf|jar|csv"
+    + r"|rm|smil|wmv|swf|wma|zip|rar|gz"
+    + r"|sql|apk|war|img)$")
+
+def build_suffix_trie(suffixes):
+    # Host suffixes keyed label by label from the right, so a host is
+    # matched in one pass over its labels. None marks the end of a suffix.
+    trie = {}
+    for suffix in suffixes:
+        node = trie
+        for label in reversed(suffix.split('.')):
+            node = node.setdefault(label, {})
+        node[None] = True
+    return trie
+
+ALLOWED_HOSTS = build_suffix_trie(ALLOWED_SUFFIXES)
+
+# Number of urls whose verdict is remembered by classify_url.
+CLASSIFY_CACHE_SIZE = 1 << 16
+
 def find_calendar(url):
-    calendar_patterns = [
-        r'[\?&](month|year|date)=',
-        r'/\d{4}/\d{1,2}/?',
-        r'/\d{1,2}-\d{1,2}-\d{4}',
-        r'/\d{4}-\d{1,2}-\d{1,2}',
-        r'/\d{4}-\d{2}(?!-\d{2})',
-    ]
-    
-    for date in calendar_patterns:
-        if re.search(date, url, re.IGNORECASE):
+    return CALENDAR_PATTERN.search(url) is not None
+
+def host_allowed(netloc):
+    node = ALLOWED_HOSTS
+    for label in reversed(netloc.split('.')):
+        node = node.get(label)
+        if node is None:
+            return False
+        if None in node:
             return True
     return False
-        
+
+def _find_traps(url, netloc, path, query):
+    # netloc, path and query are already lowercased.
+    return bool(
+        find_calendar(url)
+        or PATH_TRAPS.search(path)
+        or NETLOC_TRAPS.search(netloc)
+        or QUERY_TRAPS.search(query))
+
 def find_traps(url):
     parsed = urlparse(url)
-    if find_calendar(url):
-        return True
-    if "doku.php" in parsed.path.lower():
-        return True
-    if "swiki" in parsed.netloc.lower():
-        return True
-    if "gitlab" in parsed.netloc.lower():
-        return True
-    if "~eppstein" in parsed.path.lower():
-        return True
-    if "grape" in parsed.path.lower():
-        return True
-    if "grape" in parsed.netloc.lower():
-        return True
-    if "eventdate" in parsed.query.lower():
-        return True
-    if "ical" in parsed.query.lower():
-        return True
-    if "tribe-bar-date" in parsed.query.lower():
-        return True
-    if "triube_events_display" in parsed.query.lower():
-        return True
-    return False
+    return _find_traps(
+        url, parsed.netloc.lower(), parsed.path.lower(), parsed.query.lower())
+
+@lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+def classify_url(url):
+    # Returns (crawlable, defragmented url). The verdict only depends on the
+    # url itself, so it is computed once per url with a single parse.
+    parsed = urlparse(url)
+    # Same result as urldefrag, without parsing the url a second time.
+    defrag_url = urlunparse(parsed._replace(fragment='')) if '#' in url else url
+    if parsed.scheme not in ("http", "https"):
+        return False, defrag_url
+    netloc = parsed.netloc.lower()
+    path = parsed.path.lower()
+    if EXTENSION_PATTERN.search(path):
+        return False, defrag_url
+    if not (host_allowed(netloc) or (netloc == "today.uci.edu" and path.startswith(ICS_PATH_PREFIX))):
+        return False, defrag_url
+    if _find_traps(url, netloc, path, parsed.query.lower()):
+        return False, defrag_url
+    return True, defrag_url
 
 def is_valid(url):
     global unique_pages
@@ -140,51 +219,14 @@ def is_valid(url):
     # If you decide to crawl it, return True; otherwise return False.
     # There are already some conditions that return False.
     try:
-        parsed = urlparse(url)
-        netloc = parsed.netloc.lower()
-        path = parsed.path.lower()
-        defrag_url, _ = urldefrag(url)
-        
-        if defrag_url in unique_pages:
-            return False
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        if re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz"
-            + r"|sql|apk|war|img)$", parsed.path.lower()):
-            return False
-        if not (any(netloc == suf or netloc.endswith(f".{suf}") for suf in ALLOWED_SUFFIXES) or (netloc == "today.uci.edu" and path.startswith(ICS_PATH_PREFIX))):
-            return False
-        if find_traps(url):
-            return False
-        return True        
+        crawlable, defrag_url = classify_url(url)
+        # robots.txt rules change as hosts are read, so they are not part
+        # of the cached verdict.
+        return (crawlable and defrag_url not in unique_pages
+                and robots.allowed(defrag_url))
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
     
 def make_report():
-    #print(f"1. Number of unique pages found: {len(unique_pages)}")
-    #print(f"2. Longest page in terms of number of words: {longest_page[0]}, {longest_page[1]}")
-    #print("3. 50 most common words in the entire set of pages:")
-    #for word, count in word_frequencies.most_common(50):
-    #    print((word, count))
-    #print("4. Found subdomains:")
-    #for subdomain, count in subdomains.most_common():
-    #    print((subdomain, count))
-        
-    with open("report.txt", "w") as f:
-        f.write(f"1. Number of unique pages found: {len(unique_pages)}\n")
-        f.write(f"2. Longest page in terms of number of words: {longest_page[0]}, {longest_page[1]}\n")
-        f.write("3. 50 most common words in the entire set of pages:\n")
-        for word, count in word_frequencies.most_common(50):
-            f.write(f"{word}: {count}\n")
-        f.write("4. Found subdomains:\n")
-        for subdomain, count in subdomains.most_common():
-            f.write(f"{subdomain}: {count}\n")
\ No newline at end of file
+    stats.write_report(REPORT_FILE)
\ No newline at end of file
@@ -1,5 +1,52 @@
+import os
+import shelve
+import tempfile
+import time
 import unittest
+from collections import Counter
+from configparser import ConfigParser
+import scraper as scraper_module
 from scraper import *
+from crawler.downloader import fetch
+from crawler.frontier import Frontier
+from crawler.host_health import HostHealth, CLOSED, DEAD
+from crawler.sharding import ShardRouter, shard_config, shard_of
+from crawler.spill_heap import SpillHeap
+from crawler.trap_detector import (
+    TrapDetector, url_template, OPEN, THROTTLED, BLOCKED)
+from crawler import host_health
+from utils import get_urlhash
+from utils.config import Config
+from utils.content_gate import gate_content, looks_binary
+from utils.download import download, read_capped
+from utils.local_server import (
+    LocalCacheServer, RecordedSite, SyntheticSite, ERROR_STATUSES)
+from utils.log_queue import RateLimiter, backend as log_backend
+from utils.metrics import Metrics, NULL_TIMER
+from utils.response import Response
+from utils.robots import RobotsRules, parse_robots, parse_sitemap, robots
+from utils.seen_index import SeenIndex
+from utils.simhash import SimHashIndex, simhash
+from utils.stats import CrawlStats
+
+
+def make_config(directory, **overrides):
+    cparser = ConfigParser()
+    cparser.read_dict({
+        "IDENTIFICATION": {"USERAGENT": "IR US25 test"},
+        "CONNECTION": {"HOST": "localhost", "PORT": "9000"},
+        "CRAWLER": {
+            "SEEDURL": "https://www.ics.uci.edu", "POLITENESS": "0.2",
+            # Frontier tests hand out urls without fetching robots.txt.
+            "ROBOTS": "false"},
+        "LOCAL PROPERTIES": {
+            "SAVE": os.path.join(directory, "frontier.shelve"),
+            "THREADCOUNT": "1"},
+    })
+    for key, value in overrides.items():
+        section, option = key.split(".")
+        cparser[section][option] = str(value)
+    return Config(cparser)
 
 class TestScraper(unittest.TestCase):
     def test_is_valid(self): # test if is_valid finds all domains following assignment instructions
@@ -69,6 +116,985 @@ class TestScraper(unittest.TestCase):
 
         self.assertEqual(set(filtered_words), expected)
 
-    
+    def test_stream_extraction_matches_soup(self):
+        html = (
+            b"<!DOCTYPE html><html><head><title>Title</title>"
+            b"<style>p {}</style><script>var x = 1;</script></head><body>"
+            b"<!-- comment --><p>Hello<b>World</b>&amp;more</p>"
+            b"<template><p>hidden</p></template><ruby>kan<rt>ji</rt></ruby>"
+            b"<a href='/x#frag'>link</a><a>no href</a><a href=''>empty</a>"
+            b"</body></html>")
+        try:
+            scraper_module.EXTRACTION_MODE = 'soup'
+            expected = parse_content(html)
+            scraper_module.EXTRACTION_MODE = 'stream'
+            self.assertEqual(parse_content(html), expected)
+        finally:
+            scraper_module.EXTRACTION_MODE = 'stream'
+
+    def test_tokenizer_matches_filtered_findall(self):
+        for text in (
+                "The quick brown fox jumps over 2023 lazy dogs. AI, ML, and "
+                "NLP are cool! abc123 snake_case don't x -- (c) " * 20,
+                "UCI 中国 日本 Привет x² café naïve İstanbul z " * 20):
+            tokens = re.findall(r'\b\w+\b', text.lower())
+            expected = Counter(
+                word for word in tokens
+                if word not in STOPWORDS and len(word) > 1
+                and word.isalpha())
+            self.assertEqual(
+                TOKENIZER.count_words(text), (len(tokens), expected))
+
+
+class TestFrontier(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = make_config(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_politeness_per_host(self):
+        frontier = Frontier(self.config, True)
+        frontier.add_url("https://www.ics.uci.edu/a")
+        frontier.add_url("https://www.stat.uci.edu/a")
+        start = time.monotonic()
+        first = frontier.get_tbd_url()
+        second = frontier.get_tbd_url()
+        # Two different hosts do not wait on each other.
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertNotEqual(
+            first.split("/")[2], second.split("/")[2])
+        third = frontier.get_tbd_url()
+        # The third url shares a host with an earlier one.
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        for url in (first, second, third):
+            frontier.mark_url_complete(url)
+        self.assertIsNone(frontier.get_tbd_url())
+
+    def test_resume_from_save(self):
+        frontier = Frontier(self.config, True)
+        url = frontier.get_tbd_url()
+        frontier.add_url("https://www.ics.uci.edu/about")
+        frontier.mark_url_complete(url)
+        frontier._compact()
+        frontier.save.close()
+        resumed = Frontier(self.config, False)
+        self.assertEqual(
+            resumed.get_tbd_url(), "https://www.ics.uci.edu/about")
+
+    def test_recover_from_log(self):
+        frontier = Frontier(self.config, True)
+        url = frontier.get_tbd_url()
+        frontier.add_url("https://www.ics.uci.edu/about")
+        frontier.mark_url_complete(url)
+        # Simulate a crash after the durability window: the log was synced
+        # but never compacted into the save file.
+        frontier.log.flush()
+        self.assertEqual(len(frontier.save), 0)
+        resumed = Frontier(self.config, False)
+        self.assertEqual(len(resumed.save), 2)
+        # The stats snapshot predates the completion of url, which is
+        # downloaded again so that the stats count it.
+        self.assertEqual(resumed.save[get_urlhash(url)], (url, False))
+        self.assertEqual(
+            {resumed.get_tbd_url(), resumed.get_tbd_url()},
+            {url, "https://www.ics.uci.edu/about"})
+
+    def test_recover_across_compaction(self):
+        config = make_config(self.tmp.name, **{
+            "CRAWLER.POLITENESS": 0, "LOCAL PROPERTIES.COMPACTEVERY": 3})
+        frontier = Frontier(config, True)
+        urls = {"https://www.ics.uci.edu"} | {
+            f"https://www.ics.uci.edu/about{i}" for i in range(7)}
+        for url in sorted(urls):
+            # The third record of every batch compacts.
+            frontier.add_url(url)
+        # Crash after the compactions and the syncs of the log.
+        frontier.log.flush()
+        resumed = Frontier(config, False)
+        handed_out = set()
+        while True:
+            url = resumed.get_tbd_url()
+            if url is None:
+                break
+            handed_out.add(url)
+            resumed.mark_url_complete(url)
+        self.assertEqual(handed_out, urls)
+        resumed.save.close()
+
+    def test_log_survives_a_crash_during_recovery(self):
+        frontier = Frontier(self.config, True)
+        frontier.add_url("https://www.ics.uci.edu/about")
+        frontier.log.flush()
+        write_snapshots = Frontier._write_snapshots
+
+        def crash(frontier):
+            raise RuntimeError("crash")
+        Frontier._write_snapshots = crash
+        try:
+            with self.assertRaises(RuntimeError):
+                Frontier(self.config, False)
+        finally:
+            Frontier._write_snapshots = write_snapshots
+        self.assertTrue(os.path.exists(frontier.log_file))
+        resumed = Frontier(self.config, False)
+        self.assertEqual(resumed.queued, 2)
+        resumed.save.close()
+
+    def test_batch_defers_compaction(self):
+        config = make_config(self.tmp.name, **{
+            "LOCAL PROPERTIES.COMPACTEVERY": 3})
+        frontier = Frontier(config, True)
+        with frontier.batch():
+            for i in range(4):
+                frontier.add_url(f"https://www.ics.uci.edu/about{i}")
+            # The seed and four urls, none compacted yet.
+            self.assertEqual(len(frontier.unsaved), 5)
+        self.assertFalse(frontier.unsaved)
+        self.assertEqual(len(frontier.save), 5)
+        frontier.add_url("https://www.ics.uci.edu/contact")
+        frontier.checkpoint()
+        self.assertEqual(len(frontier.save), 6)
+        frontier.save.close()
+
+    def test_resume_loads_pending_index(self):
+        frontier = Frontier(self.config, True)
+        frontier.add_url("https://www.ics.uci.edu/doku.php")
+        frontier.add_url("https://www.stat.uci.edu/about")
+        frontier._compact()
+        frontier.save.close()
+        # Entries only in the save file are no longer scanned on resume.
+        with shelve.open(self.config.save_file) as save:
+            save["unreferenced"] = ("https://www.cs.uci.edu/old", False)
+        lazy = make_config(
+            self.tmp.name, **{"LOCAL PROPERTIES.REVALIDATE": "lazy"})
+        resumed = Frontier(lazy, False)
+        self.assertEqual(len(resumed.unvalidated), 3)
+        urls = {resumed.get_tbd_url(), resumed.get_tbd_url()}
+        self.assertEqual(
+            urls, {"https://www.ics.uci.edu", "https://www.stat.uci.edu/about"})
+        for url in urls:
+            resumed.mark_url_complete(url)
+        # The trap url is dropped when it reaches the front of its queue.
+        self.assertIsNone(resumed.get_tbd_url())
+        self.assertFalse(resumed.host_queues)
+
+    def test_best_first_order(self):
+        config = make_config(self.tmp.name, **{"CRAWLER.POLITENESS": 0})
+        frontier = Frontier(config, True)
+        seed = frontier.get_tbd_url()
+        for url in ("https://www.ics.uci.edu/events/2024/01/02/day",
+                    "https://www.ics.uci.edu/about",
+                    "https://www.stat.uci.edu/people"):
+            frontier.add_url(url, seed, 2000)
+        frontier.mark_url_complete(seed)
+        # Other hosts go first, and trap-like urls last.
+        self.assertEqual(
+            [frontier.get_tbd_url() for _ in range(3)],
+            ["https://www.stat.uci.edu/people",
+             "https://www.ics.uci.edu/about",
+             "https://www.ics.uci.edu/events/2024/01/02/day"])
+        self.assertEqual(frontier.in_progress[
+            "https://www.ics.uci.edu/about"][1], 1)
+        frontier.save.close()
+
+    def test_spills_to_disk(self):
+        config = make_config(
+            self.tmp.name, **{"LOCAL PROPERTIES.FRONTIERMEMORY": 100})
+        frontier = Frontier(config, True)
+        for i in range(3000):
+            frontier.add_url(f"https://www.ics.uci.edu/page{i}")
+        queue = frontier.host_queues["www.ics.uci.edu"]
+        self.assertEqual(len(queue), 3001)
+        self.assertLess(len(queue.heap), 3001)
+        self.assertTrue(os.listdir(frontier.spill_dir))
+        frontier._compact()
+        frontier.save.close()
+        resumed = Frontier(config, False)
+        self.assertEqual(len(resumed.host_queues["www.ics.uci.edu"]), 3001)
+
+
+class TestSharding(unittest.TestCase):
+    def test_links_cross_shards_and_crawl_ends(self):
+        import socket
+        hosts = ["www.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu",
+                 "www.informatics.uci.edu", "vision.ics.uci.edu"]
+        by_shard = {shard_of(f"https://{host}", 2): host for host in hosts}
+        ports = []
+        for _ in range(2):
+            with socket.socket() as probe:
+                probe.bind(("localhost", 0))
+                ports.append(probe.getsockname()[1])
+        with tempfile.TemporaryDirectory() as directory:
+            frontiers = []
+            for shard in range(2):
+                config = shard_config(make_config(directory, **{
+                    "CRAWLER.SEEDURL": ",".join(
+                        f"https://{by_shard[i]}" for i in range(2)),
+                    "CRAWLER.POLITENESS": 0,
+                    "LOCAL PROPERTIES.SHARDS": 2,
+                    "LOCAL PROPERTIES.SHARDADDRESSES": ",".join(
+                        f"localhost:{port}" for port in ports),
+                    "LOCAL PROPERTIES.SHARDINTERVAL": 0.05}), shard)
+                frontier = Frontier(config, True)
+                frontier.router = ShardRouter(config, frontier)
+                frontiers.append(frontier)
+            for frontier in frontiers:
+                frontier.router.start()
+            try:
+                first, second = frontiers
+                seed = first.get_tbd_url()
+                self.assertEqual(seed, f"https://{by_shard[0]}")
+                first.add_url(f"https://{by_shard[1]}/found", seed, 500)
+                first.mark_url_complete(seed)
+                urls = [second.get_tbd_url(), second.get_tbd_url()]
+                self.assertEqual(urls, [
+                    f"https://{by_shard[1]}", f"https://{by_shard[1]}/found"])
+                self.assertEqual(second.in_progress[urls[1]][1], 1)
+                for url in urls:
+                    second.mark_url_complete(url)
+                self.assertIsNone(first.get_tbd_url())
+                self.assertIsNone(second.get_tbd_url())
+            finally:
+                for frontier in frontiers:
+                    frontier.router.stop()
+                    frontier.log.close()
+                    frontier.save.close()
+
+
+class TestSpillHeap(unittest.TestCase):
+    def test_pops_in_heap_order(self):
+        import random
+        rng = random.Random(0)
+        with tempfile.TemporaryDirectory() as directory:
+            heap = SpillHeap(directory, max_runs=2)
+            pushed = list()
+            for i in range(2000):
+                entry = (rng.random(), i, f"url{i}")
+                heap.push(entry)
+                pushed.append(entry)
+                if i % 300 == 299:
+                    heap.spill(50)
+            self.assertEqual(sorted(heap), sorted(pushed))
+            popped = [heap.pop() for _ in range(1000)]
+            for i in range(500):
+                entry = (rng.random(), 2000 + i, "late")
+                heap.push(entry)
+                pushed.append(entry)
+            popped += [heap.pop() for _ in range(len(heap))]
+            self.assertEqual(sorted(popped), sorted(pushed))
+            self.assertEqual(popped[:1000], sorted(pushed[:2000])[:1000])
+            heap.close()
+            self.assertEqual(os.listdir(directory), [])
+
+
+class TestTrapDetector(unittest.TestCase):
+    def test_url_template(self):
+        self.assertEqual(
+            url_template("https://WWW.ics.uci.edu/events/2024-01-02/?b=1&a=2"),
+            "www.ics.uci.edu/events/{date}/?a&b")
+        self.assertEqual(
+            url_template("https://ics.uci.edu/page12/3f2a9c0e1b7d4a66/x?id=7"),
+            "ics.uci.edu/page{n}/{id}/x?id")
+        self.assertEqual(
+            url_template("https://ics.uci.edu/wiki/doku.php?idx=4&do=index"),
+            url_template("https://ics.uci.edu/wiki/doku.php?do=edit&idx=93"))
+        self.assertEqual(
+            url_template("https://ics.uci.edu/files/a/b/c/a/b/c"),
+            url_template("https://ics.uci.edu/files/a/b/c/b/a"))
+
+    def test_throttles_then_blocks(self):
+        traps = TrapDetector(min_fetches=10, min_yield=0.2, budget=5)
+        changes = list()
+        for i in range(40):
+            changes.append(traps.record(f"https://ics.uci.edu/cal?d={i}", False))
+            traps.record(f"https://ics.uci.edu/news/{i}", True)
+        states = [change[1] for change in changes if change]
+        self.assertEqual(states, [THROTTLED, BLOCKED])
+        self.assertEqual(traps.classify("https://ics.uci.edu/cal?d=99"), BLOCKED)
+        self.assertEqual(traps.classify("https://ics.uci.edu/news/99"), OPEN)
+        self.assertEqual(traps.classify("https://ics.uci.edu/other"), OPEN)
+
+    def test_blocklist_survives_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = make_config(directory, **{
+                "CRAWLER.POLITENESS": 0, "CRAWLER.TRAPMINFETCHES": 3,
+                "CRAWLER.TRAPBUDGET": 1})
+            frontier = Frontier(config, True)
+            frontier.mark_url_complete(frontier.get_tbd_url(), True)
+            for i in range(6):
+                frontier.add_url(f"https://www.ics.uci.edu/cal/{i}")
+            for _ in range(5):
+                frontier.mark_url_complete(frontier.get_tbd_url(), False)
+            self.assertEqual(
+                frontier.traps.classify("https://www.ics.uci.edu/cal/5"),
+                BLOCKED)
+            # The last queued url of the blocked template is dropped.
+            self.assertIsNone(frontier.get_tbd_url())
+            frontier._compact()
+            frontier.save.close()
+            resumed = Frontier(config, False)
+            resumed.add_url("https://www.ics.uci.edu/cal/99")
+            self.assertFalse(resumed.host_queues)
+
+
+class TestHostHealth(unittest.TestCase):
+    def test_backoff_circuit_and_probes(self):
+        health = HostHealth(
+            failures=3, backoff=1, cooldown=10, max_cooldown=15, probes=2,
+            max_opens=2)
+        host = "www.ics.uci.edu"
+        self.assertEqual(health.record(host, 200, 0.1, 0), (0, None))
+        self.assertEqual(health.record(host, 503, 0.1, 0), (1, None))
+        self.assertEqual(health.record(host, None, 0.1, 0), (2, None))
+        self.assertEqual(
+            health.record(host, 608, 0.1, 0), (10, host_health.OPEN))
+        self.assertEqual(health.hold(host, 4), 6)
+        # Half-open: one probe at a time, two successes close the circuit.
+        self.assertEqual(health.hold(host, 10), 0)
+        health.start(host, 10)
+        self.assertEqual(health.hold(host, 11), 9)
+        self.assertEqual(health.record(host, 200, 0.1, 11), (0, None))
+        self.assertEqual(health.hold(host, 11), 0)
+        health.start(host, 11)
+        self.assertEqual(health.record(host, 200, 0.1, 12), (0, CLOSED))
+        for now in range(3):
+            health.record(host, 500, 0.1, now)
+        # A failed probe parks the host for longer, the next failure kills it.
+        health.hold(host, 20)
+        health.start(host, 20)
+        self.assertEqual(
+            health.record(host, 500, 0.1, 20), (15, host_health.OPEN))
+        health.hold(host, 40)
+        health.start(host, 40)
+        self.assertEqual(health.record(host, 200, 20, 40), (0, DEAD))
+
+    def test_failing_host_stays_parked_unless_given_up_on(self):
+        health = HostHealth(failures=1, cooldown=10, max_cooldown=15)
+        host = "www.ics.uci.edu"
+        now = 0
+        health.record(host, 500, 0.1, now)
+        for _ in range(10):
+            now += health.hold(host, now)
+            health.hold(host, now)
+            health.start(host, now)
+            wait, change = health.record(host, 500, 0.1, now)
+            self.assertEqual((wait, change), (15, host_health.OPEN))
+        # A probe that was never fetched lets the next one through.
+        now += health.hold(host, now)
+        self.assertEqual(health.hold(host, now), 0)
+        health.start(host, now)
+        self.assertGreater(health.hold(host, now), 0)
+        self.assertTrue(health.release(host))
+        self.assertEqual(health.hold(host, now), 0)
+        self.assertFalse(health.release(host))
+
+    def test_parked_host_waits_and_survives_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = make_config(directory, **{
+                "CRAWLER.POLITENESS": 0, "CRAWLER.HOSTFAILURES": 1,
+                "CRAWLER.HOSTCOOLDOWN": 60,
+                "CRAWLER.SEEDURL":
+                    "https://www.ics.uci.edu,https://www.cs.uci.edu"})
+            frontier = Frontier(config, True)
+            first = frontier.get_tbd_url()
+            frontier.record_fetch(first, 600, 0.1)
+            frontier.mark_url_complete(first)
+            parked = urlparse(first).netloc
+            frontier.add_url(f"https://{parked}/other")
+            second = frontier.get_tbd_url()
+            self.assertNotEqual(urlparse(second).netloc, parked)
+            frontier.record_fetch(second, 200, 0.1)
+            frontier.mark_url_complete(second)
+            self.assertEqual(frontier.gauges()["hosts_parked"], 1)
+            frontier._compact()
+            frontier.log.close()
+            frontier.save.close()
+            resumed = Frontier(config, False)
+            self.assertGreater(resumed.health.hold(parked, time.time()), 0)
+            self.assertEqual(resumed.queued, 1)
+            self.assertFalse(resumed.is_idle())
+            resumed.log.close()
+            resumed.save.close()
+
+
+def make_response(content, **headers):
+    import pickle
+    import requests
+    raw = requests.models.Response()
+    raw.status_code = 200
+    raw.url = "https://www.ics.uci.edu/page"
+    raw._content = content
+    raw.headers.update(headers)
+    return Response({
+        "url": raw.url, "status": 200, "response": pickle.dumps(raw)})
+
+
+class TestContentGate(unittest.TestCase):
+    def setUp(self):
+        self.config = make_config(tempfile.gettempdir(), **{
+            "CRAWLER.MAXPAGEBYTES": 1000, "CRAWLER.MAXDOWNLOADBYTES": 50000})
+
+    def test_text_is_parsed_up_to_the_cap(self):
+        page = b"<html><body>" + b"word " * 1000 + b"</body></html>"
+        resp = make_response(page, **{"Content-Type": "text/html"})
+        self.assertIsNone(resp._raw_response)
+        self.assertEqual(gate_content(resp, self.config), page[:1000])
+
+    def test_rejects_before_parsing(self):
+        for resp in (
+                make_response(b"%PDF-1.4", **{"Content-Type": "application/pdf"}),
+                make_response(bytes(range(256)) * 4),
+                make_response(b"<p>hi</p>", **{"Content-Length": "9999999"}),
+                make_response(b"x" * 60000)):
+            self.assertIsNone(gate_content(resp, self.config))
+        # The oversized response is rejected without being unpickled.
+        self.assertIsNotNone(resp._pickled)
+        self.assertFalse(looks_binary("héllo wörld\n".encode("utf-8")))
+        self.assertFalse(looks_binary("hello".encode("utf-16")))
+
+    def test_headers_beside_the_pickle_are_checked_first(self):
+        pdf = make_response(b"%PDF-1.4")
+        pdf = Response({
+            "url": pdf.url, "status": 200, "response": pdf._pickled,
+            "headers": {"Content-Type": "application/pdf"}})
+        self.assertIsNone(gate_content(pdf, self.config))
+        self.assertIsNotNone(pdf._pickled)
+        page = make_response(b"<p>hi</p>", **{"Content-Type": "image/png"})
+        page = Response({
+            "url": page.url, "status": 200, "response": page._pickled,
+            "headers": {"Content-Type": "text/html"}})
+        self.assertEqual(gate_content(page, self.config), b"<p>hi</p>")
+
+    def test_download_stops_reading_at_the_cap(self):
+        import io
+        import requests
+        resp = requests.models.Response()
+        resp.raw = io.BytesIO(b"x" * 200000)
+        self.assertEqual(read_capped(resp, 300000), b"x" * 200000)
+        resp = requests.models.Response()
+        resp.raw = io.BytesIO(b"x" * 200000)
+        self.assertIsNone(read_capped(resp, 100000))
+        self.assertGreater(len(resp.raw.read()), 0)
+
+
+class TestLocalServer(unittest.TestCase):
+    def test_download_from_local_server(self):
+        site = SyntheticSite(hosts=2, pages=10)
+        server = LocalCacheServer(site).start()
+        failing = LocalCacheServer(site, error_rate=1).start()
+        try:
+            config = make_config(tempfile.gettempdir())
+            config.cache_server = server.server_address[:2]
+            resp = download(site.seeds()[0], config)
+            self.assertEqual(resp.status, 200)
+            page = analyze_content(
+                resp.url, resp.raw_response.url, gate_content(resp, config))
+            self.assertGreaterEqual(len(page.links), 11)
+            self.assertGreaterEqual(page.word_total, 100)
+            resp = download("https://www.ics.uci.edu/p/10", config)
+            self.assertEqual(resp.status, 404)
+            config.cache_server = failing.server_address[:2]
+            resp = download("https://www.ics.uci.edu/p/1", config)
+            self.assertIn(resp.status, ERROR_STATUSES)
+        finally:
+            server.stop()
+            failing.stop()
+
+    def test_download_without_logger_survives_a_bad_response(self):
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        import threading
+
+        class Empty(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+        server = HTTPServer(("localhost", 0), Empty)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            config = make_config(tempfile.gettempdir())
+            config.cache_server = server.server_address[:2]
+            resp = download("https://www.ics.uci.edu", config)
+            self.assertEqual(resp.status, 200)
+            self.assertIn("Spacetime Response error", resp.error)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestRobots(unittest.TestCase):
+    ROBOTS = """
+# Comments and unknown lines are ignored.
+User-agent: *
+Disallow: /private
+Allow: /private/public$
+Crawl-delay: 2
+
+User-agent: OtherBot
+User-agent: IR US25
+Disallow: /tmp/
+Disallow: /*.php$
+Allow: /tmp/keep
+Crawl-delay: 5
+
+Sitemap: https://www.ics.uci.edu/sitemap.xml
+"""
+
+    def test_rules_for_our_agent(self):
+        rules = parse_robots(self.ROBOTS, "IR US25 test")
+        self.assertEqual(rules.crawl_delay, 5)
+        self.assertEqual(
+            rules.sitemaps, ["https://www.ics.uci.edu/sitemap.xml"])
+        self.assertFalse(rules.allowed("/tmp/a"))
+        self.assertTrue(rules.allowed("/tmp/keep/a"))
+        self.assertFalse(rules.allowed("/a/index.php"))
+        self.assertTrue(rules.allowed("/a/index.php?x=1"))
+        self.assertTrue(rules.allowed("/private"))
+        import pickle
+        other = pickle.loads(pickle.dumps(parse_robots(self.ROBOTS, "bot")))
+        self.assertEqual(other.crawl_delay, 2)
+        self.assertFalse(other.allowed("/private/x"))
+        self.assertTrue(other.allowed("/private/public"))
+        self.assertFalse(other.allowed("/private/public/x"))
+        self.assertTrue(RobotsRules().allowed("/anything"))
+        # Groups name whole product tokens, in any case.
+        text = (
+            "User-agent: bot\nDisallow: /\n\n"
+            "User-agent: ir\nDisallow: /x\n")
+        self.assertTrue(parse_robots(text, "RoboBot 2").allowed("/a"))
+        self.assertFalse(parse_robots(text, "Bot/1.0").allowed("/a"))
+        self.assertFalse(parse_robots(text, "IR US25 test").allowed("/x"))
+        self.assertTrue(parse_robots(text, "IR US25 test").allowed("/a"))
+
+    def test_sitemaps(self):
+        import gzip
+        urlset = (
+            b"<urlset><url><loc> https://a.ics.uci.edu/x?a=1&amp;b=2 </loc>"
+            b"</url><url><loc>https://a.ics.uci.edu/y</loc></url></urlset>")
+        self.assertEqual(parse_sitemap(gzip.compress(urlset)), (
+            ["https://a.ics.uci.edu/x?a=1&b=2", "https://a.ics.uci.edu/y"],
+            []))
+        self.assertEqual(parse_sitemap(
+            b"<sitemapindex><sitemap><loc>https://a.ics.uci.edu/s.xml</loc>"
+            b"</sitemap></sitemapindex>"),
+            ([], ["https://a.ics.uci.edu/s.xml"]))
+        # A gzip bomb is only expanded up to max_bytes.
+        bomb = gzip.compress(
+            b"<urlset><url><loc>https://a.ics.uci.edu/z</loc></url>" +
+            b" " * 10 ** 7 + b"<url><loc>https://a.ics.uci.edu/w</loc></url>")
+        self.assertLess(len(bomb), 20000)
+        self.assertEqual(
+            parse_sitemap(bomb, max_bytes=10 ** 5),
+            (["https://a.ics.uci.edu/z"], []))
+        self.assertEqual(
+            parse_sitemap(gzip.compress(urlset) * 2, max_bytes=10 ** 5)[0],
+            ["https://a.ics.uci.edu/x?a=1&b=2", "https://a.ics.uci.edu/y"] * 2)
+
+    def test_corrupt_sitemap_is_skipped(self):
+        import gzip
+        import json
+        from crawler.downloader import read_robots
+        with tempfile.TemporaryDirectory() as directory:
+            corrupt = gzip.compress(b"<urlset><url><loc>x</loc></url>" * 50)
+            files = {
+                "robots.txt": (
+                    b"User-agent: *\nDisallow: /private\nSitemap: "
+                    b"https://www.ics.uci.edu/a.xml.gz\nSitemap: "
+                    b"https://www.ics.uci.edu/b.xml\n"),
+                "a.xml.gz": corrupt[:20] + b"\xff" * 10 + corrupt[30:],
+                "b.xml": b"<urlset><url><loc>https://www.ics.uci.edu/deep"
+                         b"</loc></url></urlset>"}
+            with open(os.path.join(directory, "index.jsonl"), "w") as index:
+                for name, content in files.items():
+                    with open(os.path.join(directory, name), "wb") as body:
+                        body.write(content)
+                    index.write(json.dumps({
+                        "url": f"https://www.ics.uci.edu/{name}",
+                        "status": 200, "content_type": "text/plain",
+                        "file": name}) + "\n")
+            server = LocalCacheServer(RecordedSite(directory)).start()
+            try:
+                config = make_config(directory, **{"CRAWLER.POLITENESS": 0})
+                config.cache_server = server.server_address[:2]
+                frontier = Frontier(config, True)
+                read_robots(
+                    "https://www.ics.uci.edu", config, frontier,
+                    frontier.logger)
+                self.assertFalse(is_valid("https://www.ics.uci.edu/private"))
+                self.assertIn("www.ics.uci.edu", frontier.host_queues)
+                self.assertEqual(frontier.queued, 2)
+                frontier.log.close()
+                frontier.save.close()
+            finally:
+                robots.clear()
+                server.stop()
+
+    def test_robots_from_local_server(self):
+        site = SyntheticSite(hosts=1, pages=20, robots=True)
+        server = LocalCacheServer(site).start()
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                config = make_config(directory, **{
+                    "CRAWLER.POLITENESS": 0, "CRAWLER.ROBOTS": "true"})
+                config.cache_server = server.server_address[:2]
+                frontier = Frontier(config, True)
+                seed = frontier.get_tbd_url()
+                trap = "https://www.ics.uci.edu/archive/page/3"
+                self.assertTrue(is_valid(trap))
+                frontier.add_url(trap)
+                self.assertIsNotNone(fetch(
+                    seed, config, frontier, frontier.logger))
+                self.assertFalse(is_valid(trap))
+                self.assertTrue(is_valid("https://www.ics.uci.edu/p/3"))
+                # The trap, queued before robots.txt was read, and the 20
+                # pages listed in the sitemap.
+                self.assertEqual(frontier.queued, 21)
+                self.assertIsNone(
+                    fetch(trap, config, frontier, frontier.logger))
+                frontier._compact()
+                frontier.log.close()
+                frontier.save.close()
+                resumed = Frontier(config, False)
+                self.assertFalse(is_valid(trap))
+                self.assertFalse(robots.claim("www.ics.uci.edu"))
+                resumed.log.close()
+                resumed.save.close()
+            finally:
+                robots.clear()
+                server.stop()
+
+
+class TestCrawl(unittest.TestCase):
+    ''' Whole crawls of a small synthetic site served by the local cache
+    server. '''
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = LocalCacheServer(
+            SyntheticSite(hosts=2, pages=10, trap_rate=0)).start()
+        self.stats_file = os.path.join(self.tmp.name, "before.stats")
+        scraper_module.stats.save(self.stats_file)
+        report_file = scraper_module.REPORT_FILE
+        scraper_module.REPORT_FILE = os.path.join(self.tmp.name, "report.txt")
+
+        def restore():
+            scraper_module.REPORT_FILE = report_file
+            scraper_module.stats.restore(self.stats_file)
+            robots.clear()
+            log_backend.configure()
+            self.server.stop()
+            self.tmp.cleanup()
+        self.addCleanup(restore)
+
+    def crawl(self, **overrides):
+        ''' Crawls the site and returns the crawler once every worker
+        stopped. '''
+        from crawler import Crawler
+        config = make_config(self.tmp.name, **{
+            "CRAWLER.SEEDURL": ",".join(self.server.site.seeds()),
+            "CRAWLER.POLITENESS": 0,
+            "LOCAL PROPERTIES.THREADCOUNT": 2,
+            "LOCAL PROPERTIES.LOGDIR": os.path.join(self.tmp.name, "Logs"),
+            "LOCAL PROPERTIES.CONSOLELOGLEVEL": "CRITICAL",
+            **overrides})
+        config.cache_server = self.server.server_address[:2]
+        crawler = Crawler(config, True)
+        crawler.start_async()
+        for worker in crawler.workers:
+            worker.join(30)
+        self.assertFalse(any(worker.is_alive() for worker in crawler.workers))
+        crawler.join()
+        self.addCleanup(crawler.frontier.save.close)
+        self.addCleanup(crawler.frontier.log.close)
+        crawler.frontier._compact()
+        self.assertFalse(crawler.frontier.in_progress)
+        return crawler
+
+    def completed(self, frontier):
+        return [url for url, done in frontier.save.values() if done]
+
+    def test_download_threads(self):
+        crawler = self.crawl(**{"LOCAL PROPERTIES.DOWNLOADTHREADS": 2})
+        # Every page of both hosts, and both roots.
+        self.assertEqual(len(self.completed(crawler.frontier)), 22)
+        self.assertEqual(len(scraper_module.stats.unique_pages), 22)
+
+    def test_parser_processes(self):
+        crawler = self.crawl(**{"LOCAL PROPERTIES.PARSERPROCESSES": 1})
+        self.assertEqual(len(self.completed(crawler.frontier)), 22)
+        self.assertEqual(len(scraper_module.stats.unique_pages), 22)
+
+    def test_dead_parser_process_is_replaced(self):
+        import signal
+        from crawler.parser_pool import ParserPool
+        config = make_config(self.tmp.name, **{
+            "LOCAL PROPERTIES.PARSERPROCESSES": 1})
+        pool = ParserPool(config)
+        self.addCleanup(pool.shutdown)
+        url = "https://www.ics.uci.edu/p/1"
+        content = (
+            "<html><body><p>" + " ".join(
+                f"word{i % 300}" for i in range(600)) +
+            '</p><a href="/p/2">next</a></body></html>').encode("utf-8")
+        expected = scraper_module.analyze_content(url, url, content)
+        self.assertEqual(pool.analyze_content(url, url, content), expected)
+        for process in list(pool.executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        self.assertEqual(pool.analyze_content(url, url, content), expected)
+
+    def test_failed_fetch_releases_its_url(self):
+        import threading
+        import crawler.downloader
+        download = crawler.downloader.download
+        failing = "https://www.ics.uci.edu/p/3"
+
+        def broken_download(url, config, logger=None):
+            if url == failing:
+                raise RuntimeError("broken download")
+            return download(url, config, logger)
+        failures = list()
+        excepthook = threading.excepthook
+        threading.excepthook = lambda args: failures.append(args.exc_type)
+        crawler.downloader.download = broken_download
+        try:
+            for download_threads in (0, 1):
+                with self.subTest(download_threads=download_threads):
+                    # A single thread of each kind keeps crawling past the
+                    # failure to the end.
+                    crawl = self.crawl(**{
+                        "LOCAL PROPERTIES.THREADCOUNT": 1,
+                        "LOCAL PROPERTIES.DOWNLOADTHREADS": download_threads,
+                        "LOCAL PROPERTIES.SAVE": os.path.join(
+                            self.tmp.name, f"frontier{download_threads}")})
+                    completed = self.completed(crawl.frontier)
+                    self.assertIn(failing, completed)
+                    self.assertEqual(len(completed), 22)
+                    self.assertEqual(failures, [])
+                    # Pages already scraped are no longer valid.
+                    scraper_module.stats.restore(self.stats_file)
+        finally:
+            crawler.downloader.download = download
+            threading.excepthook = excepthook
+
+    def test_robots_and_sitemaps_are_polite(self):
+        import threading
+        from collections import defaultdict
+        from urllib.parse import urlparse
+        import crawler.downloader
+        self.server.stop()
+        self.server = LocalCacheServer(SyntheticSite(
+            hosts=2, pages=4, trap_rate=0, robots=True)).start()
+        download = crawler.downloader.download
+        lock = threading.Lock()
+        requests = defaultdict(list)
+
+        def timed_download(url, config, logger=None):
+            with lock:
+                requests[urlparse(url).netloc].append(
+                    (time.monotonic(), url))
+            return download(url, config, logger)
+        crawler.downloader.download = timed_download
+        try:
+            self.crawl(**{
+                "CRAWLER.POLITENESS": 0.2, "CRAWLER.ROBOTS": "true",
+                "LOCAL PROPERTIES.THREADCOUNT": 4})
+        finally:
+            crawler.downloader.download = download
+        for host, times in requests.items():
+            self.assertTrue(times[0][1].endswith("/robots.txt"))
+            self.assertTrue(times[1][1].endswith("/sitemap.xml"))
+            for (before, _), (after, url) in zip(times, times[1:]):
+                self.assertGreaterEqual(after - before, 0.19, url)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        metrics = Metrics()
+        self.assertIs(metrics.time("download"), NULL_TIMER)
+        with metrics.time("download"):
+            metrics.count("responses", status=200)
+        snapshot = metrics.snapshot()
+        self.assertEqual((snapshot["stages"], snapshot["counters"]), ({}, {}))
+
+    def test_shards_are_merged_and_exported(self):
+        import threading
+        metrics = Metrics()
+        metrics.enable()
+        metrics.add_collector(lambda: {
+            "frontier_queued": 7, "host_backlog": {"a.ics.uci.edu": 3}})
+
+        def fetch():
+            for status in (200, 200, 404):
+                with metrics.time("download"):
+                    metrics.count("responses", status=status)
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["stages"]["download"]["count"], 12)
+        self.assertEqual(snapshot["counters"], {
+            "responses{status=200}": 8, "responses{status=404}": 4})
+        self.assertEqual(snapshot["gauges"]["frontier_queued"], 7)
+        text = metrics.prometheus_text()
+        self.assertIn(
+            'crawler_stage_seconds_count{stage="download"} 12', text)
+        self.assertIn('crawler_responses_total{status="404"} 4', text)
+        self.assertIn('crawler_host_backlog{host="a.ics.uci.edu"} 3', text)
+
+
+class TestLogging(unittest.TestCase):
+    def test_one_line_per_record_and_per_component_levels(self):
+        from utils import get_logger
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                log_backend.configure(
+                    directory, levels={"Worker": "WARNING"},
+                    console_level="CRITICAL")
+                for _ in range(3):
+                    logger = get_logger("Test-0", "Test")
+                logger.info("first")
+                get_logger("Test-1", "Test").info("second")
+                worker = get_logger("Worker-7", "Worker")
+                worker.info("hidden")
+                worker.warning("shown")
+                log_backend.flush()
+                with open(os.path.join(directory, "Test.log")) as log:
+                    lines = log.read().splitlines()
+                self.assertEqual(len(logger.handlers), 1)
+                self.assertEqual(
+                    [line.rsplit(" - ", 1)[1] for line in lines],
+                    ["first", "second"])
+                with open(os.path.join(directory, "Worker.log")) as log:
+                    self.assertIn("shown", log.read())
+            finally:
+                log_backend.configure()
+
+    def test_rate_limit_spares_warnings(self):
+        import logging
+        limiter = RateLimiter(0.001, burst=2)
+        records = [
+            logging.LogRecord("w", level, "", 0, "msg", None, None)
+            for level in (logging.INFO,) * 5 + (logging.WARNING,)]
+        self.assertEqual(
+            [limiter.filter(record) for record in records],
+            [True, True, False, False, False, True])
+        # Another logging call, such as a state change, has its own bucket.
+        change = logging.LogRecord(
+            "w", logging.INFO, "", 1, "circuit opened", None, None)
+        self.assertTrue(limiter.filter(change))
+        records[0].msg = "msg"
+        limiter.buckets[("", 0)][0] = 1
+        self.assertTrue(limiter.filter(records[0]))
+        self.assertEqual(records[0].msg, "msg (3 earlier messages dropped)")
+
+
+class TestSeenIndex(unittest.TestCase):
+    def test_membership_survives_growth(self):
+        for bloom_bits in (0, 1 << 16):
+            index = SeenIndex(capacity=4, bloom_bits=bloom_bits)
+            added = [get_urlhash(f"https://ics.uci.edu/{i}") for i in range(1000)]
+            for urlhash in added:
+                index.add(SeenIndex.fingerprint(urlhash))
+            index.add(SeenIndex.fingerprint(added[0]))
+            self.assertEqual(len(index), 1000)
+            for urlhash in added:
+                self.assertIn(SeenIndex.fingerprint(urlhash), index)
+            self.assertNotIn(
+                SeenIndex.fingerprint(get_urlhash("https://ics.uci.edu/x")),
+                index)
+
+
+class TestCrawlStats(unittest.TestCase):
+    def test_top_words_match_counter(self):
+        import random
+        rng = random.Random(1)
+        stats = CrawlStats(top_k=5)
+        for page in range(200):
+            words = Counter(
+                f"w{int(rng.paretovariate(1.2))}" for _ in range(50))
+            stats.record_page(
+                f"https://a.ics.uci.edu/{page}", "", words, sum(words.values()))
+            stats.merge_shards()
+            self.assertEqual(
+                sorted(count for _, count in stats.top_words.most_common()),
+                sorted(count for _, count in
+                       stats.word_frequencies.most_common(5)))
+
+    def test_worker_shards_merge_exactly(self):
+        import threading
+        stats = CrawlStats()
+        pages = [
+            (f"https://s{i % 5}.ics.uci.edu/{i}",
+             Counter({f"w{j}": (i * j) % 7 + 1 for j in range(40)}))
+            for i in range(400)]
+
+        def record(chunk):
+            for url, words in chunk:
+                stats.record_page(url, url, words, sum(words.values()))
+
+        threads = [
+            threading.Thread(target=record, args=(pages[i::8],))
+            for i in range(8)]
+        for thread in threads:
+            thread.start()
+        stats.merge_shards()
+        for thread in threads:
+            thread.join()
+        stats.merge_shards()
+        self.assertEqual(len(stats.shards), 8)
+        self.assertEqual(
+            stats.word_frequencies,
+            sum((words for _, words in pages), Counter()))
+        self.assertEqual(len(stats.unique_pages), 400)
+        self.assertEqual(sum(stats.subdomains.values()), 400)
+
+    def test_restore_in_place(self):
+        stats = CrawlStats()
+        stats.record_page(
+            "https://a.ics.uci.edu/x", "https://a.ics.uci.edu/x",
+            Counter(apple=3, pear=1), 4)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stats")
+            stats.save(path)
+            restored = CrawlStats()
+            pages = restored.unique_pages
+            restored.restore(path)
+        self.assertIs(restored.unique_pages, pages)
+        self.assertEqual(pages, {"https://a.ics.uci.edu/x"})
+        self.assertEqual(
+            restored.top_words.most_common(), [("apple", 3), ("pear", 1)])
+        self.assertEqual(restored.subdomains["a.ics.uci.edu"], 1)
+
+
+class TestSimHash(unittest.TestCase):
+    def test_near_duplicates(self):
+        words = Counter({f"word{i}": i % 7 + 1 for i in range(300)})
+        variant = Counter(words, printable=1)
+        other = Counter({f"other{i}": i % 5 + 1 for i in range(300)})
+        index = SimHashIndex(max_distance=3)
+        self.assertFalse(index.check_and_add(simhash(words)))
+        self.assertTrue(index.check_and_add(simhash(variant)))
+        self.assertFalse(index.check_and_add(simhash(other)))
+        self.assertEqual((len(index), index.duplicates), (2, 1))
+
+    def test_bands_find_every_close_fingerprint(self):
+        index = SimHashIndex(max_distance=3)
+        index.check_and_add(0xFFFF0000FFFF0000)
+        for bits in ((0,), (1, 20), (5, 40, 63), (2, 17, 33)):
+            near = 0xFFFF0000FFFF0000
+            for bit in bits:
+                near ^= 1 << bit
+            self.assertIsNotNone(index.find(near))
+        self.assertIsNone(index.find(0xFFFF0000FFFF000F))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,25 +1,19 @@
-import os
-import logging
 from hashlib import sha256
 from urllib.parse import urlparse
 
+from utils.log_queue import backend as _log_backend
+
 def get_logger(name, filename=None):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    if not os.path.exists("Logs"):
-        os.makedirs("Logs")
-    fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
-    fh.setLevel(logging.DEBUG)
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-       "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    fh.setFormatter(formatter)
-    ch.setFormatter(formatter)
-    # add the handlers to the logger
-    logger.addHandler(fh)
-    logger.addHandler(ch)
-    return logger
+    # Records go through one queue to a listener thread that writes
+    # Logs/<filename or name>.log and the console, so callers never wait on
+    # either. Asking for the same logger again returns it unchanged.
+    return _log_backend.get_logger(name, filename if filename else name)
+
+
+def configure_logging(config):
+    _log_backend.configure(
+        config.log_dir, config.log_level, config.log_levels,
+        config.console_log_level, config.log_rate)
 
 
 def get_urlhash(url):
@@ -8,12 +8,156 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        # Threads downloading ahead of the workers, 0 to let every worker
+        # download its own urls, and how many downloaded pages may wait.
+        self.download_threads = int(
+            config["LOCAL PROPERTIES"].get("DOWNLOADTHREADS", 0))
+        self.download_queue = int(config["LOCAL PROPERTIES"].get(
+            "DOWNLOADQUEUE", 2 * max(self.download_threads, 1)))
+        # Processes parsing pages outside the crawler process, 0 to parse in
+        # the worker threads, and how many pages may be handed to them at once.
+        self.parser_processes = int(
+            config["LOCAL PROPERTIES"].get("PARSERPROCESSES", 0))
+        self.parser_queue = int(config["LOCAL PROPERTIES"].get(
+            "PARSERQUEUE", 2 * max(self.parser_processes, 1)))
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        # Frontier updates are logged and fsynced in batches of SYNCBATCH
+        # records or every SYNCINTERVAL seconds, whichever comes first, and
+        # folded into the save file every COMPACTEVERY records.
+        self.sync_batch = int(config["LOCAL PROPERTIES"].get("SYNCBATCH", 500))
+        self.sync_interval = float(
+            config["LOCAL PROPERTIES"].get("SYNCINTERVAL", 5))
+        self.compact_every = int(
+            config["LOCAL PROPERTIES"].get("COMPACTEVERY", 50000))
+        # "eager" checks every pending url with is_valid when a crawl is
+        # resumed, "lazy" only when the url is handed to a worker.
+        self.revalidate = config["LOCAL PROPERTIES"].get(
+            "REVALIDATE", "eager").strip().lower()
+        # Size in bits of the Bloom filter in front of the seen-url index,
+        # 0 to disable it.
+        self.seen_bloom_bits = int(
+            config["LOCAL PROPERTIES"].get("SEENBLOOMBITS", 0))
+        # Queued urls kept in memory; the frontier spills the rest to disk.
+        self.frontier_memory = int(
+            config["LOCAL PROPERTIES"].get("FRONTIERMEMORY", 100000))
+        # Stage timings, counters and gauges are recorded when METRICS is
+        # true, appended to METRICSFILE every METRICSINTERVAL seconds and
+        # served on METRICSPORT unless it is 0. PROFILEINTERVAL, unless 0,
+        # is the seconds between stack samples of every thread.
+        self.metrics = config["LOCAL PROPERTIES"].get(
+            "METRICS", "false").strip().lower() in ("true", "yes", "on", "1")
+        self.metrics_file = config["LOCAL PROPERTIES"].get(
+            "METRICSFILE", "metrics.jsonl").strip()
+        self.metrics_interval = float(
+            config["LOCAL PROPERTIES"].get("METRICSINTERVAL", 10))
+        self.metrics_port = int(
+            config["LOCAL PROPERTIES"].get("METRICSPORT", 0))
+        self.profile_interval = float(
+            config["LOCAL PROPERTIES"].get("PROFILEINTERVAL", 0))
+        # Log files go to LOGDIR. Loggers log at LOGLEVEL unless LOGLEVELS,
+        # a list such as "Worker=WARNING,FRONTIER=DEBUG", names their
+        # component; the console only shows CONSOLELOGLEVEL and above. Each
+        # logging call of a component logs at most LOGRATE records below
+        # WARNING per second, 0 for no limit.
+        self.log_dir = config["LOCAL PROPERTIES"].get("LOGDIR", "Logs").strip()
+        self.log_level = config["LOCAL PROPERTIES"].get(
+            "LOGLEVEL", "INFO").strip()
+        self.log_levels = dict(
+            (part.strip() for part in item.split("=", 1))
+            for item in config["LOCAL PROPERTIES"].get(
+                "LOGLEVELS", "").split(",")
+            if "=" in item)
+        self.console_log_level = config["LOCAL PROPERTIES"].get(
+            "CONSOLELOGLEVEL", "INFO").strip()
+        self.log_rate = float(config["LOCAL PROPERTIES"].get("LOGRATE", 0))
+        # The crawl is split into SHARDS processes, each owning the hosts
+        # whose hash falls in its partition. Shard i listens for links found
+        # by the other shards on the i-th SHARDADDRESSES entry (host:port,
+        # by default localhost:9100+i), and each shard sends them in
+        # batches of SHARDBATCH links at least every SHARDINTERVAL seconds.
+        self.shards = int(config["LOCAL PROPERTIES"].get("SHARDS", 1))
+        self.shard_id = 0
+        addresses = config["LOCAL PROPERTIES"].get(
+            "SHARDADDRESSES", "").strip()
+        self.shard_addresses = [
+            (host.strip(), int(port)) for host, port in (
+                address.rsplit(":", 1) for address in addresses.split(","))
+        ] if addresses else [
+            ("localhost", 9100 + shard) for shard in range(self.shards)]
+        self.shard_authkey = config["LOCAL PROPERTIES"].get(
+            "SHARDAUTHKEY", "crawler").strip().encode("utf-8")
+        self.shard_batch = int(config["LOCAL PROPERTIES"].get("SHARDBATCH", 200))
+        self.shard_interval = float(
+            config["LOCAL PROPERTIES"].get("SHARDINTERVAL", 0.5))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        # Keep-alive connections kept open to the cache server, and the
+        # connect and read timeouts of each request in seconds.
+        self.pool_size = int(config["CONNECTION"].get("POOLSIZE", 10))
+        self.connect_timeout = float(
+            config["CONNECTION"].get("CONNECTTIMEOUT", 5))
+        self.read_timeout = float(config["CONNECTION"].get("READTIMEOUT", 30))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        # Pages whose SimHash is within this many bits of an earlier page are
+        # treated as near duplicates.
+        self.simhash_distance = int(config["CRAWLER"].get("SIMHASHDISTANCE", 3))
+        # Seconds between rewrites of report.txt and checkpoints of the
+        # frontier during the crawl.
+        self.report_interval = float(config["CRAWLER"].get("REPORTINTERVAL", 60))
+        # Seconds between merges of the per-worker statistics.
+        self.stats_merge_interval = float(
+            config["CRAWLER"].get("STATSMERGEINTERVAL", 1))
+        # Url templates whose share of fetches adding new text drops below
+        # TRAPMINYIELD after TRAPMINFETCHES fetches are throttled, and
+        # blocked if it has not recovered after TRAPBUDGET more.
+        self.trap_min_fetches = int(
+            config["CRAWLER"].get("TRAPMINFETCHES", 30))
+        self.trap_min_yield = float(config["CRAWLER"].get("TRAPMINYIELD", 0.1))
+        self.trap_budget = int(config["CRAWLER"].get("TRAPBUDGET", 50))
+        # Responses from the cache server over MAXDOWNLOADBYTES are dropped
+        # unread, pages whose first SNIFFBYTES bytes are not text are not
+        # parsed, and only the first MAXPAGEBYTES bytes of a page are parsed.
+        self.max_download_bytes = int(
+            config["CRAWLER"].get("MAXDOWNLOADBYTES", 10 * 2 ** 20))
+        self.sniff_bytes = int(config["CRAWLER"].get("SNIFFBYTES", 4096))
+        self.max_page_bytes = int(
+            config["CRAWLER"].get("MAXPAGEBYTES", 2 ** 20))
+        # A failing host waits HOSTBACKOFF seconds, doubled per consecutive
+        # failure up to HOSTMAXBACKOFF. After HOSTFAILURES failures in a row,
+        # or more than HOSTERRORRATE of its recent fetches failing, its urls
+        # are parked for HOSTCOOLDOWN seconds, doubled per failed probe up to
+        # HOSTMAXCOOLDOWN, until HOSTPROBES probes in a row succeed. If
+        # HOSTMAXOPENS is above 0, hosts parked that many times without
+        # recovering are given up on; 0 keeps them parked.
+        # Fetches slower than HOSTSLOW seconds count as failures.
+        self.host_failures = int(config["CRAWLER"].get("HOSTFAILURES", 5))
+        self.host_error_rate = float(
+            config["CRAWLER"].get("HOSTERRORRATE", 0.5))
+        self.host_backoff = float(config["CRAWLER"].get("HOSTBACKOFF", 1))
+        self.host_max_backoff = float(
+            config["CRAWLER"].get("HOSTMAXBACKOFF", 60))
+        self.host_cooldown = float(config["CRAWLER"].get("HOSTCOOLDOWN", 60))
+        self.host_max_cooldown = float(
+            config["CRAWLER"].get("HOSTMAXCOOLDOWN", 600))
+        self.host_probes = int(config["CRAWLER"].get("HOSTPROBES", 2))
+        self.host_max_opens = int(config["CRAWLER"].get("HOSTMAXOPENS", 0))
+        self.host_slow = float(config["CRAWLER"].get("HOSTSLOW", 10))
+        # With ROBOTS on, the robots.txt of each host is read before its
+        # first url and again after ROBOTSTTL seconds. Disallowed urls are
+        # skipped and Crawl-delay lengthens the politeness delay, up to
+        # ROBOTSMAXDELAY seconds. Up to SITEMAPMAXURLS urls from at most
+        # SITEMAPMAXFILES of the sitemaps it lists are queued, 0 for none.
+        self.robots = config["CRAWLER"].get(
+            "ROBOTS", "true").strip().lower() in ("true", "yes", "on", "1")
+        self.robots_ttl = float(config["CRAWLER"].get("ROBOTSTTL", 86400))
+        self.robots_max_delay = float(
+            config["CRAWLER"].get("ROBOTSMAXDELAY", 30))
+        self.sitemap_max_urls = int(
+            config["CRAWLER"].get("SITEMAPMAXURLS", 50000))
+        self.sitemap_max_files = int(
+            config["CRAWLER"].get("SITEMAPMAXFILES", 10))
 
         self.cache_server = None
\ No newline at end of file
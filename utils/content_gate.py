@@ -0,0 +1,61 @@
+# Content types that are parsed as pages. A response without a content type
+# is sniffed instead.
+TEXT_TYPES = {
+    "text/html", "application/xhtml+xml", "text/plain", "text/xml",
+    "application/xml"}
+# Bytes that do not occur in text: controls other than tab, newline, form
+# feed and carriage return.
+BINARY_BYTES = bytes(set(range(32)) - {9, 10, 12, 13})
+
+
+def looks_binary(head):
+    ''' True if the first bytes of a body are not text. UTF-16 bodies,
+    which are full of NUL bytes, are recognized by their byte order mark. '''
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return False
+    if b"\x00" in head:
+        return True
+    return len(head.translate(None, BINARY_BYTES)) < 0.9 * len(head)
+
+
+def gate_content(resp, config, logger=None):
+    ''' Returns the content of resp that should be parsed, or None if the
+    page is not worth parsing. Runs before anything is parsed or decoded:
+    oversized and non-text responses are rejected from their size, headers
+    and first SNIFFBYTES bytes, and text bodies are cut to MAXPAGEBYTES. '''
+    def reject(reason):
+        if logger:
+            logger.info(f"Not parsing {resp.url}: {reason}.")
+        return None
+
+    if resp.status != 200:
+        return None
+    if resp.size > config.max_download_bytes:
+        return reject(f"response of {resp.size} bytes")
+    # Headers sent beside the pickled response are checked before it is
+    # unpickled; otherwise they have to come from the response itself.
+    headers = resp.headers
+    if headers is None:
+        headers = getattr(resp.raw_response, 'headers', None) or {}
+    content_type = headers.get("content-type", "")
+    mime = content_type.split(";")[0].strip().lower()
+    if mime and mime not in TEXT_TYPES:
+        return reject(f"content type {mime}")
+    declared = headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > config.max_download_bytes:
+        return reject(f"declared length of {declared} bytes")
+    raw_response = resp.raw_response
+    if not hasattr(raw_response, 'content'):
+        return None
+    content = raw_response.content
+    if not content:
+        return None
+    if looks_binary(content[:config.sniff_bytes]):
+        return reject("binary content")
+    if len(content) > config.max_page_bytes:
+        if logger:
+            logger.info(
+                f"Parsing the first {config.max_page_bytes} of "
+                f"{len(content)} bytes of {resp.url}.")
+        content = content[:config.max_page_bytes]
+    return content
@@ -2,20 +2,82 @@ import requests
 import cbor
 import time
 
+from threading import Lock
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import metrics
 from utils.response import Response
 
+_session = None
+_session_lock = Lock()
+
+def get_session(config):
+    ''' Returns the session shared by every download, so that requests to
+    the cache server reuse keep-alive connections from one pool. '''
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=config.pool_size,
+                pool_block=True)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+        return _session
+
+def read_capped(resp, limit):
+    ''' Returns the body of a streamed response, or None without reading
+    the rest of it once it is longer than limit bytes. '''
+    declared = resp.headers.get("Content-Length", "")
+    if declared.isdigit() and int(declared) > limit:
+        return None
+    chunks = []
+    size = 0
+    for chunk in resp.iter_content(64 * 1024):
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+        with metrics.time("download"):
+            resp = get_session(config).get(
+                f"http://{host}:{port}/",
+                params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+                timeout=(config.connect_timeout, config.read_timeout),
+                stream=True)
+            try:
+                content = read_capped(resp, config.max_download_bytes)
+            finally:
+                resp.close()
+    except requests.RequestException as e:
+        if logger:
+            logger.error(f"Request to cache failed for url {url}: {e}")
+        return Response({
+            "error": f"Request to cache failed for url {url}: {e}",
+            "status": None,
+            "url": url})
+    if content is None:
+        if logger:
+            logger.info(
+                f"Response for url {url} is larger than "
+                f"{config.max_download_bytes} bytes.")
+        return Response({
+            "error": f"Response for url {url} is larger than "
+                     f"{config.max_download_bytes} bytes.",
+            "status": resp.status_code,
+            "url": url})
+    try:
+        if resp and content:
+            with metrics.time("decode"):
+                return Response(cbor.loads(content))
     except (EOFError, ValueError) as e:
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    if logger:
+        logger.error(f"Spacetime Response error {resp} with url {url}.")
     return Response({
         "error": f"Spacetime Response error {resp} with url {url}.",
         "status": resp.status_code,
-        "url": url})
\ No newline at end of file
+        "url": url})
@@ -0,0 +1,80 @@
+from bs4.dammit import EncodingDetector
+from lxml import etree
+
+# Tags whose strings BeautifulSoup keeps out of get_text().
+HIDDEN_TEXT_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+
+
+class PageTarget(object):
+    ''' lxml parser target that collects visible text and hrefs as the
+    parser emits events, without building a tree. Text is split into the
+    same strings BeautifulSoup would create, so joining them matches
+    soup.get_text(separator=' '). '''
+
+    def __init__(self):
+        self.texts = []
+        self.hrefs = []
+        self.hidden = []
+        self.buffer = []
+
+    def start(self, tag, attrib):
+        self._end_string()
+        if tag == 'a':
+            href = attrib.get('href')
+            if href is not None:
+                self.hrefs.append(href)
+        if tag in HIDDEN_TEXT_TAGS:
+            self.hidden.append(tag)
+
+    def end(self, tag):
+        self._end_string()
+        if tag in HIDDEN_TEXT_TAGS and self.hidden:
+            self.hidden.pop()
+
+    def data(self, data):
+        # A single string can arrive in several chunks.
+        self.buffer.append(data)
+
+    def comment(self, text):
+        self._end_string()
+
+    def pi(self, target, data=None):
+        self._end_string()
+
+    def doctype(self, *args):
+        self._end_string()
+
+    def close(self):
+        self._end_string()
+        return self
+
+    def _end_string(self):
+        if not self.buffer:
+            return
+        if not self.hidden:
+            text = ''.join(self.buffer).strip()
+            if text:
+                self.texts.append(text)
+        self.buffer.clear()
+
+
+def parse_page(content):
+    ''' Returns (visible text strings, hrefs) for an html document in one
+    pass over the parser events. '''
+    if isinstance(content, str):
+        return _parse(content, None)
+    # Same encoding guesses, in the same order, as BeautifulSoup.
+    for encoding in EncodingDetector(content, is_html=True).encodings:
+        try:
+            return _parse(content, encoding)
+        except (UnicodeDecodeError, LookupError, etree.ParserError):
+            continue
+    return [], []
+
+
+def _parse(content, encoding):
+    target = PageTarget()
+    parser = etree.HTMLParser(target=target, encoding=encoding)
+    parser.feed(content)
+    parser.close()
+    return target.texts, target.hrefs
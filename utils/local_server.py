@@ -0,0 +1,301 @@
+''' Local stand-in for the cache server, for developing and benchmarking the
+crawler without registering with the spacetime servers.
+
+It answers GET /?q=<url>&u=<user agent> with the same CBOR encoded dict as
+the cache server, {"url", "status", "response"} where response is a pickled
+requests.Response, or {"url", "status", "error"} for cache errors, and
+serves either a synthetic site graph or a recorded one. Responses also carry
+their "headers" beside the pickle, which the content gate checks before
+unpickling.
+
+    python -m utils.local_server --port 9000 --latency 0.05 --error-rate 0.02
+    python3 launch.py --cache_server localhost:9000
+'''
+import json
+import os
+import pickle
+import random
+import string
+import sys
+import time
+
+from argparse import ArgumentParser
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+from urllib.parse import parse_qs, urlparse
+
+import cbor
+import requests
+
+SYNTHETIC_HOSTS = [
+    "www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu",
+    "www.stat.uci.edu", "vision.ics.uci.edu", "ngs.ics.uci.edu"]
+# Nested directory traps stop growing at this many path segments.
+TRAP_DEPTH = 30
+# Status of the responses failed on purpose; 600 and above are cache errors,
+# which come without a response.
+ERROR_STATUSES = (404, 500, 503, 600)
+
+
+class SyntheticSite(object):
+    ''' Site graph generated from each url, so that any number of pages can
+    be served without storing them.
+
+    Each of hosts (SYNTHETIC_HOSTS, then lab<n>.ics.uci.edu) has pages
+    /p/0 to /p/<pages - 1> of min_words to max_words words, linking to
+    links pages of the same host and one of another host; / is /p/0. A
+    trap_rate share of the pages also link into an endless trap area of
+    pages with little text: a paginated /archive/page/<n> or nested
+    /files/<a>/<b>/... directories. With robots, each host serves a
+    /robots.txt disallowing the trap areas and listing /sitemap.xml, which
+    lists every page of the host. '''
+
+    def __init__(self, hosts=6, pages=1000, links=10, min_words=200,
+                 max_words=2000, trap_rate=0.1, seed=0, robots=False):
+        self.hosts = SYNTHETIC_HOSTS[:hosts] + [
+            f"lab{i}.ics.uci.edu" for i in range(hosts - len(SYNTHETIC_HOSTS))]
+        self.host_set = set(self.hosts)
+        self.pages = pages
+        self.links = links
+        self.min_words = min_words
+        self.max_words = max_words
+        self.trap_rate = trap_rate
+        self.seed = seed
+        self.robots = robots
+        rng = random.Random(seed)
+        self.vocabulary = [
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randrange(3, 11)))
+            for _ in range(5000)]
+
+    def seeds(self):
+        return [f"https://{host}" for host in self.hosts]
+
+    def page(self, url):
+        ''' Returns (status, content type, body) for url. '''
+        parsed = urlparse(url)
+        if parsed.netloc not in self.host_set:
+            return 404, "text/html", b"<html><body>Not found</body></html>"
+        rng = random.Random(f"{self.seed}:{url}")
+        host = parsed.netloc
+        path = parsed.path.rstrip("/") or "/p/0"
+        if self.robots and path == "/robots.txt":
+            body = (
+                f"User-agent: *\nDisallow: /archive/\nDisallow: /files\n"
+                f"Sitemap: https://{host}/sitemap.xml\n")
+            return 200, "text/plain", body.encode()
+        if self.robots and path == "/sitemap.xml":
+            body = "".join(
+                f"<url><loc>https://{host}/p/{number}</loc></url>"
+                for number in range(self.pages))
+            return 200, "application/xml", (
+                f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns='
+                f'"http://www.sitemaps.org/schemas/sitemap/0.9">{body}'
+                f'</urlset>').encode()
+        if path.startswith("/archive/page/"):
+            index = int(path.rsplit("/", 1)[1] or 0)
+            links = [
+                f"https://{host}/archive/page/{index + step}"
+                for step in (1, 2, 10)]
+            return self._html(rng, rng.randrange(20, 150), links + [
+                f"https://{host}/p/{rng.randrange(self.pages)}"])
+        if path.startswith("/files"):
+            if path.count("/") < TRAP_DEPTH:
+                links = [f"https://{host}{path}/{name}" for name in "abc"]
+            else:
+                links = [
+                    f"https://{host}/files/{rng.randrange(10 ** 6)}"
+                    for _ in range(3)]
+            return self._html(rng, rng.randrange(20, 150), links)
+        number = path[3:] if path.startswith("/p/") else ""
+        if not number.isdigit() or int(number) >= self.pages:
+            return 404, "text/html", b"<html><body>Not found</body></html>"
+        links = [
+            f"https://{host}/p/{rng.randrange(self.pages)}"
+            for _ in range(self.links)]
+        links.append(
+            f"https://{rng.choice(self.hosts)}/p/{rng.randrange(self.pages)}")
+        if rng.random() < self.trap_rate:
+            links.append(rng.choice([
+                f"https://{host}/archive/page/{rng.randrange(1000)}",
+                f"https://{host}/files/{rng.randrange(100)}"]))
+        return self._html(
+            rng, rng.randrange(self.min_words, self.max_words + 1), links)
+
+    def _html(self, rng, words, links):
+        text = rng.choices(self.vocabulary, k=words)
+        paragraphs = "".join(
+            f"<p>{' '.join(text[start:start + 100])}</p>"
+            for start in range(0, words, 100))
+        anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+        body = (
+            f"<html><head><title>{text[0]}</title></head>"
+            f"<body>{paragraphs}{anchors}</body></html>")
+        return 200, "text/html; charset=utf-8", body.encode()
+
+
+class RecordedSite(object):
+    ''' Site graph recorded in directory: index.jsonl has one line per
+    page, {"url", "status", "content_type", "file"}, where file is the
+    path of the page body relative to directory. The first line is the
+    seed url. Other urls get a 404. '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = dict()
+        with open(os.path.join(directory, "index.jsonl")) as index:
+            for line in index:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.index[entry["url"]] = entry
+
+    def seeds(self):
+        return list(self.index)[:1]
+
+    def page(self, url):
+        ''' Returns (status, content type, body) for url. '''
+        entry = self.index.get(url)
+        if entry is None:
+            return 404, "text/html", b"<html><body>Not found</body></html>"
+        with open(os.path.join(self.directory, entry["file"]), "rb") as body:
+            content = body.read()
+        return (
+            entry.get("status", 200),
+            entry.get("content_type", "text/html"), content)
+
+
+class _CacheHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        if "q" not in query or "u" not in query:
+            self.send_error(400, "Expected the q and u parameters")
+            return
+        body = cbor.dumps(self.server.respond(query["q"][0]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalCacheServer(ThreadingHTTPServer):
+    ''' Serves site like the cache server, each request after latency
+    seconds, give or take jitter. An error_rate share of the urls, the same
+    ones on every request, fail with one of ERROR_STATUSES. Every request
+    for down_hosts fails with a 608 cache error after down_latency seconds,
+    as if the host timed out. requests counts the requests per host. Port
+    0 picks a free port; server_address holds the one in use. '''
+
+    daemon_threads = True
+
+    def __init__(self, site, host="localhost", port=0, latency=0.0,
+                 jitter=0.0, error_rate=0.0, down_hosts=(),
+                 down_latency=0.0):
+        super().__init__((host, port), _CacheHandler)
+        self.site = site
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.down_hosts = set(down_hosts)
+        self.down_latency = down_latency
+        self.requests = Counter()
+        self.lock = Lock()
+        self.thread = None
+
+    def respond(self, url):
+        ''' Returns the dict the cache server would send for url. '''
+        host = urlparse(url).netloc
+        with self.lock:
+            self.requests[host] += 1
+        if host in self.down_hosts:
+            time.sleep(self.down_latency)
+            return {"url": url, "status": 608,
+                    "error": f"Cache error 608 for url {url}."}
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        rng = random.Random(f"error:{url}")
+        if rng.random() < self.error_rate:
+            status = rng.choice(ERROR_STATUSES)
+            if status >= 600:
+                return {"url": url, "status": status,
+                        "error": f"Cache error {status} for url {url}."}
+            content_type, content = "text/html", b"<html><body></body></html>"
+        else:
+            status, content_type, content = self.site.page(url)
+        raw = requests.models.Response()
+        raw.status_code = status
+        raw.url = url
+        raw.headers["Content-Type"] = content_type
+        raw._content = content
+        return {
+            "url": url, "status": status, "response": pickle.dumps(raw),
+            "headers": {
+                "Content-Type": content_type,
+                "Content-Length": str(len(content))}}
+
+    def handle_error(self, request, client_address):
+        # Crawlers that stop in the middle of a request drop the connection.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        ''' Serves in a daemon thread until shutdown. '''
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def make_site(args):
+    if args.recorded:
+        return RecordedSite(args.recorded)
+    return SyntheticSite(
+        hosts=args.hosts, pages=args.pages, links=args.links,
+        trap_rate=args.trap_rate, seed=args.seed, robots=args.robots)
+
+
+def add_arguments(parser):
+    ''' Adds the options of the served site and its server to parser. '''
+    parser.add_argument("--recorded", type=str, default=None)
+    parser.add_argument("--hosts", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--links", type=int, default=10)
+    parser.add_argument("--trap-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--robots", action="store_true", default=False)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--down-hosts", type=str, default="")
+    parser.add_argument("--down-latency", type=float, default=5.0)
+
+
+def main(args):
+    site = make_site(args)
+    server = LocalCacheServer(
+        site, args.host, args.port, args.latency, args.jitter,
+        args.error_rate, [host for host in args.down_hosts.split(",") if host],
+        args.down_latency)
+    host, port = server.server_address[:2]
+    print(f"Serving on {host}:{port}, seed urls {','.join(site.seeds())}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--host", type=str, default="localhost")
+    parser.add_argument("--port", type=int, default=9000)
+    add_arguments(parser)
+    main(parser.parse_args())
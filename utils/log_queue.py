@@ -0,0 +1,248 @@
+import atexit
+import logging
+import os
+import sys
+import time
+
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue, Empty
+from threading import Lock, Event
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Records written per batch, with one write and flush per destination.
+BATCH_SIZE = 512
+
+
+class RateLimiter(logging.Filter):
+    ''' Token buckets letting through at most rate records per second below
+    WARNING from each logging call, with bursts of up to burst records.
+    Messages are formatted before they are logged, so the call is the
+    message template: a message logged for every url is throttled without
+    holding back rare ones such as state changes. The number of records
+    dropped is added to the next record of the same call let through. '''
+
+    def __init__(self, rate, burst=None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        # (file, line) of the call -> [tokens, last update, records dropped]
+        self.buckets = dict()
+        self.lock = Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(
+                self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} earlier messages dropped)"
+        return True
+
+
+class ComponentQueueHandler(QueueHandler):
+    ''' Puts the records of a logger on the shared queue, tagged with the
+    component whose log file they go to. '''
+
+    def __init__(self, queue, component):
+        super().__init__(queue)
+        self.component = component
+
+    def prepare(self, record):
+        # The record only goes to the listener of this process, so it is
+        # neither copied nor formatted here; the listener thread does that.
+        record.component = self.component
+        return record
+
+
+class BatchHandler(logging.Handler):
+    ''' Writes batches of records to the console and to
+    <directory>/<component>.log. Only used by the listener thread, which
+    keeps each file open for the whole crawl. '''
+
+    def __init__(self, directory, console_level):
+        super().__init__()
+        self.setFormatter(logging.Formatter(FORMAT))
+        self.directory = directory
+        self.console_level = console_level
+        self.files = dict()
+
+    def emit(self, record):
+        self.handle_batch([record])
+
+    def handle_batch(self, records):
+        console = []
+        lines = dict()
+        for record in records:
+            line = self.format(record) + "\n"
+            lines.setdefault(record.component, []).append(line)
+            if record.levelno >= self.console_level:
+                console.append(line)
+        for component, component_lines in lines.items():
+            log_file = self.files.get(component)
+            if log_file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                log_file = self.files[component] = open(
+                    os.path.join(self.directory, f"{component}.log"), "a",
+                    encoding="utf-8")
+            log_file.write("".join(component_lines))
+            log_file.flush()
+        if console:
+            sys.stderr.write("".join(console))
+            sys.stderr.flush()
+
+    def close(self):
+        for log_file in self.files.values():
+            log_file.close()
+        self.files.clear()
+        super().close()
+
+
+class _FlushMarker(object):
+    def __init__(self):
+        self.done = Event()
+
+
+class BatchingQueueListener(QueueListener):
+    ''' QueueListener that takes every waiting record off the queue, up to
+    BATCH_SIZE, and hands them to its handler at once. '''
+
+    def _monitor(self):
+        while True:
+            batch = [self.dequeue(True)]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.dequeue(False))
+                except Empty:
+                    break
+            records = [
+                record for record in batch
+                if isinstance(record, logging.LogRecord)]
+            if records:
+                for handler in self.handlers:
+                    try:
+                        handler.handle_batch(records)
+                    except Exception:
+                        handler.handleError(records[-1])
+            for item in batch:
+                if isinstance(item, _FlushMarker):
+                    item.done.set()
+            if self._sentinel in batch:
+                break
+
+
+class AsyncLogging(object):
+    ''' Logging backend shared by every logger of the process.
+
+    Loggers only put records on a queue; one listener thread formats them
+    and writes them in batches, so logging never waits on the terminal or
+    the disk. Each logger gets a single handler however often get_logger
+    is called for it. configure sets the directory, the default level,
+    per-component levels and the rate limit of each component. '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.queue = SimpleQueue()
+        self.listener = None
+        self.handler = None
+        self.directory = "Logs"
+        self.level = logging.INFO
+        self.console_level = logging.INFO
+        # Logger or component name -> level.
+        self.levels = dict()
+        self.rate = 0
+        # Component -> RateLimiter shared by its loggers.
+        self.limiters = dict()
+        # Logger name -> component, for every logger handed out.
+        self.loggers = dict()
+
+    def configure(self, directory="Logs", level="INFO", levels=None,
+                  console_level="INFO", rate=0):
+        ''' levels maps logger or component names, such as "Worker" for
+        every worker, to level names. rate limits each component to that
+        many records below WARNING per second, 0 for no limit. '''
+        with self.lock:
+            if self.handler is not None and directory != self.directory:
+                self._stop()
+            self.directory = directory
+            self.level = logging.getLevelName(level.upper())
+            self.console_level = logging.getLevelName(console_level.upper())
+            self.levels = {
+                name: logging.getLevelName(value.upper())
+                for name, value in (levels or dict()).items()}
+            if self.handler is not None:
+                self.handler.console_level = self.console_level
+            self.rate = rate
+            self.limiters.clear()
+            for name, component in self.loggers.items():
+                self._setup(logging.getLogger(name), component)
+            if self.loggers:
+                self._start()
+
+    def get_logger(self, name, component):
+        logger = logging.getLogger(name)
+        with self.lock:
+            self._start()
+            if self.loggers.get(name) != component:
+                self.loggers[name] = component
+                self._setup(logger, component)
+        return logger
+
+    def flush(self, timeout=None):
+        ''' Waits until every record logged so far is written. '''
+        marker = _FlushMarker()
+        with self.lock:
+            if self.listener is None:
+                return
+            self.queue.put(marker)
+        marker.done.wait(timeout)
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+
+    def _setup(self, logger, component):
+        for handler in list(logger.handlers):
+            if isinstance(handler, ComponentQueueHandler):
+                logger.removeHandler(handler)
+        handler = ComponentQueueHandler(self.queue, component)
+        if self.rate:
+            limiter = self.limiters.get(component)
+            if limiter is None:
+                limiter = self.limiters[component] = RateLimiter(self.rate)
+            handler.addFilter(limiter)
+        logger.addHandler(handler)
+        logger.setLevel(self.levels.get(
+            logger.name, self.levels.get(component, self.level)))
+        # Records are written once, by this logger's handler.
+        logger.propagate = False
+
+    def _start(self):
+        if self.listener is not None:
+            return
+        self.handler = BatchHandler(self.directory, self.console_level)
+        self.listener = BatchingQueueListener(self.queue, self.handler)
+        self.listener.start()
+
+    def _stop(self):
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.handler.close()
+        self.listener = None
+        self.handler = None
+
+
+backend = AsyncLogging()
+atexit.register(backend.stop)
@@ -0,0 +1,338 @@
+import json
+import os
+import sys
+import time
+
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock, Event, local, get_ident
+
+# Upper bounds in seconds of the histogram buckets, from 50 microseconds to
+# about 100 seconds; the last bucket holds everything slower.
+BUCKETS = tuple(0.00005 * 2 ** i for i in range(22))
+# Frames kept per sampled stack.
+PROFILE_DEPTH = 30
+# Label names of the gauges whose collectors return a dict.
+GAUGE_LABELS = {"host_backlog": "host"}
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    __slots__ = ("shard", "stage", "start")
+
+    def __init__(self, shard, stage):
+        self.shard = shard
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shard.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(object):
+    ''' Counts of durations per bucket of BUCKETS, and their sum. '''
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def update(self, other):
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, fraction):
+        ''' Upper bound of the bucket holding the given quantile, or the
+        largest bound if it is in the last bucket. '''
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+
+class MetricsShard(object):
+    ''' Observations of one thread. Only the owning thread writes to it,
+    without a lock; readers copy its dicts in one step and may miss an
+    observation that is being recorded. '''
+
+    def __init__(self):
+        self.histograms = dict()
+        self.counters = Counter()
+
+    def observe(self, stage, seconds):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def count(self, key, amount):
+        self.counters[key] += amount
+
+
+class Metrics(object):
+    ''' Timings, counters and gauges of the crawl.
+
+    Stages are timed with "with metrics.time(stage):", events counted with
+    metrics.count(name, **labels), and gauges such as queue depths are
+    read from collectors when a snapshot is taken, so they cost nothing in
+    between. Each thread records into its own MetricsShard.
+
+    Until enable is called, time returns a shared no-op timer and count
+    returns at once, so instrumented code costs one method call. '''
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = Lock()
+        self.local = local()
+        self.shards = list()
+        self.collectors = list()
+        # Collapsed stack -> samples, from the sampling profiler.
+        self.profile = Counter()
+        self.started = time.time()
+        self.stopped = Event()
+        self.threads = list()
+        self.server = None
+
+    def enable(self):
+        self.enabled = True
+
+    def time(self, stage):
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self._shard(), stage)
+
+    def count(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        self._shard().count((name, tuple(sorted(labels.items()))), amount)
+
+    def add_collector(self, collector):
+        ''' Registers a function returning {gauge name: value}, or {gauge
+        name: {label value: value}} for a gauge with a label, such as
+        {"host_backlog": {host: urls}}, that is called for every
+        snapshot. '''
+        with self.lock:
+            self.collectors.append(collector)
+
+    def merged(self):
+        ''' Returns the histograms and counters of every shard summed. '''
+        histograms = dict()
+        counters = Counter()
+        with self.lock:
+            shards = list(self.shards)
+        for shard in shards:
+            for stage, histogram in list(shard.histograms.items()):
+                if stage not in histograms:
+                    histograms[stage] = Histogram()
+                histograms[stage].update(histogram)
+            counters.update(dict(shard.counters))
+        return histograms, counters
+
+    def gauges(self):
+        with self.lock:
+            collectors = list(self.collectors)
+        gauges = dict()
+        for collector in collectors:
+            gauges.update(collector())
+        return gauges
+
+    def snapshot(self):
+        ''' Returns the metrics so far as a dict that can be written as
+        JSON; latencies are in seconds. '''
+        histograms, counters = self.merged()
+        gauges = self.gauges()
+        with self.lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "stages": {
+                    stage: {
+                        "count": histogram.count,
+                        "mean": histogram.sum / max(histogram.count, 1),
+                        "p50": histogram.quantile(0.5),
+                        "p99": histogram.quantile(0.99)}
+                    for stage, histogram in histograms.items()},
+                "counters": {
+                    _flat_key(name, labels): value
+                    for (name, labels), value in counters.items()},
+                "gauges": gauges,
+                "profile": dict(self.profile.most_common(20)),
+            }
+
+    def prometheus_text(self):
+        ''' Returns the metrics in the Prometheus text exposition format. '''
+        histograms, counters = self.merged()
+        gauges = self.gauges()
+        lines = ["# TYPE crawler_stage_seconds histogram"]
+        for stage, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.buckets):
+                cumulative += count
+                lines.append(
+                    f'crawler_stage_seconds_bucket{{stage="{stage}",'
+                    f'le="{bound:g}"}} {cumulative}')
+            lines.append(
+                f'crawler_stage_seconds_bucket{{stage="{stage}",'
+                f'le="+Inf"}} {histogram.count}')
+            lines.append(
+                f'crawler_stage_seconds_sum{{stage="{stage}"}} '
+                f'{histogram.sum}')
+            lines.append(
+                f'crawler_stage_seconds_count{{stage="{stage}"}} '
+                f'{histogram.count}')
+        names = set()
+        for (name, labels), value in sorted(counters.items(), key=str):
+            if name not in names:
+                names.add(name)
+                lines.append(f"# TYPE crawler_{name}_total counter")
+            lines.append(
+                f"crawler_{name}_total{_label_text(labels)} {value}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE crawler_{name} gauge")
+            if isinstance(value, dict):
+                label = GAUGE_LABELS.get(name, "key")
+                for key, item in sorted(value.items()):
+                    lines.append(
+                        f"crawler_{name}{_label_text(((label, key),))} {item}")
+            else:
+                lines.append(f"crawler_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start(self, config):
+        ''' Starts the exporters and the profiler configured in config:
+        snapshots appended to METRICSFILE every METRICSINTERVAL seconds, the
+        text endpoint on METRICSPORT and stack samples every PROFILEINTERVAL
+        seconds. '''
+        if not config.metrics:
+            return
+        self.enable()
+        self.stopped.clear()
+        self.threads = [Thread(
+            target=self._write_periodically, args=(config,), daemon=True)]
+        if config.profile_interval:
+            self.threads.append(Thread(
+                target=self._sample_periodically,
+                args=(config.profile_interval,), daemon=True))
+        for thread in self.threads:
+            thread.start()
+        if config.metrics_port:
+            self.server = ThreadingHTTPServer(
+                ("", config.metrics_port), _MetricsHandler)
+            self.server.daemon_threads = True
+            self.server.metrics = self
+            Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self, config):
+        ''' Stops the exporters and writes a last snapshot. '''
+        if not self.enabled:
+            return
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = list()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.write_snapshot(config.metrics_file)
+
+    def write_snapshot(self, path):
+        record = json.dumps(self.snapshot()).encode("utf-8") + b"\n"
+        with open(path, "ab") as snapshots:
+            snapshots.write(record)
+        if self.profile:
+            with self.lock:
+                stacks = self.profile.most_common()
+            tmp_path = f"{path}.folded.tmp"
+            with open(tmp_path, "w") as folded:
+                for stack, samples in stacks:
+                    folded.write(f"{stack} {samples}\n")
+            os.replace(tmp_path, f"{path}.folded")
+
+    def _shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = MetricsShard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def _write_periodically(self, config):
+        while not self.stopped.wait(config.metrics_interval):
+            self.write_snapshot(config.metrics_file)
+
+    def _sample_periodically(self, interval):
+        # Samples the stack of every other thread, in the collapsed format
+        # of flame graph tools: outermost frame first, separated by ";".
+        own = get_ident()
+        while not self.stopped.wait(interval):
+            samples = Counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = list()
+                while frame is not None and len(stack) < PROFILE_DEPTH:
+                    code = frame.f_code
+                    stack.append(
+                        f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                samples[";".join(reversed(stack))] += 1
+            with self.lock:
+                self.profile.update(samples)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _flat_key(name, labels):
+    if not labels:
+        return name
+    return f"{name}{{{','.join(f'{key}={value}' for key, value in labels)}}}"
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        f'{key}="{str(value)}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
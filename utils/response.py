@@ -1,14 +1,33 @@
 import pickle
 
+from utils.metrics import metrics
+
 class Response(object):
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        # The pickled requests response is only loaded when raw_response is
+        # first read, so pages that are never parsed are never unpickled.
+        # Its size is an upper bound of the page content.
+        self._pickled = resp_dict.get("response")
+        self.size = (
+            len(self._pickled) if isinstance(self._pickled, bytes) else 0)
+        # Headers a cache server may send beside the pickle, with lower
+        # case names, so that they can be checked without unpickling it.
+        headers = resp_dict.get("headers")
+        self.headers = (
+            {name.lower(): value for name, value in headers.items()}
+            if headers else None)
+        self._raw_response = None
+
+    @property
+    def raw_response(self):
+        if self._pickled is not None:
+            try:
+                with metrics.time("unpickle"):
+                    self._raw_response = pickle.loads(self._pickled)
+            except TypeError:
+                self._raw_response = None
+            self._pickled = None
+        return self._raw_response
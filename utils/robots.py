@@ -0,0 +1,236 @@
+import html
+import os
+import pickle
+import re
+import time
+import zlib
+
+from threading import Lock
+from urllib.parse import urlsplit
+
+# robots.txt files are read up to this many bytes, as most crawlers do.
+MAX_ROBOTS_BYTES = 500 * 1024
+# Seconds before a robots.txt that could not be fetched is tried again.
+ERROR_TTL = 600
+# Sitemaps are read up to the 50 MB the sitemaps protocol allows, even when
+# a small gzipped file would expand to more.
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+LOC = re.compile(rb"<loc>\s*(.*?)\s*</loc>", re.IGNORECASE | re.DOTALL)
+
+
+def _pattern(path):
+    ''' Regular expression for a robots.txt path, where * matches any
+    characters and a trailing $ anchors the end of the url. '''
+    anchored = path.endswith("$")
+    if anchored:
+        path = path[:-1]
+    regex = ".*".join(map(re.escape, path.split("*")))
+    return regex + (r"\Z" if anchored else "")
+
+
+class RobotsRules(object):
+    ''' The rules of one robots.txt for one user agent.
+
+    Allow and Disallow rules are compiled into one regular expression with
+    an alternative per rule, ordered by precedence: the longest path first
+    and Allow before Disallow for paths of the same length. The first
+    alternative that matches is the rule that applies, so a url is
+    checked with a single match. '''
+
+    def __init__(self, rules=(), crawl_delay=0, sitemaps=()):
+        # (path, allowed) pairs as listed in the file.
+        self.rules = list(rules)
+        self.crawl_delay = crawl_delay
+        self.sitemaps = list(sitemaps)
+        self.matcher = None
+        ordered = sorted(
+            ((path, allowed) for path, allowed in self.rules if path),
+            key=lambda rule: (-len(rule[0]), not rule[1]))
+        if ordered:
+            self.matcher = re.compile("|".join(
+                f"(?P<{'a' if allowed else 'd'}{i}>{_pattern(path)})"
+                for i, (path, allowed) in enumerate(ordered)))
+
+    def allowed(self, path):
+        ''' path is the path of a url, with its query if it has one. '''
+        if self.matcher is None or path == "/robots.txt":
+            return True
+        match = self.matcher.match(path)
+        return match is None or match.lastgroup[0] == "a"
+
+    def __getstate__(self):
+        return self.rules, self.crawl_delay, self.sitemaps
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+def _names_agent(name, agent):
+    ''' True if the User-agent name of a group is the product token that
+    starts agent, a list of lower case words: compared case-insensitively
+    and as whole words, as RFC 9309 asks, so that "bot" does not match
+    every agent containing it. A name of several words, such as "IR US25",
+    has to match as many leading words. '''
+    words = name.split()
+    return bool(words) and words == agent[:len(words)]
+
+
+def parse_robots(text, user_agent):
+    ''' Returns the RobotsRules of text for user_agent: those of the group
+    whose User-agent is the longest one naming user_agent's product token,
+    or of the * group. Sitemap lines apply to every user agent. '''
+    agent = user_agent.lower().split()
+    if agent:
+        # A version, as in ExampleBot/1.0, is not part of the token.
+        agent[0] = agent[0].split("/")[0]
+    groups = dict()
+    sitemaps = list()
+    current = list()
+    in_rules = False
+    for line in text.splitlines():
+        key, _, value = line.split("#", 1)[0].partition(":")
+        key = key.strip().lower()
+        value = value.strip()
+        if key == "user-agent":
+            if in_rules:
+                current = list()
+                in_rules = False
+            name = value.lower()
+            current.append(name)
+            groups.setdefault(name, [list(), 0])
+        elif key in ("allow", "disallow", "crawl-delay"):
+            in_rules = True
+            for name in current:
+                if key == "crawl-delay":
+                    try:
+                        groups[name][1] = float(value)
+                    except ValueError:
+                        pass
+                else:
+                    groups[name][0].append((value, key == "allow"))
+        elif key == "sitemap" and value:
+            sitemaps.append(value)
+    names = [
+        name for name in groups if name != "*" and _names_agent(name, agent)]
+    name = max(names, key=len) if names else "*"
+    rules, crawl_delay = groups.get(name, [(), 0])
+    return RobotsRules(rules, crawl_delay, sitemaps)
+
+
+def _gunzip(content, limit):
+    ''' Decompresses the gzip members of content, stopping after limit
+    bytes. Raises zlib.error if content is corrupt. '''
+    parts = list()
+    size = 0
+    while content and size < limit:
+        member = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        part = member.decompress(content, limit - size)
+        parts.append(part)
+        size += len(part)
+        if not member.eof:
+            # Cut at limit, or truncated.
+            break
+        content = member.unused_data
+    return b"".join(parts)
+
+
+def parse_sitemap(content, max_bytes=MAX_SITEMAP_BYTES):
+    ''' Returns (page urls, sitemap urls) listed in a sitemap or a sitemap
+    index, which may be gzipped. Only its first max_bytes bytes are read,
+    after decompression. '''
+    if content[:2] == b"\x1f\x8b":
+        content = _gunzip(content, max_bytes)
+    content = content[:max_bytes]
+    locs = [
+        html.unescape(loc.decode("utf-8", "replace"))
+        for loc in LOC.findall(content)]
+    if b"<sitemapindex" in content[:4096].lower():
+        return [], locs
+    return locs, []
+
+
+class RobotsCache(object):
+    ''' RobotsRules of every host, each kept for ttl seconds after it was
+    fetched. Hosts whose robots.txt was not fetched yet allow every url.
+    Times are wall clock times, so the cache stays valid when a crawl is
+    resumed. '''
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self.lock = Lock()
+        # host -> (expiry time, RobotsRules)
+        self.hosts = dict()
+        # Hosts whose robots.txt some thread is fetching.
+        self.fetching = set()
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def rules(self, host):
+        entry = self.hosts.get(host)
+        return entry[1] if entry is not None else None
+
+    def expired(self, host, now=None):
+        entry = self.hosts.get(host)
+        return entry is None or entry[0] <= (now or time.time())
+
+    def claim(self, host, now=None):
+        ''' Returns True if the caller should fetch the robots.txt of host:
+        it is not cached or expired, and no other thread is fetching it. The
+        caller calls release when done. '''
+        with self.lock:
+            if not self.expired(host, now) or host in self.fetching:
+                return False
+            self.fetching.add(host)
+            return True
+
+    def release(self, host):
+        with self.lock:
+            self.fetching.discard(host)
+
+    def put(self, host, rules, now=None, ttl=None):
+        with self.lock:
+            self.hosts[host] = (
+                (now or time.time()) + (self.ttl if ttl is None else ttl),
+                rules)
+
+    def allowed(self, url):
+        if not self.hosts:
+            return True
+        parsed = urlsplit(url)
+        entry = self.hosts.get(parsed.netloc.lower())
+        if entry is None:
+            return True
+        path = parsed.path or "/"
+        if parsed.query:
+            path = f"{path}?{parsed.query}"
+        return entry[1].allowed(path)
+
+    def crawl_delay(self, host):
+        entry = self.hosts.get(host)
+        return entry[1].crawl_delay if entry is not None else 0
+
+    def clear(self):
+        with self.lock:
+            self.hosts.clear()
+            self.fetching.clear()
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with self.lock:
+            hosts = dict(self.hosts)
+        with open(tmp_path, "wb") as robots_file:
+            pickle.dump(hosts, robots_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        ''' Restores the hosts saved at path in place. '''
+        with open(path, "rb") as robots_file:
+            hosts = pickle.load(robots_file)
+        with self.lock:
+            self.hosts.clear()
+            self.hosts.update(hosts)
+
+
+# Shared by is_valid and the frontier, which saves it with its snapshots.
+robots = RobotsCache()
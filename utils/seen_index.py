@@ -0,0 +1,135 @@
+import os
+
+from array import array
+
+
+class SeenIndex(object):
+    ''' In-memory set of 64-bit url fingerprints.
+
+    Fingerprints live in an array backed open addressing table with linear
+    probing, so each url costs 8 bytes per slot instead of a python object.
+    A miss means the url was never added; a hit can be a fingerprint
+    collision and should be confirmed against the save file. An optional
+    Bloom filter in front of the table answers most misses without probing.
+    '''
+
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity=1 << 16, bloom_bits=0, bloom_hashes=4):
+        size = 1
+        while size < capacity / self.MAX_LOAD:
+            size <<= 1
+        self.table = array("Q", bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+        self.bloom_hashes = bloom_hashes
+        self.bloom_bits = bloom_bits
+        self.bloom = bytearray((bloom_bits + 7) // 8) if bloom_bits else None
+
+    @staticmethod
+    def fingerprint(urlhash):
+        ''' Maps a hex digest from utils.get_urlhash to a non-zero 64-bit
+        integer. Zero marks an empty slot. '''
+        return int(urlhash[:16], 16) or 1
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, fingerprint):
+        if self.bloom is not None and not self._in_bloom(fingerprint):
+            return False
+        table = self.table
+        mask = self.mask
+        slot = fingerprint & mask
+        while True:
+            value = table[slot]
+            if value == fingerprint:
+                return True
+            if not value:
+                return False
+            slot = (slot + 1) & mask
+
+    def add(self, fingerprint):
+        if (self.count + 1) > self.MAX_LOAD * len(self.table):
+            self._grow()
+        if self._insert(fingerprint):
+            self.count += 1
+            if self.bloom is not None:
+                self._add_to_bloom(fingerprint)
+
+    def save(self, path):
+        ''' Writes the table, and the Bloom filter if any, to path. '''
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as index:
+            array("Q", [
+                self.count, len(self.table), self.bloom_bits,
+                self.bloom_hashes]).tofile(index)
+            self.table.tofile(index)
+            if self.bloom is not None:
+                index.write(self.bloom)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as index:
+            header = array("Q")
+            header.fromfile(index, 4)
+            count, size, bloom_bits, bloom_hashes = header
+            seen = cls(bloom_bits=bloom_bits, bloom_hashes=bloom_hashes)
+            seen.table = array("Q")
+            seen.table.fromfile(index, size)
+            seen.mask = size - 1
+            seen.count = count
+            if bloom_bits:
+                seen.bloom = bytearray(index.read())
+        return seen
+
+    def memory_usage(self):
+        ''' Bytes used by the table and the Bloom filter. '''
+        usage = self.table.itemsize * len(self.table)
+        if self.bloom is not None:
+            usage += len(self.bloom)
+        return usage
+
+    def bytes_per_url(self):
+        return self.memory_usage() / max(self.count, 1)
+
+    def _insert(self, fingerprint):
+        table = self.table
+        mask = self.mask
+        slot = fingerprint & mask
+        while True:
+            value = table[slot]
+            if value == fingerprint:
+                return False
+            if not value:
+                table[slot] = fingerprint
+                return True
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        old = self.table
+        self.table = array("Q", bytes(16 * len(old)))
+        self.mask = len(self.table) - 1
+        for value in old:
+            if value:
+                self._insert(value)
+
+    def _bloom_positions(self, fingerprint):
+        # Double hashing on the two halves of the fingerprint.
+        low = fingerprint & 0xFFFFFFFF
+        high = fingerprint >> 32
+        for i in range(self.bloom_hashes):
+            yield (low + i * high) % self.bloom_bits
+
+    def _in_bloom(self, fingerprint):
+        bloom = self.bloom
+        for position in self._bloom_positions(fingerprint):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _add_to_bloom(self, fingerprint):
+        bloom = self.bloom
+        for position in self._bloom_positions(fingerprint):
+            bloom[position >> 3] |= 1 << (position & 7)
@@ -0,0 +1,115 @@
+import os
+
+from array import array
+from functools import lru_cache
+from hashlib import blake2b
+from threading import Lock
+
+# The 64 per-bit weights of a SimHash are kept as lanes of one big integer,
+# LANE_BITS wide each, so a token is added with one multiply-add instead of
+# a loop over its bits.
+LANE_BITS = 40
+LANE_MASK = (1 << LANE_BITS) - 1
+# byte value -> that byte's 8 bits spread out to the lowest bit of 8 lanes.
+SPREAD_BYTE = [
+    sum(1 << (bit * LANE_BITS) for bit in range(8) if value >> bit & 1)
+    for value in range(256)]
+
+
+@lru_cache(maxsize=1 << 16)
+def _spread_token(token):
+    digest = blake2b(token.encode("utf-8"), digest_size=8).digest()
+    spread = 0
+    for i, value in enumerate(digest):
+        spread |= SPREAD_BYTE[value] << (8 * i * LANE_BITS)
+    return spread
+
+
+def simhash(word_counts):
+    ''' 64-bit SimHash of a page from its token counts. Tokens are hashed
+    with blake2b, so fingerprints are stable across processes and runs. '''
+    lanes = 0
+    total = 0
+    for token, count in word_counts.items():
+        lanes += _spread_token(token) * count
+        total += count
+    fingerprint = 0
+    for bit in range(64):
+        # The bit is set when the tokens that have it outweigh the others.
+        if 2 * ((lanes >> (bit * LANE_BITS)) & LANE_MASK) > total:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class SimHashIndex(object):
+    ''' Finds fingerprints within max_distance bits of each other.
+
+    The 64 bits are split into max_distance + 1 bands. Two fingerprints that
+    differ in at most max_distance bits agree on at least one whole band, so
+    only fingerprints sharing a band with the query are compared. '''
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        band_count = max_distance + 1
+        widths = [64 // band_count] * band_count
+        for i in range(64 % band_count):
+            widths[i] += 1
+        self.bands = list()
+        shift = 0
+        for width in widths:
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+        # One table per band: band value -> fingerprints with that value.
+        self.tables = [dict() for _ in self.bands]
+        self.fingerprints = array("Q")
+        self.duplicates = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def find(self, fingerprint):
+        ''' Returns a stored fingerprint within max_distance bits of
+        fingerprint, or None. '''
+        for (shift, mask), table in zip(self.bands, self.tables):
+            for candidate in table.get((fingerprint >> shift) & mask, ()):
+                if bin(candidate ^ fingerprint).count("1") <= self.max_distance:
+                    return candidate
+        return None
+
+    def check_and_add(self, fingerprint):
+        ''' Returns True if a near duplicate of fingerprint was seen before,
+        otherwise stores fingerprint and returns False. '''
+        with self.lock:
+            if self.find(fingerprint) is not None:
+                self.duplicates += 1
+                return True
+            self._add(fingerprint)
+            return False
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with self.lock, open(tmp_path, "wb") as index:
+            array("Q", [self.max_distance, self.duplicates]).tofile(index)
+            self.fingerprints.tofile(index)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, max_distance):
+        ''' Loads the fingerprints saved at path. The bands are rebuilt for
+        max_distance, which may differ from the saved one. '''
+        with open(path, "rb") as index:
+            header = array("Q")
+            header.fromfile(index, 2)
+            fingerprints = array("Q", index.read())
+        loaded = cls(max_distance)
+        loaded.duplicates = header[1]
+        for fingerprint in fingerprints:
+            loaded._add(fingerprint)
+        return loaded
+
+    def _add(self, fingerprint):
+        self.fingerprints.append(fingerprint)
+        for (shift, mask), table in zip(self.bands, self.tables):
+            table.setdefault((fingerprint >> shift) & mask, []).append(
+                fingerprint)
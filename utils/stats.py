@@ -0,0 +1,196 @@
+import os
+import pickle
+
+from collections import Counter
+from threading import Lock, RLock, local
+from urllib.parse import urlparse
+
+
+class TopCounts(object):
+    ''' The k most frequent words of a Counter whose counts only grow.
+
+    A word can only enter the top k when its count passes the smallest count
+    in it, so each update is O(1) unless that happens. '''
+
+    def __init__(self, k):
+        self.k = k
+        self.counts = dict()
+        self.min_word = None
+
+    def update(self, word, count):
+        ''' Records that word's total count is now count. '''
+        counts = self.counts
+        if word in counts:
+            counts[word] = count
+            if word == self.min_word:
+                self._find_min()
+        elif len(counts) < self.k:
+            counts[word] = count
+            if self.min_word is None or count < counts[self.min_word]:
+                self.min_word = word
+        elif count > counts[self.min_word]:
+            del counts[self.min_word]
+            counts[word] = count
+            self._find_min()
+
+    def most_common(self):
+        return sorted(self.counts.items(), key=lambda item: -item[1])
+
+    def _find_min(self):
+        self.min_word = min(self.counts, key=self.counts.get)
+
+
+class StatsShard(object):
+    ''' Pages recorded by one thread since its last merge. Only the owning
+    thread and the merge touch it, so its lock is never contended. '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pages = list()
+        self.longest_page = ("", 0)
+        self.word_counts = Counter()
+        self.subdomains = Counter()
+
+    def record_page(self, url, defrag_url, word_counts, word_total):
+        netloc = urlparse(url).netloc
+        with self.lock:
+            if word_total > self.longest_page[1]:
+                self.longest_page = (url, word_total)
+            self.word_counts.update(word_counts)
+            if netloc.endswith('.uci.edu'):
+                self.subdomains[netloc] += 1
+            self.pages.append(defrag_url)
+
+    def drain(self):
+        ''' Returns everything recorded since the last drain. '''
+        with self.lock:
+            drained = (
+                self.pages, self.longest_page, self.word_counts,
+                self.subdomains)
+            self._reset()
+        return drained
+
+
+class CrawlStats(object):
+    ''' Statistics for report.txt, updated as pages are scraped and saved
+    with the frontier so that a resumed crawl keeps them.
+
+    Each thread records pages into its own StatsShard, and merge_shards
+    folds the shards into the totals. Reports and checkpoints merge first,
+    so they match a single threaded crawl. '''
+
+    def __init__(self, top_k=50):
+        self.lock = RLock()
+        self.unique_pages = set()
+        self.longest_page = ("", 0)
+        self.word_frequencies = Counter()
+        self.subdomains = Counter()
+        self.top_words = TopCounts(top_k)
+        self.shards = list()
+        self.local = local()
+
+    def record_page(self, url, defrag_url, word_counts, word_total):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = StatsShard()
+            with self.lock:
+                self.shards.append(shard)
+        shard.record_page(url, defrag_url, word_counts, word_total)
+
+    def merge_shards(self):
+        with self.lock:
+            for shard in self.shards:
+                pages, longest_page, word_counts, subdomains = shard.drain()
+                if longest_page[1] > self.longest_page[1]:
+                    self.longest_page = longest_page
+                frequencies = self.word_frequencies
+                top_words = self.top_words
+                for word, count in word_counts.items():
+                    frequencies[word] += count
+                    top_words.update(word, frequencies[word])
+                self.subdomains.update(subdomains)
+                self.unique_pages.update(pages)
+
+    def write_report(self, path):
+        with self.lock:
+            self.merge_shards()
+            lines = [
+                f"1. Number of unique pages found: {len(self.unique_pages)}",
+                f"2. Longest page in terms of number of words: "
+                f"{self.longest_page[0]}, {self.longest_page[1]}",
+                "3. 50 most common words in the entire set of pages:"]
+            lines.extend(
+                f"{word}: {count}"
+                for word, count in self.top_words.most_common())
+            lines.append("4. Found subdomains:")
+            lines.extend(
+                f"{subdomain}: {count}"
+                for subdomain, count in self.subdomains.most_common())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as report:
+            report.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def save(self, path):
+        with self.lock:
+            self.merge_shards()
+            state = (
+                self.unique_pages, self.longest_page, self.word_frequencies,
+                self.subdomains, self.top_words.counts)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as checkpoint:
+                pickle.dump(state, checkpoint, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def restore(self, path):
+        ''' Replaces the statistics with the ones saved at path, in place so
+        that existing references to unique_pages stay valid. '''
+        with open(path, "rb") as checkpoint:
+            (unique_pages, longest_page, word_frequencies, subdomains,
+             top_counts) = pickle.load(checkpoint)
+        with self.lock:
+            self.unique_pages.clear()
+            self.unique_pages.update(unique_pages)
+            self.longest_page = longest_page
+            self.word_frequencies = word_frequencies
+            self.subdomains = subdomains
+            self.top_words.counts = top_counts
+            self.top_words.min_word = None
+            if top_counts:
+                self.top_words._find_min()
+
+    def add_saved(self, path):
+        ''' Adds the statistics saved at path, for example by another shard
+        of the crawl, to these ones. '''
+        with open(path, "rb") as checkpoint:
+            unique_pages, longest_page, word_frequencies, subdomains, _ = (
+                pickle.load(checkpoint))
+        with self.lock:
+            self.merge_shards()
+            self.unique_pages.update(unique_pages)
+            if longest_page[1] > self.longest_page[1]:
+                self.longest_page = longest_page
+            frequencies = self.word_frequencies
+            top_words = self.top_words
+            for word, count in word_frequencies.items():
+                frequencies[word] += count
+                top_words.update(word, frequencies[word])
+            self.subdomains.update(subdomains)
+
+
+def merge_reports(report_path, stats_paths):
+    ''' Writes one report for the statistics saved at stats_paths. '''
+    stats = CrawlStats()
+    for path in stats_paths:
+        stats.add_saved(path)
+    stats.write_report(report_path)
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m utils.stats report.txt frontier.shelve.shard0.stats ...
+    import sys
+    merge_reports(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,48 @@
+import re
+import string
+
+from collections import Counter
+from itertools import compress, filterfalse
+
+TOKEN_PATTERN = re.compile(r'\w+')
+# For ASCII text, bytes.translate with this table lowercases letters and
+# turns every other non word character into a space, so bytes.split finds
+# the same tokens as TOKEN_PATTERN without a regex.
+WORD_BYTES = (string.ascii_letters + string.digits + '_').encode()
+ASCII_TABLE = bytes(
+    value if value in WORD_BYTES else ord(' ')
+    for value in range(256)).lower()
+
+
+class Tokenizer(object):
+    ''' Counts the words of page text: the lowercased \\w+ tokens that are
+    alphabetic, longer than one character and not stopwords.
+
+    The filters run over whole token lists in C (filter, filterfalse and
+    compress) rather than in a per token Python comprehension, and ASCII
+    text, which is most pages, is tokenized as bytes. '''
+
+    def __init__(self, stopwords):
+        self.stopwords = frozenset(stopwords)
+        self.ascii_stopwords = frozenset(
+            word.encode() for word in self.stopwords if word.isascii())
+
+    def count_words(self, text):
+        ''' Returns (number of tokens, Counter of words) for text. '''
+        if text.isascii():
+            tokens = text.encode('ascii').translate(ASCII_TABLE).split()
+            counts = Counter(self._filter(
+                tokens, self.ascii_stopwords, bytes.isalpha))
+            # Decoded once per distinct word instead of once per token.
+            word_counts = Counter(
+                dict(zip(map(bytes.decode, counts), counts.values())))
+        else:
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            word_counts = Counter(
+                self._filter(tokens, self.stopwords, str.isalpha))
+        return len(tokens), word_counts
+
+    @staticmethod
+    def _filter(tokens, stopwords, isalpha):
+        words = list(filter(isalpha, filterfalse(stopwords.__contains__, tokens)))
+        return compress(words, map((1).__lt__, map(len, words)))